@@ -1,43 +1,236 @@
 import json
+import time
+import threading
 import requests
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import EmptyPoolError
+from typing import Callable, Dict, Any, List, Optional, Iterator
+
+from response_cache import ResponseCache
+from single_flight import SingleFlight
+from json_extract import extract_json, JSONExtractionError
+from schemas import RESPONSE_SCHEMAS, validate, repair
+from backend_pool import BackendPool, Backend
+from resilience import RetryPolicy, RetryBudget, CircuitBreaker
+from context_window import pick_context_size, token_counts, ContextUsage
+
+
+class PoolTimeout(requests.exceptions.ConnectionError):
+    """Chờ quá pool_timeout mà không có kết nối rảnh: quá tải phía client, request chưa tới backend"""
+
+
+class BoundedPoolAdapter(HTTPAdapter):
+    """
+    HTTPAdapter chờ kết nối rảnh (pool_block) tối đa pool_timeout giây
+
+    requests không truyền pool_timeout xuống urllib3 nên với pool_block=True thread
+    thừa sẽ chờ vô hạn, ngoài cả connect/read timeout. Hết hạn chờ thì raise
+    PoolTimeout (retry được như lỗi kết nối).
+    """
+
+    __attrs__ = HTTPAdapter.__attrs__ + ["pool_timeout"]
+
+    def __init__(self, pool_timeout: float, **kwargs):
+        self.pool_timeout = pool_timeout
+        super().__init__(pool_block=True, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        pool_timeout = self.pool_timeout
+
+        def bounded(pool_cls):
+            class BoundedPool(pool_cls):
+                def urlopen(self, *args, **kwargs):
+                    if kwargs.get("pool_timeout") is None:
+                        kwargs["pool_timeout"] = pool_timeout
+                    return super().urlopen(*args, **kwargs)
+            return BoundedPool
+
+        classes = self.poolmanager.pool_classes_by_scheme
+        self.poolmanager.pool_classes_by_scheme = {scheme: bounded(cls) for scheme, cls in classes.items()}
+
+    def send(self, request, **kwargs):
+        try:
+            return super().send(request, **kwargs)
+        except EmptyPoolError as e:
+            raise PoolTimeout(e, request=request)
 
 
 class AIService:
     """Service xử lý các yêu cầu AI - Sử dụng custom AI model"""
     
-    def __init__(self, model: str = "gemma3n:e4b", host: str = "http://192.168.1.222:8070/v1/chat/completions"):
+    # System prompt cho từng loại yêu cầu
+    SYSTEM_PROMPTS = {
+        "recipe": "Bạn là một đầu bếp chuyên nghiệp. Luôn trả lời dưới dạng JSON hợp lệ.",
+        "meal_plan": "Bạn là một chuyên gia dinh dưỡng. Luôn trả lời dưới dạng JSON hợp lệ.",
+        "nutrition": "Bạn là một chuyên gia dinh dưỡng. Luôn trả lời dưới dạng JSON hợp lệ.",
+        "tips": "Bạn là một đầu bếp giàu kinh nghiệm. Cung cấp mẹo thực tiễn hữu ích. Luôn trả lời dưới dạng JSON hợp lệ.",
+    }
+    
+    def __init__(self, model: str = "gemma3n:e4b", host: str = "http://192.168.1.222:8070/v1/chat/completions",
+                 cache: Optional[ResponseCache] = None,
+                 pool_size: int = 10,
+                 pool_hosts: int = 4,
+                 pool_timeout: Optional[float] = None,
+                 connect_timeout: float = 5,
+                 read_timeout: float = 60,
+                 coalesce: bool = True,
+                 structured_output: bool = True,
+                 hosts: Optional[List[str]] = None,
+                 retry_policy: Optional[RetryPolicy] = None,
+                 retry_budget: Optional[RetryBudget] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 hedge: bool = False,
+                 adaptive_context: bool = True):
         """
         Khởi tạo dịch vụ AI
         
         Args:
             model: Tên model AI (mặc định: gemma3n:e4b)
             host: URL của AI backend server (mặc định: http://192.168.1.222:8070/v1/chat/completions)
+            cache: Cache response (None = không cache)
+            pool_size: Số kết nối keep-alive tối đa giữ cho mỗi host
+            pool_hosts: Số host được giữ connection pool riêng
+            pool_timeout: Thời gian chờ kết nối rảnh khi pool đã dùng hết (mặc định: connect_timeout)
+            connect_timeout: Timeout khi mở kết nối (giây)
+            read_timeout: Timeout khi chờ response (giây)
+            coalesce: Gộp các request giống hệt nhau đang chạy đồng thời
+            structured_output: Gửi schema response cho backend (Ollama format / OpenAI response_format)
+            hosts: Danh sách URL của nhiều AI backend để cân bằng tải (mặc định: chỉ dùng host)
+            retry_policy: Chính sách retry (mặc định: 3 lần, backoff từ 1 giây)
+            retry_budget: Ngân sách retry dùng chung (mặc định: 20% số request)
+            circuit_breaker: Circuit breaker cho AI backend
+            hedge: Gửi request dự phòng tới backend khác khi vượt p95 latency
+            adaptive_context: Chọn num_ctx theo độ dài prompt thay vì luôn dùng max_token
         """
         self.model = model
-        self.host = host
-        self.max_token = 20000
+        self.host = hosts[0] if hosts else host
+        self.backends = BackendPool(hosts or [host])
+        self.cache = cache
+        self.max_token = 20000  # Giới hạn trên của num_ctx
+        self.adaptive_context = adaptive_context
+        self.context_usage = ContextUsage()
         self.temperature = 0.6
         self.top_p = 0.8
         self.top_k = 20
         self.min_p = 0.0
+        self.timeout = (connect_timeout, read_timeout)
+        self._pool_args = (pool_size, pool_hosts, connect_timeout if pool_timeout is None else pool_timeout)
+        self.session = self._create_session(*self._pool_args)
+        self.single_flight = SingleFlight() if coalesce else None
+        self.structured_output = structured_output
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.retry_budget = retry_budget or RetryBudget()
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        # True khi worker đang dừng: không retry nữa để kịp thoát trong graceful timeout
+        self.draining = False
+        self.hedge = hedge
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._hedge_lock = threading.Lock()
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        if hedge and len(self.backends.backends) > 1:
+            self._hedge_executor = ThreadPoolExecutor(
+                max_workers=pool_size * 2, thread_name_prefix="ai-hedge"
+            )
     
-    def _call_chat_api(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+    @staticmethod
+    def _create_session(pool_size: int, pool_hosts: int, pool_timeout: float) -> requests.Session:
         """
-        Gọi custom AI API
+        Tạo HTTP session dùng chung với connection pool keep-alive
+        
+        Session chỉ được cấu hình một lần ở đây, sau đó các thread của Flask
+        chỉ gọi post() nên có thể dùng chung; urllib3 pool tự xử lý đồng bộ.
+        Thread chờ kết nối rảnh thay vì mở thêm kết nối ngoài pool, tối đa
+        pool_timeout giây rồi raise PoolTimeout.
         
         Args:
-            messages: Danh sách message định dạng OpenAI
+            pool_size: Số kết nối tối đa cho mỗi host
+            pool_hosts: Số host được cache pool
+            pool_timeout: Thời gian chờ kết nối rảnh (giây)
             
         Returns:
-            Response từ API
+            requests.Session đã mount adapter
+        """
+        session = requests.Session()
+        adapter = BoundedPoolAdapter(
+            pool_timeout,
+            pool_connections=pool_hosts,
+            pool_maxsize=pool_size
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update({"Connection": "keep-alive"})
+        return session
+    
+    def reset_after_fork(self):
         """
+        Tạo lại tài nguyên không dùng chung được sau khi fork (gunicorn preload)
+
+        Socket keep-alive của process cha không được dùng lại trong process con
+        (hai process ghi lẫn vào cùng kết nối), thread health probe cũng không
+        tồn tại sau fork. Session cũ chỉ bỏ đi, không close() để tránh đóng
+        kết nối mà process cha vẫn đang dùng.
+        """
+        self.session = self._create_session(*self._pool_args)
+        self.backends.reset_health_checks()
+
+    def start_health_checks(self):
+        """
+        Chạy health probe định kỳ khi có nhiều backend
+
+        Gọi trong process phục vụ request (app.init_worker), không lúc import:
+        process cha của gunicorn (preload) không được giữ thread nền.
+        """
+        if len(self.backends.backends) > 1:
+            self.backends.start_health_checks(self.session)
+
+    def close(self):
+        """Dừng health probe và đóng tất cả kết nối trong pool"""
+        self.backends.stop()
+        self.session.close()
+    
+    def _build_messages(self, kind: str, prompt: str) -> List[Dict[str, str]]:
+        """
+        Tạo danh sách message (system + user) cho một loại yêu cầu
+        
+        Args:
+            kind: Loại yêu cầu (recipe, meal_plan, nutrition, tips)
+            prompt: Nội dung prompt của user
+        """
+        return [
+            {
+                "role": "system",
+                "content": self.SYSTEM_PROMPTS[kind]
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    
+    def _build_payload(self, messages: List[Dict[str, str]], stream: bool = False,
+                       schema: Optional[Dict[str, Any]] = None,
+                       kind: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Tạo payload gửi lên AI backend (định dạng Ollama, xem _payload_for)
+        
+        Args:
+            messages: Danh sách message
+            stream: Bật chế độ stream
+            schema: JSON schema của response (chỉ gửi khi bật structured_output)
+            kind: Loại yêu cầu, dùng để ước lượng độ dài output khi chọn num_ctx
+        """
+        num_ctx = self.max_token
+        if self.adaptive_context:
+            num_ctx = pick_context_size(messages, kind, self.max_token)
         payload = {
             "model": self.model,
             "messages": messages,
-            "stream": False,
+            "stream": stream,
             "options": {
-                "num_ctx": self.max_token,
+                "num_ctx": num_ctx,
                 "temperature": self.temperature,
                 "top_p": self.top_p,
                 "top_k": self.top_k,
@@ -45,47 +238,396 @@ class AIService:
             },
             "tools": None
         }
+        if schema is not None and self.structured_output:
+            payload["format"] = schema
+        return payload
+    
+    @staticmethod
+    def _payload_for(payload: Dict[str, Any], backend: Backend) -> Dict[str, Any]:
+        """
+        Chuyển payload sang định dạng của backend được chọn
         
+        Các backend trong pool có thể khác loại (Ollama / OpenAI) nên chỉ quyết
+        định được khi đã acquire backend, ngay trước khi gửi.
+        """
+        if not backend.openai_format:
+            return payload
+        payload = dict(payload)
+        if payload.get("stream"):
+            # Chunk cuối chứa usage để thống kê context như response thường
+            payload["stream_options"] = {"include_usage": True}
+        schema = payload.pop("format", None)
+        if schema is not None:
+            payload["response_format"] = {
+                "type": "json_schema",
+                "json_schema": {"name": "response", "schema": schema}
+            }
+        return payload
+    
+    @staticmethod
+    def _extract_content(response: Dict[str, Any]) -> str:
+        """
+        Lấy nội dung text từ response, hỗ trợ cả định dạng OpenAI
+        (choices[0].message) và Ollama (message)
+        """
+        if "choices" in response:
+            return (response.get("choices") or [{}])[0].get("message", {}).get("content", "")
+        return response.get("message", {}).get("content", "")
+    
+    def _call_chat_api(self, messages: List[Dict[str, str]],
+                       schema: Optional[Dict[str, Any]] = None,
+                       kind: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Gọi custom AI API
+        
+        Args:
+            messages: Danh sách message định dạng OpenAI
+            schema: JSON schema của response (None = không ràng buộc)
+            kind: Loại yêu cầu (dùng để chọn num_ctx)
+            
+        Returns:
+            Response từ API
+        """
+        payload = self._build_payload(messages, schema=schema, kind=kind)
+        key = ResponseCache.make_key(self.model, messages, payload["options"])
+        
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        if self.single_flight is None:
+            return self._fetch(payload, key)
+        
+        # Các request giống hệt nhau đang chạy đồng thời chờ chung một lời gọi
+        result, _ = self.single_flight.do(key, lambda: self._fetch(payload, key))
+        return result
+    
+    def _fetch(self, payload: Dict[str, Any], key: str) -> Dict[str, Any]:
+        """
+        Gửi payload tới AI backend (có retry, circuit breaker, hedging)
+        và cache response nếu thành công
+        """
+        breaker = self.circuit_breaker
+        if not breaker.allow():
+            return {"error": "AI backend tạm thời không khả dụng (circuit breaker đang mở)"}
+        
+        self.retry_budget.record_request()
+        attempt = 0
+        # False khi breaker đã cho qua mà chưa ghi nhận kết quả (xem AsyncAIService._fetch)
+        settled = False
+        try:
+            while True:
+                try:
+                    result = self._send_hedged(payload)
+                except (requests.exceptions.RequestException, ValueError) as e:
+                    if RetryPolicy.is_client_error(e) or isinstance(e, PoolTimeout):
+                        # Backend vẫn trả lời (lỗi nằm ở request) hoặc request chưa được
+                        # gửi đi (hết kết nối trong pool): không tính vào breaker
+                        breaker.release_trial()
+                    else:
+                        breaker.record_failure()
+                    settled = True
+                    if (attempt >= self.retry_policy.max_retries
+                            or self.draining
+                            or not RetryPolicy.is_retryable(e)
+                            or not breaker.allow()):
+                        return {"error": f"Lỗi gọi AI API: {str(e)}"}
+                    settled = False
+                    if not self.retry_budget.try_spend():
+                        return {"error": f"Lỗi gọi AI API: {str(e)}"}
+                    time.sleep(self.retry_policy.delay(attempt))
+                    attempt += 1
+                    continue
+                breaker.record_success()
+                settled = True
+                self.context_usage.record(payload["options"]["num_ctx"], result)
+                break
+        finally:
+            if not settled:
+                breaker.release_trial()
+        
+        # Chỉ cache response thành công
+        if self.cache is not None and "error" not in result:
+            self.cache.set(key, result)
+        return result
+    
+    def _send(self, payload: Dict[str, Any], backend: Optional[Backend] = None) -> Dict[str, Any]:
+        """
+        Gửi một request tới backend (mặc định: backend ít tải nhất)
+        
+        Args:
+            payload: Payload gửi đi
+            backend: Backend đã acquire sẵn (sẽ được release trong hàm này)
+        
+        Raises:
+            requests.exceptions.RequestException: Khi request thất bại
+        """
+        if backend is None:
+            backend = self.backends.acquire()
+        start = time.time()
+        ok = False
         try:
-            response = requests.post(self.host, json=payload, timeout=60)
+            response = self.session.post(backend.url, json=self._payload_for(payload, backend), timeout=self.timeout)
             response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            return {"error": f"Lỗi gọi AI API: {str(e)}"}
+            result = response.json()
+            ok = True
+            return result
+        except PoolTimeout:
+            # Request chưa tới backend: không tính latency hay lỗi cho backend
+            self.backends.cancel(backend)
+            backend = None
+            raise
+        finally:
+            if backend is not None:
+                self.backends.release(backend, time.time() - start, ok=ok)
     
-    def generate_recipe(self, prompt: str) -> Dict[str, Any]:
+    def _hedge_delay(self) -> Optional[float]:
+        """Thời gian chờ trước khi gửi request dự phòng: p95 latency của backend nhanh nhất"""
+        delays = [b.percentile(95) for b in self.backends.backends if len(b.latencies) >= 20]
+        return min(delays) if delays else None
+    
+    def _send_hedged(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Tạo công thức từ prompt
+        Gửi request; nếu quá p95 latency chưa có kết quả thì gửi thêm một
+        request tới backend khác và lấy kết quả thành công đầu tiên
+        
+        Raises:
+            requests.exceptions.RequestException: Khi mọi request đều thất bại
+        """
+        delay = self._hedge_delay() if self._hedge_executor is not None else None
+        if delay is None:
+            return self._send(payload)
+        
+        first = self.backends.acquire()
+        primary = self._hedge_executor.submit(self._send, payload, first)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        
+        with self._hedge_lock:
+            self.hedged += 1
+        backup = self._hedge_executor.submit(self._send, payload, self.backends.acquire(exclude=first))
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        with self._hedge_lock:
+                            self.hedge_wins += 1
+                    return future.result()
+                error = future.exception()
+        raise error
+    
+    def resilience_stats(self) -> Dict[str, Any]:
+        """Thống kê retry, circuit breaker và hedging"""
+        return {
+            "circuit_breaker": self.circuit_breaker.stats(),
+            "retries": self.retry_budget.retries,
+            "retry_budget_exhausted": self.retry_budget.exhausted,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+        }
+    
+    def stream_chat(self, messages: List[Dict[str, str]],
+                    schema: Optional[Dict[str, Any]] = None,
+                    kind: Optional[str] = None,
+                    on_complete: Optional[Callable[[Dict[str, Any]], None]] = None) -> Iterator[str]:
+        """
+        Gọi AI API ở chế độ stream, trả về từng đoạn token khi backend sinh ra
+        
+        Hỗ trợ cả NDJSON của Ollama (/api/chat) và SSE của OpenAI
+        (/v1/chat/completions). Chỉ khi backend báo kết thúc (done), toàn bộ
+        nội dung mới được lưu vào cache và ghi nhận context giống như response
+        thường; stream bị cắt giữa chừng không được cache.
+        
+        Args:
+            messages: Danh sách message định dạng OpenAI
+            schema: JSON schema của response (None = không ràng buộc)
+            kind: Loại yêu cầu (dùng để chọn num_ctx)
+            on_complete: Hàm được gọi với response đầy đủ khi stream kết thúc có done
+                         (hoặc lấy từ cache), không gọi khi stream bị cắt
+            
+        Yields:
+            Từng đoạn text của response
+            
+        Raises:
+            requests.exceptions.RequestException: Khi gọi API thất bại
+        """
+        payload = self._build_payload(messages, stream=True, schema=schema, kind=kind)
+        
+        cache_key = None
+        if self.cache is not None:
+            cache_key = ResponseCache.make_key(self.model, messages, payload["options"])
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                content = self._extract_content(cached)
+                if content:
+                    yield content
+                if on_complete is not None:
+                    on_complete(cached)
+                return
+        
+        if not self.circuit_breaker.allow():
+            raise requests.exceptions.ConnectionError("AI backend tạm thời không khả dụng (circuit breaker đang mở)")
+        
+        parts = []
+        finished = False
+        counts = None
+        backend = self.backends.acquire()
+        start = time.time()
+        ok = False
+        try:
+            with self.session.post(backend.url, json=self._payload_for(payload, backend),
+                                   timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                # Đọc tới hết stream: với OpenAI, usage nằm sau chunk có finish_reason
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    token, done, chunk = self._parse_stream_line(line.decode("utf-8"))
+                    if token:
+                        parts.append(token)
+                        yield token
+                    finished = finished or done
+                    if chunk.get("usage") or chunk.get("done"):
+                        counts = token_counts(chunk)
+            ok = True
+        except PoolTimeout:
+            # Request chưa tới backend: không tính cho backend và breaker
+            self.backends.cancel(backend)
+            self.circuit_breaker.release_trial()
+            backend = None
+            raise
+        finally:
+            if backend is not None:
+                # Client ngắt stream sớm (GeneratorExit) không tính là lỗi backend
+                ok = ok or bool(parts)
+                self.backends.release(backend, time.time() - start, ok=ok)
+                if ok:
+                    self.circuit_breaker.record_success()
+                else:
+                    self.circuit_breaker.record_failure()
+        
+        if not finished:
+            return
+        result = {"message": {"role": "assistant", "content": "".join(parts)}}
+        if counts is not None:
+            result["usage"] = {"prompt_tokens": counts[0], "completion_tokens": counts[1]}
+        self.context_usage.record(payload["options"]["num_ctx"], result)
+        if cache_key is not None and parts:
+            self.cache.set(cache_key, result)
+        if on_complete is not None:
+            on_complete(result)
+    
+    @staticmethod
+    def _parse_stream_line(line: str) -> tuple:
+        """
+        Phân tích một dòng stream
         
         Returns:
-            Dict chứa thông tin công thức
+            (token, done, chunk) - token là đoạn text mới, done=True khi stream
+            kết thúc, chunk là dòng đã decode (chứa số token ở dòng cuối)
+        """
+        if line.startswith("data:"):
+            # OpenAI SSE
+            data = line[5:].strip()
+            if data == "[DONE]":
+                return "", True, {}
+            chunk = json.loads(data)
+            choice = (chunk.get("choices") or [{}])[0]
+            return choice.get("delta", {}).get("content") or "", choice.get("finish_reason") is not None, chunk
+        # Ollama NDJSON
+        chunk = json.loads(line)
+        return chunk.get("message", {}).get("content", ""), bool(chunk.get("done")), chunk
+    
+    def stream(self, kind: str, prompt: str,
+               on_complete: Optional[Callable[[Dict[str, Any]], None]] = None) -> Iterator[str]:
+        """
+        Stream response cho một loại yêu cầu (recipe, meal_plan, nutrition, tips)
+        
+        Yields:
+            Từng đoạn text của response (on_complete: xem stream_chat)
+        """
+        return self.stream_chat(self._build_messages(kind, prompt), RESPONSE_SCHEMAS.get(kind), kind,
+                                on_complete)
+    
+    def _complete(self, kind: str, prompt: str, error_label: str) -> Dict[str, Any]:
+        """
+        Gọi AI cho một loại yêu cầu, phân tích JSON và kiểm tra theo schema
+        
+        Args:
+            kind: Loại yêu cầu (recipe, meal_plan, nutrition, tips)
+            prompt: Prompt của user
+            error_label: Tiền tố thông báo lỗi
         """
         try:
-            messages = [
-                {
-                    "role": "system",
-                    "content": "Bạn là một đầu bếp chuyên nghiệp. Luôn trả lời dưới dạng JSON hợp lệ."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
+            messages = self._build_messages(kind, prompt)
             
-            response = self._call_chat_api(messages)
+            response = self._call_chat_api(messages, RESPONSE_SCHEMAS.get(kind), kind)
             
             if "error" in response:
                 return response
             
             # Trích xuất content từ response
-            content = response.get("choices", [{}])[0].get("message", {}).get("content", "")
+            content = self._extract_content(response)
             if not content:
                 return {"error": "Không nhận được response từ AI"}
             
-            result = self._parse_json_response(content)
+            result = self._check_schema(kind, self._parse_json_response(content, kind))
+            if "error" in result and self.cache is not None:
+                # Không giữ lại response hỏng trong cache
+                self.cache.delete(ResponseCache.make_key(
+                    self.model, messages, self._build_payload(messages, kind=kind)["options"]
+                ))
             return result
         except Exception as e:
-            return {"error": f"Lỗi tạo công thức: {str(e)}"}
+            return {"error": f"{error_label}: {str(e)}"}
+    
+    @staticmethod
+    def _extract_options(kind: Optional[str]) -> Dict[str, Any]:
+        """Tham số expect/accept cho json_extract theo schema của loại yêu cầu"""
+        schema = RESPONSE_SCHEMAS.get(kind)
+        if schema is None:
+            return {}
+        return {
+            "expect": {"object": dict, "array": list}.get(schema.get("type")),
+            "accept": lambda value: "error" not in AIService._check_schema(kind, value),
+        }
+    
+    @staticmethod
+    def _check_schema(kind: str, result: Any) -> Dict[str, Any]:
+        """
+        Kiểm tra kết quả theo schema của loại yêu cầu, sửa nhẹ một lần nếu sai
+        
+        Returns:
+            Kết quả hợp lệ hoặc dict chứa error
+        """
+        schema = RESPONSE_SCHEMAS.get(kind)
+        if schema is None or (isinstance(result, dict) and "error" in result):
+            return result
+        if not validate(result, schema):
+            return result
+        
+        repaired = repair(result, schema)
+        errors = validate(repaired, schema)
+        if errors:
+            return {
+                "error": f"Response không khớp schema: {'; '.join(errors[:5])}",
+                "raw_content": json.dumps(result, ensure_ascii=False)
+            }
+        return repaired
+    
+    def generate_recipe(self, prompt: str) -> Dict[str, Any]:
+        """
+        Tạo công thức từ prompt
+        
+        Returns:
+            Dict chứa thông tin công thức
+        """
+        return self._complete("recipe", prompt, "Lỗi tạo công thức")
     
     def generate_meal_plan(self, prompt: str) -> Dict[str, Any]:
         """
@@ -94,31 +636,7 @@ class AIService:
         Returns:
             Dict chứa kế hoạch ăn uống
         """
-        try:
-            messages = [
-                {
-                    "role": "system",
-                    "content": "Bạn là một chuyên gia dinh dưỡng. Luôn trả lời dưới dạng JSON hợp lệ."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-            
-            response = self._call_chat_api(messages)
-            
-            if "error" in response:
-                return response
-            
-            content = response.get("choices", [{}])[0].get("message", {}).get("content", "")
-            if not content:
-                return {"error": "Không nhận được response từ AI"}
-            
-            result = self._parse_json_response(content)
-            return result
-        except Exception as e:
-            return {"error": f"Lỗi tạo kế hoạch: {str(e)}"}
+        return self._complete("meal_plan", prompt, "Lỗi tạo kế hoạch")
     
     def analyze_nutrition(self, prompt: str) -> Dict[str, Any]:
         """
@@ -127,31 +645,7 @@ class AIService:
         Returns:
             Dict chứa thông tin dinh dưỡng
         """
-        try:
-            messages = [
-                {
-                    "role": "system",
-                    "content": "Bạn là một chuyên gia dinh dưỡng. Luôn trả lời dưới dạng JSON hợp lệ."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-            
-            response = self._call_chat_api(messages)
-            
-            if "error" in response:
-                return response
-            
-            content = response.get("choices", [{}])[0].get("message", {}).get("content", "")
-            if not content:
-                return {"error": "Không nhận được response từ AI"}
-            
-            result = self._parse_json_response(content)
-            return result
-        except Exception as e:
-            return {"error": f"Lỗi phân tích dinh dưỡng: {str(e)}"}
+        return self._complete("nutrition", prompt, "Lỗi phân tích dinh dưỡng")
     
     def get_tips(self, prompt: str) -> Dict[str, Any]:
         """
@@ -160,51 +654,26 @@ class AIService:
         Returns:
             Dict chứa các mẹo
         """
-        try:
-            messages = [
-                {
-                    "role": "system",
-                    "content": "Bạn là một đầu bếp giàu kinh nghiệm. Cung cấp mẹo thực tiễn hữu ích. Luôn trả lời dưới dạng JSON hợp lệ."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
-            
-            response = self._call_chat_api(messages)
-            
-            if "error" in response:
-                return response
-            
-            content = response.get("choices", [{}])[0].get("message", {}).get("content", "")
-            if not content:
-                return {"error": "Không nhận được response từ AI"}
-            
-            result = self._parse_json_response(content)
-            return result
-        except Exception as e:
-            return {"error": f"Lỗi lấy mẹo: {str(e)}"}
+        return self._complete("tips", prompt, "Lỗi lấy mẹo")
     
     @staticmethod
-    def _parse_json_response(content: str) -> Dict[str, Any]:
+    def _parse_json_response(content: str, kind: Optional[str] = None) -> Dict[str, Any]:
         """
         Phân tích JSON response từ AI
         
+        Lấy object/array JSON đầu tiên trong content, bỏ qua prose và
+        markdown code block, tự sửa dấu phẩy thừa và output bị cắt.
+        Có kind thì bỏ qua các giá trị không khớp schema của loại yêu cầu
+        (VD: "[1]" trong prose đứng trước object kết quả).
+        
         Args:
             content: Nội dung response từ AI
+            kind: Loại yêu cầu (recipe, meal_plan, nutrition, tips)
             
         Returns:
             Dict được phân tích hoặc dict chứa error
         """
         try:
-            # Loại bỏ markdown code blocks nếu có
-            if content.startswith("```"):
-                content = content.split("```")[1]
-                if content.startswith("json"):
-                    content = content[4:]
-            
-            result = json.loads(content)
-            return result
-        except json.JSONDecodeError as e:
+            return extract_json(content, **AIService._extract_options(kind))
+        except JSONExtractionError as e:
             return {"error": f"Lỗi phân tích JSON: {str(e)}", "raw_content": content}
@@ -1,10 +1,33 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 import os
+import json
+import time
+import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from ai_service import AIService
-from recipe_cloner import RecipeCloner
+from resilience import RetryPolicy, CircuitBreaker
+from async_ai_service import AsyncAIService, BackgroundLoop
+from response_cache import ResponseCache
+from semantic_cache import SemanticCache
+from json_extract import JSONExtractor
+from schemas import RESPONSE_SCHEMAS
+from prompts import (
+    AI_ENDPOINTS,
+    build_suggest_recipe_prompt,
+    build_meal_plan_prompt,
+    build_meal_plan_gaps_prompt,
+    build_analyze_recipe_prompt,
+    build_partial_nutrition_prompt,
+    build_cooking_tips_prompt,
+)
+from nutrition_db import NutritionDB
+from meal_planner import MealPlanner, parse_days, parse_no_repeat_days
+from job_queue import JobQueue
+from recipe_cloner import RecipeCloner, RECIPE_FIELDS
+from metrics import REGISTRY, CONTENT_TYPE, counter, histogram
 
 # Cấu hình logging
 logging.basicConfig(level=logging.INFO)
@@ -15,37 +38,425 @@ load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
+# Cache response AI (AI_CACHE_SIZE=0 để tắt, AI_CACHE_DB để bật tầng SQLite, AI_CACHE_DB_ROWS: số dòng tối đa)
+ai_cache = None
+if int(os.getenv('AI_CACHE_SIZE', '256')) > 0:
+    ai_cache = ResponseCache(
+        max_size=int(os.getenv('AI_CACHE_SIZE', '256')),
+        ttl=float(os.getenv('AI_CACHE_TTL', '3600')),
+        db_path=os.getenv('AI_CACHE_DB') or None,
+        max_rows=int(os.getenv('AI_CACHE_DB_ROWS', '10000'))
+    )
+
+# Cache gần đúng cho suggest-recipe theo tập nguyên liệu (AI_SEMANTIC_THRESHOLD=0 để tắt)
+semantic_cache = None
+if float(os.getenv('AI_SEMANTIC_THRESHOLD', '0.8')) > 0:
+    semantic_cache = SemanticCache(
+        threshold=float(os.getenv('AI_SEMANTIC_THRESHOLD', '0.8')),
+        max_size=int(os.getenv('AI_SEMANTIC_CACHE_SIZE', '1024')),
+        ttl=float(os.getenv('AI_CACHE_TTL', '3600'))
+    )
+
+# Mỗi thread gọi AI giữ một kết nối trong pool: mặc định đủ cho thread của server
+# (SERVE_THREADS), batch (AI_BATCH_WORKERS) và job nền (JOBS_WORKERS)
+AI_CALLER_THREADS = (int(os.getenv('SERVE_THREADS', '16')) + int(os.getenv('AI_BATCH_WORKERS', '8'))
+                     + int(os.getenv('JOBS_WORKERS', '4')))
+
 # Khởi tạo AI Service với model tự build
 ai_service = AIService(
     model=os.getenv('AI_MODEL', 'gemma3n:e4b'),
     host=os.getenv('AI_HOST', 
                 #    'http://192.168.1.222:8070/v1/chat/completions'
                    'http://localhost:11434/api/chat'
-                   )
+                   ),
+    cache=ai_cache,
+    pool_size=int(os.getenv('AI_POOL_SIZE', str(AI_CALLER_THREADS))),
+    # Pool đã dùng hết: chờ kết nối rảnh tối đa chừng này giây rồi báo lỗi (có retry)
+    pool_timeout=float(os.getenv('AI_POOL_TIMEOUT', os.getenv('AI_CONNECT_TIMEOUT', '5'))),
+    connect_timeout=float(os.getenv('AI_CONNECT_TIMEOUT', '5')),
+    read_timeout=float(os.getenv('AI_READ_TIMEOUT', '60')),
+    coalesce=os.getenv('AI_COALESCE', 'true').lower() == 'true',
+    structured_output=os.getenv('AI_STRUCTURED_OUTPUT', 'true').lower() == 'true',
+    # Nhiều backend: AI_HOSTS=http://box1:11434/api/chat,http://box2:11434/api/chat
+    hosts=[h.strip() for h in os.getenv('AI_HOSTS', '').split(',') if h.strip()] or None,
+    # Cùng tên biến với config.py
+    retry_policy=RetryPolicy(
+        max_retries=int(os.getenv('API_MAX_RETRIES', '3')),
+        base_delay=float(os.getenv('API_RETRY_DELAY', '1'))
+    ),
+    circuit_breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv('AI_BREAKER_THRESHOLD', '5')),
+        reset_timeout=float(os.getenv('AI_BREAKER_RESET', '30')),
+        # Request thử lâu nhất bằng read timeout của một lần gọi AI
+        trial_timeout=float(os.getenv('AI_BREAKER_TRIAL_TIMEOUT', os.getenv('AI_READ_TIMEOUT', '60')))
+    ),
+    hedge=os.getenv('AI_HEDGE', 'false').lower() == 'true',
+    adaptive_context=os.getenv('AI_ADAPTIVE_CONTEXT', 'true').lower() == 'true'
+)
+# AI Service async dùng chung cấu hình với ai_service, chạy trên event loop nền
+# (loop và thread chỉ được tạo ở lần gọi async đầu tiên trong worker)
+ai_loop = BackgroundLoop()
+async_ai_service = AsyncAIService(
+    ai_service,
+    max_concurrency=int(os.getenv('AI_MAX_CONCURRENCY', '256')),
+    pool_size=int(os.getenv('AI_ASYNC_POOL_SIZE', '100'))
 )
 
+# Thread pool dùng chung cho /api/batch (giới hạn số lời gọi AI song song)
+BATCH_MAX_ITEMS = int(os.getenv('AI_BATCH_MAX_ITEMS', '50'))
+batch_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv('AI_BATCH_WORKERS', '8')),
+    thread_name_prefix='ai-batch'
+)
+
+# Hàng đợi job nền cho generation chạy lâu, lưu kết quả cạnh recipes.db
+job_queue = JobQueue(
+    db_path=os.getenv('JOBS_DB', 'jobs.db'),
+    workers=int(os.getenv('JOBS_WORKERS', '4')),
+    ttl=float(os.getenv('JOBS_TTL', '86400')),
+    max_pending=int(os.getenv('JOBS_MAX_PENDING', '100'))
+)
+
+# Bảng dinh dưỡng cục bộ cho analyze-recipe (NUTRITION_LOCAL=false để luôn hỏi AI)
+nutrition_db = None
+if os.getenv('NUTRITION_LOCAL', 'true').lower() == 'true':
+    nutrition_db = NutritionDB(os.getenv('NUTRITION_TABLE') or None)
+
 # Khởi tạo RecipeCloner
 recipe_cloner = RecipeCloner()
 
+# Phân trang /api/clone/recipes
+RECIPES_PAGE_SIZE = int(os.getenv('RECIPES_PAGE_SIZE', '100'))
+RECIPES_PAGE_MAX = int(os.getenv('RECIPES_PAGE_MAX', '1000'))
+# Tìm kiếm /api/clone/search: số kết quả mỗi trang
+SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', '20'))
+SEARCH_PAGE_MAX = int(os.getenv('SEARCH_PAGE_MAX', '100'))
+
+# Xếp meal-plan từ recipes.db trước khi hỏi AI (MEAL_PLAN_LOCAL=false để luôn hỏi AI)
+meal_planner = None
+if os.getenv('MEAL_PLAN_LOCAL', 'true').lower() == 'true':
+    meal_planner = MealPlanner(
+        recipe_cloner,
+        refresh_interval=float(os.getenv('MEAL_PLAN_REFRESH', '30'))
+    )
+
 logger.info("="*50)
 logger.info("🚀 Cookbook AI Backend Starting...")
 logger.info(f"📍 Host: 0.0.0.0:5000")
 logger.info(f"🤖 AI Model: {os.getenv('AI_MODEL', 'gemma3n:e4b')}")
-logger.info(f"🔗 AI Host: {os.getenv('AI_HOST', 'http://localhost:11434/api/chat')}")
+logger.info(f"🔗 AI Host: {', '.join(b.url for b in ai_service.backends.backends)}")
 logger.info("="*50)
 
+# ===== Worker lifecycle (serve.py / gunicorn) =====
+
+def init_worker():
+    """Chạy thread nền và tạo kết nối trong process phục vụ request
+
+    Gọi trong worker vừa fork (serve.py post_fork) hoặc trước khi chạy server một
+    process. Import app không chạy thread nào: các singleton (AIService, RecipeCloner,
+    cache, bảng dinh dưỡng) được tạo một lần ở process cha và dùng chung qua
+    copy-on-write, còn health probe, event loop async và socket keep-alive là của
+    từng worker.
+    """
+    ai_service.reset_after_fork()
+    ai_service.start_health_checks()
+    ai_loop.restart()
+    logger.info(f"👷 Worker {os.getpid()} ready")
+
+
+def shutdown_worker(timeout: float = 30):
+    """Dừng worker trong khoảng timeout giây
+
+    Lời gọi AI không retry nữa, batch và job chưa chạy bị huỷ (job được đánh dấu
+    lỗi), job đang chạy được chờ tới hạn rồi mới đóng kết nối, để worker tự thoát
+    trước khi bị gunicorn SIGKILL.
+    """
+    logger.info(f"🛑 Worker {os.getpid()} draining...")
+    deadline = time.monotonic() + timeout
+    ai_service.draining = True
+    batch_executor.shutdown(wait=False, cancel_futures=True)
+    job_queue.shutdown(timeout=timeout)
+    if ai_loop.running:
+        try:
+            ai_loop.submit(async_ai_service.aclose()).result(timeout=max(1.0, deadline - time.monotonic()))
+        except Exception as e:
+            logger.warning(f"Error closing async client: {e}")
+        ai_loop.stop()
+    ai_service.close()
+    logger.info(f"👋 Worker {os.getpid()} stopped")
+
+# ===== Streaming helpers =====
+
+def _wants_stream() -> bool:
+    """Client yêu cầu stream bằng ?stream=1 hoặc header Accept: text/event-stream"""
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+
+def _sse_event(data, event: str = None) -> str:
+    """Định dạng một Server-Sent Event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _sse_response(events) -> Response:
+    """Bọc generator các SSE event thành response stream"""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def _stream_response(kind: str, prompt: str, finalize=None, on_result=None) -> Response:
+    """Stream token từ AI dưới dạng SSE
+
+    Mỗi token được gửi trong event mặc định: data: {"token": "..."}
+    Khi kết thúc gửi event "result" chứa JSON đã phân tích,
+    hoặc event "error" nếu gọi AI thất bại.
+    finalize (tuỳ chọn) xử lý tiếp JSON trước khi gửi event "result".
+    on_result (tuỳ chọn) nhận JSON (trước finalize) chỉ khi backend báo kết thúc
+    stream (done), VD: lưu semantic cache; stream bị cắt thì không gọi.
+    """
+    def result_event(result):
+        return _sse_event(finalize(result) if finalize else result, event="result")
+
+    def generate():
+        parts = []
+        completed = []
+        # Chỉ nhận giá trị khớp schema, "[1]" trong prose không chặn object phía sau
+        extractor = JSONExtractor(**ai_service._extract_options(kind))
+        tokens = ai_service.stream(kind, prompt, on_complete=completed.append)
+        try:
+            for token in tokens:
+                parts.append(token)
+                yield _sse_event({"token": token})
+                # JSON đã khép lại: gửi kết quả ngay, không chờ phần prose phía sau
+                if extractor.feed(token) is not None:
+                    result = ai_service._check_schema(kind, extractor.result)
+                    yield result_event(result)
+                    break
+            else:
+                content = "".join(parts)
+                if not content:
+                    yield _sse_event({"error": "Không nhận được response từ AI"}, event="error")
+                    return
+                result = ai_service._check_schema(kind, ai_service._parse_json_response(content, kind))
+                yield result_event(result)
+        except Exception as e:
+            logger.error(f"Error streaming {kind}: {e}")
+            yield _sse_event({"error": f"Lỗi gọi AI API: {str(e)}"}, event="error")
+            return
+
+        # Client đã có kết quả: đọc nốt stream (không gửi đi) tới done để response
+        # được cache; lỗi lúc này chỉ ghi log
+        try:
+            for _ in tokens:
+                pass
+        except Exception as e:
+            logger.warning(f"Error draining {kind} stream: {e}")
+            return
+        if on_result is not None and completed and "error" not in result:
+            on_result(result)
+
+    return _sse_response(generate())
+
+
+def _suggest_recipe(data: dict) -> dict:
+    """Gợi ý công thức, dùng lại kết quả của tập nguyên liệu gần giống (semantic cache)"""
+    cached = semantic_cache.get(data) if semantic_cache is not None else None
+    if cached is not None:
+        return cached
+    result = ai_service.generate_recipe(build_suggest_recipe_prompt(data))
+    if semantic_cache is not None and "error" not in result:
+        semantic_cache.set(data, result)
+    return result
+
+
+def _plan_nutrition(data: dict):
+    """Tính dinh dưỡng từ bảng cục bộ trước khi hỏi AI
+
+    Returns:
+        (kết quả cục bộ hoặc None, prompt cho AI, hàm gộp kết quả AI hoặc None)
+        - Mọi nguyên liệu đều tra được: trả kết quả cục bộ, không cần AI
+        - Tra được một phần: AI chỉ ước tính phần còn lại, gộp bằng NutritionDB.merge
+    """
+    if nutrition_db is None:
+        return None, build_analyze_recipe_prompt(data), None
+    analysis = nutrition_db.analyze(data.get('ingredients', []))
+    if not analysis['items']:
+        return None, build_analyze_recipe_prompt(data), None
+    if not analysis['unresolved']:
+        return nutrition_db.to_result(analysis), None, None
+    return None, build_partial_nutrition_prompt(data, analysis), lambda result: nutrition_db.merge(analysis, result)
+
+
+def _plan_meals(data: dict):
+    """Xếp meal-plan từ recipes.db trước khi hỏi AI
+
+    Returns:
+        (kết quả cục bộ hoặc None, prompt cho AI, hàm gộp kết quả AI hoặc None)
+        - Mọi bữa đều xếp được: trả kết quả cục bộ, không cần AI
+        - Còn bữa trống: AI chỉ gợi ý cho các ngày có bữa trống, gộp bằng MealPlanner.merge
+
+    Raises:
+        ValueError: Nếu days hoặc no_repeat_days không phải số nguyên (days được giới hạn trong 1..31)
+    """
+    data = {**data, 'days': parse_days(data.get('days', 7))}
+    if meal_planner is None:
+        return None, build_meal_plan_prompt(data), None
+    solution = meal_planner.solve(data)
+    if not solution['gaps']:
+        return meal_planner.to_result(solution), None, None
+    if len(solution['gaps']) == len(solution['plan']) * 3:
+        return None, build_meal_plan_prompt(data), None
+    return (None, build_meal_plan_gaps_prompt(data, solution),
+            lambda result: meal_planner.merge(solution, result))
+
+
+def _generate_meal_plan(data: dict) -> dict:
+    """Tạo meal-plan (recipes.db + AI cho các bữa còn trống)"""
+    local, prompt, finalize = _plan_meals(data)
+    if local is not None:
+        return local
+    result = ai_service.generate_meal_plan(prompt)
+    return finalize(result) if finalize else result
+
+
+def _analyze_recipe(data: dict) -> dict:
+    """Phân tích dinh dưỡng (bảng cục bộ + AI cho phần còn lại)"""
+    local, prompt, finalize = _plan_nutrition(data)
+    if local is not None:
+        return local
+    result = ai_service.analyze_nutrition(prompt)
+    return finalize(result) if finalize else result
+
+
+# ===== Metrics =====
+
+REQUESTS_TOTAL = counter("http_requests_total", "Số request theo route", ("method", "route", "status"))
+REQUEST_ERRORS = counter("http_request_errors_total", "Số request lỗi (5xx) theo route", ("method", "route"))
+REQUEST_DURATION = histogram(
+    "http_request_duration_seconds",
+    "Thời gian xử lý request (với SSE: tới lúc bắt đầu stream)",
+    ("method", "route"),
+)
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+def observe_request(method: str, route: str, status: int, seconds: float):
+    """Ghi nhận một request đã xử lý (dùng chung cho Flask và route ASGI trong asgi.py)"""
+    REQUEST_DURATION.observe(seconds, method=method, route=route)
+    REQUESTS_TOTAL.inc(method=method, route=route, status=status)
+    if status >= 500:
+        REQUEST_ERRORS.inc(method=method, route=route)
+
+
+@app.after_request
+def _record_request_metrics(response):
+    """Đếm request và đo latency theo route template (VD: /api/jobs/<job_id>)"""
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        observe_request(request.method, route, response.status_code, time.perf_counter() - start)
+    return response
+
+
+def _collect_app_metrics():
+    """Số liệu lấy lúc scrape: cache, single-flight, backend, circuit breaker, job"""
+    caches = []
+    if ai_cache is not None:
+        stats = ai_cache.stats()
+        caches.append(("response", stats["hits"], stats["misses"], stats["size"]))
+    if semantic_cache is not None:
+        stats = semantic_cache.stats()
+        caches.append(("semantic", stats["exact_hits"] + stats["near_hits"], stats["misses"], stats["size"]))
+    yield ("ai_cache_hits_total", "counter", "Số lần cache hit",
+           [({"cache": name}, hits) for name, hits, _, _ in caches])
+    yield ("ai_cache_misses_total", "counter", "Số lần cache miss",
+           [({"cache": name}, misses) for name, _, misses, _ in caches])
+    yield ("ai_cache_hit_ratio", "gauge", "Tỉ lệ cache hit",
+           [({"cache": name}, round(hits / (hits + misses), 4) if hits + misses else 0)
+            for name, hits, misses, _ in caches])
+    yield ("ai_cache_entries", "gauge", "Số phần tử trong cache",
+           [({"cache": name}, size) for name, _, _, size in caches])
+
+    if ai_service.single_flight is not None:
+        stats = ai_service.single_flight.stats()
+        yield ("ai_coalesced_requests_total", "counter", "Số request dùng chung kết quả single-flight",
+               [({}, stats["coalesced"])])
+
+    backends = ai_service.backends.stats()
+    yield ("ai_backend_up", "gauge", "Backend đang nhận request (1) hay bị loại (0)",
+           [({"backend": b["url"]}, int(b["healthy"])) for b in backends])
+    yield ("ai_backend_outstanding_requests", "gauge", "Số request đang chạy trên backend",
+           [({"backend": b["url"]}, b["outstanding"]) for b in backends])
+
+    breaker = ai_service.circuit_breaker.stats()
+    yield ("ai_circuit_breaker_open", "gauge", "Circuit breaker đang mở (1) hay không (0)",
+           [({}, int(breaker["state"] != "closed"))])
+    yield ("ai_circuit_breaker_rejected_total", "counter", "Số request bị circuit breaker từ chối",
+           [({}, breaker["rejected"])])
+
+    async_stats = async_ai_service.stats()
+    yield ("ai_async_in_flight", "gauge", "Số request async đang gọi AI", [({}, async_stats["in_flight"])])
+    yield ("jobs_pending", "gauge", "Số job đang chờ hoặc đang chạy", [({}, job_queue.stats()["pending"])])
+
+
+REGISTRY.add_collector(_collect_app_metrics)
+
+
 # ===== API Endpoints =====
 
 @app.route('/api/health', methods=['GET'])
 def health():
     """Kiểm tra server có hoạt động"""
     logger.info("📊 Health check request received")
-    return jsonify({"status": "ok", "message": "AI Backend đang chạy"}), 200
+    result = {"status": "ok", "message": "AI Backend đang chạy"}
+    if ai_cache is not None:
+        result["cache"] = ai_cache.stats()
+    if semantic_cache is not None:
+        result["semantic_cache"] = semantic_cache.stats()
+    if ai_service.single_flight is not None:
+        result["single_flight"] = ai_service.single_flight.stats()
+    result["async"] = async_ai_service.stats()
+    result["backends"] = ai_service.backends.stats()
+    result["resilience"] = ai_service.resilience_stats()
+    result["context"] = ai_service.context_usage.stats()
+    result["jobs"] = job_queue.stats()
+    result["recipes_db"] = recipe_cloner.stats()
+    return jsonify(result), 200
+
+
+@app.route('/api/metrics', methods=['GET'])
+def metrics():
+    """Metrics dạng Prometheus: request/lỗi/latency theo route, thời gian gọi AI backend,
+    số token prompt/output, token thực dùng so với num_ctx được cấp (theo bucket),
+    thời gian SQLite của RecipeCloner, tỉ lệ cache hit
+
+    Số liệu của process nhận request: chạy nhiều worker (serve.py --workers) thì
+    mỗi lần scrape chỉ thấy một worker, xem serve.py
+    """
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+@app.route('/api/schemas', methods=['GET'])
+def get_schemas():
+    """JSON schema của response cho từng AI endpoint"""
+    return jsonify({
+        endpoint: RESPONSE_SCHEMAS[kind] for endpoint, (kind, _) in AI_ENDPOINTS.items()
+    }), 200
 
 
 @app.route('/api/suggest-recipe', methods=['POST'])
 def suggest_recipe():
     """Gợi ý công thức dựa trên nguyên liệu hoặc tên
+    Thêm ?stream=1 (hoặc Accept: text/event-stream) để nhận token qua SSE
     Request JSON:
     {
         "ingredients": ["cà chua", "dưa chuột"],
@@ -55,27 +466,15 @@ def suggest_recipe():
     """
     try:
         data = request.get_json()
-        ingredients = data.get('ingredients', [])
-        cuisine = data.get('cuisine', '')
-        difficulty = data.get('difficulty', '')
-        
-        prompt = f"""Gợi ý một công thức nấu ăn dựa trên:
-- Nguyên liệu: {', '.join(ingredients)}
-- Loại ẩm thực: {cuisine}
-- Mức độ khó: {difficulty}
-
-Vui lòng trả lời dưới dạng JSON với các field:
-{{
-    "title": "Tên công thức",
-    "description": "Mô tả ngắn",
-    "ingredients": ["Nguyên liệu 1", "Nguyên liệu 2"],
-    "steps": ["Bước 1", "Bước 2"],
-    "estimatedTime": "30 phút",
-    "servings": 4
-}}
-"""
         
-        result = ai_service.generate_recipe(prompt)
+        if _wants_stream():
+            # Tập nguyên liệu gần giống request đã trả lời: dùng lại kết quả
+            cached = semantic_cache.get(data) if semantic_cache is not None else None
+            if cached is not None:
+                return _sse_response(iter([_sse_event(cached, event="result")]))
+            on_result = (lambda result: semantic_cache.set(data, result)) if semantic_cache is not None else None
+            return _stream_response('recipe', build_suggest_recipe_prompt(data), on_result=on_result)
+        result = _suggest_recipe(data)
         return jsonify(result), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -84,36 +483,34 @@ Vui lòng trả lời dưới dạng JSON với các field:
 @app.route('/api/meal-plan', methods=['POST'])
 def generate_meal_plan():
     """Tạo kế hoạch ăn uống hàng tuần
+    Thêm ?stream=1 (hoặc Accept: text/event-stream) để nhận token qua SSE
     Request JSON:
     {
         "days": 7,
         "dietary": "vegetarian",
-        "preferences": ["không cay", "có cá"]
+        "preferences": ["không cay", "có cá"],
+        "max_minutes": {"breakfast": 20, "lunch": 45, "dinner": 60},
+        "no_repeat_days": 3
     }
+    days được giới hạn trong 1..31 (không phải số nguyên: 400).
+    max_minutes (số hoặc theo bữa) và no_repeat_days (số nguyên >= 1, sai: 400) là tuỳ chọn.
+    Các bữa được xếp từ công thức trong recipes.db, AI chỉ được gọi cho
+    bữa không có công thức phù hợp (response có "source": local | mixed)
     """
     try:
         data = request.get_json()
-        days = data.get('days', 7)
-        dietary = data.get('dietary', '')
-        preferences = data.get('preferences', [])
+        try:
+            parse_days(data.get('days', 7))
+            parse_no_repeat_days(data.get('no_repeat_days', 3))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
-        prompt = f"""Tạo kế hoạch ăn uống {days} ngày với:
-- Chế độ ăn: {dietary}
-- Sở thích: {', '.join(preferences)}
-
-Trả lời dưới dạng JSON:
-{{
-    "plan": [
-        {{
-            "day": "Thứ 2",
-            "breakfast": "Tên công thức",
-            "lunch": "Tên công thức",
-            "dinner": "Tên công thức"
-        }}
-    ]
-}}
-"""
-        result = ai_service.generate_meal_plan(prompt)
+        if _wants_stream():
+            local, prompt, finalize = _plan_meals(data)
+            if local is not None:
+                return _sse_response(iter([_sse_event(local, event="result")]))
+            return _stream_response('meal_plan', prompt, finalize)
+        result = _generate_meal_plan(data)
         return jsonify(result), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -122,32 +519,24 @@ Trả lời dưới dạng JSON:
 @app.route('/api/analyze-recipe', methods=['POST'])
 def analyze_recipe():
     """Phân tích thông tin dinh dưỡng của công thức
+    Thêm ?stream=1 (hoặc Accept: text/event-stream) để nhận token qua SSE
     Request JSON:
     {
         "title": "Tên công thức",
         "ingredients": ["Nguyên liệu 1: 100g", "Nguyên liệu 2: 50g"]
     }
+    Nguyên liệu có trong bảng dinh dưỡng cục bộ được tính trực tiếp,
+    AI chỉ được gọi cho các nguyên liệu còn lại (response có "source": local | mixed)
     """
     try:
         data = request.get_json()
-        title = data.get('title', '')
-        ingredients = data.get('ingredients', [])
         
-        prompt = f"""Phân tích thông tin dinh dưỡng của công thức: {title}
-Nguyên liệu:
-{chr(10).join(['- ' + ing for ing in ingredients])}
-
-Trả lời dưới dạng JSON:
-{{
-    "calories": 500,
-    "protein": 25,
-    "carbs": 60,
-    "fat": 15,
-    "nutrition": "Phân tích chi tiết",
-    "healthBenefits": ["Lợi ích 1", "Lợi ích 2"]
-}}
-"""
-        result = ai_service.analyze_nutrition(prompt)
+        if _wants_stream():
+            local, prompt, finalize = _plan_nutrition(data)
+            if local is not None:
+                return _sse_response(iter([_sse_event(local, event="result")]))
+            return _stream_response('nutrition', prompt, finalize)
+        result = _analyze_recipe(data)
         return jsonify(result), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -156,6 +545,7 @@ Trả lời dưới dạng JSON:
 @app.route('/api/cooking-tips', methods=['POST'])
 def get_cooking_tips():
     """Lấy mẹo nấu nướng
+    Thêm ?stream=1 (hoặc Accept: text/event-stream) để nhận token qua SSE
     Request JSON:
     {
         "dish": "Tên món ăn",
@@ -164,26 +554,245 @@ def get_cooking_tips():
     """
     try:
         data = request.get_json()
-        dish = data.get('dish', '')
-        problem = data.get('problem', '')
+        prompt = build_cooking_tips_prompt(data)
         
-        prompt = f"""Cung cấp mẹo nấu nướng cho: {dish}
-Vấn đề: {problem}
-
-Trả lời dưới dạng JSON:
-{{
-    "tips": ["Mẹo 1", "Mẹo 2", "Mẹo 3"],
-    "explanation": "Giải thích chi tiết"
-}}
-"""
+        if _wants_stream():
+            return _stream_response('tips', prompt)
         result = ai_service.get_tips(prompt)
         return jsonify(result), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+# ===== Batch AI API =====
+
+AI_METHODS = {
+    'recipe': ai_service.generate_recipe,
+    'meal_plan': ai_service.generate_meal_plan,
+    'nutrition': ai_service.analyze_nutrition,
+    'tips': ai_service.get_tips,
+}
+
+
+def _run_endpoint(endpoint: str, body: dict) -> dict:
+    """Chạy một AI endpoint (tên trong AI_ENDPOINTS) với request body"""
+    kind, build_prompt = AI_ENDPOINTS[endpoint]
+    if kind == 'recipe':
+        return _suggest_recipe(body)
+    if kind == 'nutrition':
+        return _analyze_recipe(body)
+    if kind == 'meal_plan':
+        return _generate_meal_plan(body)
+    return AI_METHODS[kind](build_prompt(body))
+
+
+def _run_batch_item(index: int, item: dict) -> dict:
+    """Chạy một sub-request của /api/batch, luôn trả về dict kết quả (không raise)"""
+    endpoint = item.get('type', '') if isinstance(item, dict) else ''
+    if endpoint not in AI_ENDPOINTS:
+        return {"index": index, "type": endpoint, "status": "error",
+                "error": f"Unknown type. Supported: {', '.join(AI_ENDPOINTS)}"}
+    try:
+        result = _run_endpoint(endpoint, item.get('body') or {})
+    except Exception as e:
+        return {"index": index, "type": endpoint, "status": "error", "error": str(e)}
+    if "error" in result:
+        return {"index": index, "type": endpoint, "status": "error", "error": result["error"]}
+    return {"index": index, "type": endpoint, "status": "ok", "result": result}
+
+
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    """Chạy nhiều yêu cầu AI song song
+    Thêm ?stream=1 (hoặc Accept: text/event-stream) để nhận từng kết quả
+    qua SSE (event "item") ngay khi hoàn thành, kết thúc bằng event "done"
+    Request JSON:
+    {
+        "requests": [
+            {"type": "analyze-recipe", "body": {"title": "...", "ingredients": [...]}},
+            {"type": "cooking-tips", "body": {"dish": "...", "problem": "..."}}
+        ]
+    }
+    type: suggest-recipe | meal-plan | analyze-recipe | cooking-tips
+    """
+    try:
+        data = request.get_json()
+        items = data.get('requests', [])
+
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "requests must be a non-empty list"}), 400
+        if len(items) > BATCH_MAX_ITEMS:
+            return jsonify({"error": f"Too many requests (max {BATCH_MAX_ITEMS})"}), 400
+
+        futures = [batch_executor.submit(_run_batch_item, i, item) for i, item in enumerate(items)]
+
+        if _wants_stream():
+            def generate():
+                for future in as_completed(futures):
+                    yield _sse_event(future.result(), event="item")
+                yield _sse_event({"total": len(futures)}, event="done")
+
+            return _sse_response(generate())
+
+        results = [future.result() for future in futures]
+        return jsonify({
+            "total": len(results),
+            "errors": sum(1 for r in results if r["status"] == "error"),
+            "results": results
+        }), 200
+    except Exception as e:
+        logger.error(f"Error running batch: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+# ===== Job API =====
+# Generation chạy lâu (VD: meal-plan 7+ ngày) chạy trên worker pool riêng,
+# client nhận job ID ngay và poll GET /api/jobs/<id> để lấy kết quả.
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Tạo job nền
+    Request JSON:
+    {
+        "type": "meal-plan",
+        "body": {"days": 7, "preferences": "..."}
+    }
+    type: suggest-recipe | meal-plan | analyze-recipe | cooking-tips
+    Response 202: {"id": "...", "status": "queued", "url": "/api/jobs/<id>"}
+    """
+    try:
+        data = request.get_json()
+        endpoint = data.get('type', '')
+        body = data.get('body') or {}
+
+        if endpoint not in AI_ENDPOINTS:
+            return jsonify({"error": f"Unknown type. Supported: {', '.join(AI_ENDPOINTS)}"}), 400
+
+        job_id = job_queue.submit(endpoint, lambda: _run_endpoint(endpoint, body))
+        if job_id is None:
+            return jsonify({"error": "Job queue is full, try again later"}), 503
+
+        return jsonify({"id": job_id, "status": "queued", "url": f"/api/jobs/{job_id}"}), 202
+    except Exception as e:
+        logger.error(f"Error submitting job: {e}")
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Trạng thái và kết quả job
+    Response: {"id", "type", "status": queued | running | done | error,
+               "result", "error", "created_at", "started_at", "finished_at"}
+    """
+    try:
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({"error": "Job not found or expired"}), 404
+        return jsonify(job), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# ===== Async AI API =====
+# Cùng request JSON với các route đồng bộ ở trên. Generation chạy trên event
+# loop nền dùng chung, giới hạn bởi AI_MAX_CONCURRENCY.
+# Chạy bằng ASGI (serve.py, asgi.py) các route này chạy thẳng trên event loop của
+# server nên hàng trăm request đang chờ chỉ tốn một coroutine mỗi request. Dưới
+# WSGI (gthread, server của Flask) mỗi request vẫn giữ một thread tới khi xong,
+# tức số request chờ đồng thời bị giới hạn bởi số thread.
+
+async def _async_suggest_recipe(data: dict):
+    """Gợi ý công thức, dùng lại kết quả của tập nguyên liệu gần giống (semantic cache)"""
+    cached = semantic_cache.get(data) if semantic_cache is not None else None
+    if cached is not None:
+        return cached, 200
+    result = await ai_loop.run(async_ai_service.generate_recipe(build_suggest_recipe_prompt(data)))
+    if semantic_cache is not None and "error" not in result:
+        semantic_cache.set(data, result)
+    return result, 200
+
+
+async def _async_meal_plan(data: dict):
+    """Tạo meal-plan (recipes.db + AI cho các bữa còn trống)"""
+    try:
+        parse_days(data.get('days', 7))
+        parse_no_repeat_days(data.get('no_repeat_days', 3))
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    # Đọc recipes.db trên thread riêng, không chặn event loop
+    local, prompt, finalize = await asyncio.to_thread(_plan_meals, data)
+    if local is not None:
+        return local, 200
+    result = await ai_loop.run(async_ai_service.generate_meal_plan(prompt))
+    return (finalize(result) if finalize else result), 200
+
+
+async def _async_analyze_recipe(data: dict):
+    """Phân tích dinh dưỡng (bảng cục bộ + AI cho phần còn lại)"""
+    local, prompt, finalize = _plan_nutrition(data)
+    if local is not None:
+        return local, 200
+    result = await ai_loop.run(async_ai_service.analyze_nutrition(prompt))
+    return (finalize(result) if finalize else result), 200
+
+
+async def _async_cooking_tips(data: dict):
+    """Lấy mẹo nấu nướng"""
+    result = await ai_loop.run(async_ai_service.get_tips(build_cooking_tips_prompt(data)))
+    return result, 200
+
+
+# POST /api/async/<tên> -> coroutine(body JSON) trả về (kết quả, status)
+ASYNC_ROUTES = {
+    'suggest-recipe': _async_suggest_recipe,
+    'meal-plan': _async_meal_plan,
+    'analyze-recipe': _async_analyze_recipe,
+    'cooking-tips': _async_cooking_tips,
+}
+
+
+async def _run_async_route(name: str):
+    try:
+        result, status = await ASYNC_ROUTES[name](request.get_json())
+        return jsonify(result), status
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/async/suggest-recipe', methods=['POST'])
+async def async_suggest_recipe():
+    """Gợi ý công thức (async) - request giống /api/suggest-recipe"""
+    return await _run_async_route('suggest-recipe')
+
+
+@app.route('/api/async/meal-plan', methods=['POST'])
+async def async_generate_meal_plan():
+    """Tạo kế hoạch ăn uống (async) - request giống /api/meal-plan"""
+    return await _run_async_route('meal-plan')
+
+
+@app.route('/api/async/analyze-recipe', methods=['POST'])
+async def async_analyze_recipe():
+    """Phân tích dinh dưỡng (async) - request giống /api/analyze-recipe"""
+    return await _run_async_route('analyze-recipe')
+
+
+@app.route('/api/async/cooking-tips', methods=['POST'])
+async def async_get_cooking_tips():
+    """Lấy mẹo nấu nướng (async) - request giống /api/cooking-tips"""
+    return await _run_async_route('cooking-tips')
+
+
 # ===== Recipe Clone API =====
 
+@app.after_request
+def _invalidate_meal_planner(response):
+    """Công thức thay đổi (import, thêm, xoá): meal planner đọc lại recipes.db ở lần sau"""
+    if meal_planner is not None and request.method == 'POST' and request.path.startswith('/api/clone/'):
+        meal_planner.invalidate()
+    return response
+
+
 @app.route('/api/clone/statistics', methods=['GET'])
 def get_clone_statistics():
     """Lấy thống kê công thức trong database"""
@@ -199,8 +808,10 @@ def clone_from_json():
     """Clone công thức từ JSON file
     Request:
     {
-        "json_file": "/path/to/file.json"
+        "json_file": "/path/to/file.json",
+        "offset": 0  // tuỳ chọn: "offset" của lần import bị dừng để tiếp tục
     }
+    Response có inserted/skipped/failed, thống kê từng lô (batches) và offset
     """
     try:
         data = request.get_json()
@@ -209,12 +820,19 @@ def clone_from_json():
         if not json_file:
             return jsonify({"error": "json_file is required"}), 400
         
-        count = recipe_cloner.clone_from_json(json_file)
+        offset = data.get('offset', 0)
+        if isinstance(offset, str) and offset.isdigit():
+            offset = int(offset)
+        if not isinstance(offset, int) or isinstance(offset, bool) or offset < 0:
+            return jsonify({"error": "offset must be a non-negative integer"}), 400
+        
+        result = recipe_cloner.import_json(json_file, offset=offset)
         stats = recipe_cloner.get_statistics()
         
         return jsonify({
-            "message": f"Imported {count} recipes",
-            "count": count,
+            "message": f"Imported {result['inserted']} recipes",
+            "count": result['inserted'],
+            **result,
             "statistics": stats
         }), 200
     except Exception as e:
@@ -229,6 +847,7 @@ def clone_from_api():
     {
         "api_url": "https://api.example.com/recipes"
     }
+    Response có inserted/skipped/failed và thống kê từng lô (batches)
     """
     try:
         data = request.get_json()
@@ -237,12 +856,13 @@ def clone_from_api():
         if not api_url:
             return jsonify({"error": "api_url is required"}), 400
         
-        count = recipe_cloner.clone_from_api(api_url)
+        result = recipe_cloner.import_api(api_url)
         stats = recipe_cloner.get_statistics()
         
         return jsonify({
-            "message": f"Imported {count} recipes from API",
-            "count": count,
+            "message": f"Imported {result['inserted']} recipes from API",
+            "count": result['inserted'],
+            **result,
             "statistics": stats
         }), 200
     except Exception as e:
@@ -316,20 +936,139 @@ def add_manual_recipe():
         return jsonify({"error": str(e)}), 500
 
 
+def _join_chunks(parts, size: int = 100):
+    """Gộp các đoạn nhỏ thành chunk lớn hơn để giảm số lần ghi socket khi stream"""
+    buffer = []
+    for part in parts:
+        buffer.append(part)
+        if len(buffer) >= size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _recipe_query_args() -> dict:
+    """Đọc filter và projection của /api/clone/recipes từ query string
+
+    Raises:
+        ValueError: Nếu tham số không hợp lệ
+    """
+    args = request.args
+    filters = {
+        'recipe_type': args.get('type') or None,
+        'source': args.get('source') or None,
+        'min_duration': int(args['min_duration']) if args.get('min_duration') else None,
+        'max_duration': int(args['max_duration']) if args.get('max_duration') else None,
+        'fields': [f.strip() for f in args.get('fields', '').split(',') if f.strip()] or None,
+    }
+    if filters['fields']:
+        # Kiểm tra sớm để trả 400 thay vì lỗi giữa chừng khi stream
+        unknown = [f for f in filters['fields'] if f not in RECIPE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return filters
+
+
 @app.route('/api/clone/recipes', methods=['GET'])
 def get_all_recipes():
-    """Lấy danh sách tất cả công thức"""
+    """Lấy danh sách công thức (phân trang theo cursor)
+
+    Query:
+        limit: Số công thức mỗi trang (mặc định RECIPES_PAGE_SIZE, tối đa RECIPES_PAGE_MAX)
+        cursor: next_cursor của trang trước
+        type, source, min_duration, max_duration: Bộ lọc
+        fields: Các trường cần lấy, cách nhau bằng dấu phẩy (VD: id,title,ingredients)
+        format=ndjson (hoặc Accept: application/x-ndjson): stream mỗi dòng một công thức
+        stream=1: stream JSON {"recipes": [...]} theo từng lô
+
+    Khi stream, không giới hạn số công thức trừ khi truyền limit.
+    Response (không stream): {"recipes": [...], "count": n, "next_cursor": "123" | null}
+    """
     try:
-        recipes = recipe_cloner.list_all_recipes()
+        filters = _recipe_query_args()
+        cursor = int(request.args['cursor']) if request.args.get('cursor') else None
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be >= 1")
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query: {e}"}), 400
+
+    ndjson = (request.args.get('format') == 'ndjson'
+              or 'application/x-ndjson' in request.headers.get('Accept', ''))
+    if ndjson or request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        recipes = recipe_cloner.iter_recipes(after_id=cursor, limit=limit, **filters)
+
+        def generate_ndjson():
+            try:
+                yield from _join_chunks(json.dumps(r, ensure_ascii=False) + "\n" for r in recipes)
+            except Exception as e:
+                logger.error(f"Error streaming recipes: {e}")
+                yield json.dumps({"error": str(e)}) + "\n"
+
+        def generate_json():
+            yield '{"recipes": ['
+            try:
+                yield from _join_chunks(
+                    ("," if i else "") + json.dumps(r, ensure_ascii=False) for i, r in enumerate(recipes)
+                )
+                yield ']}'
+            except Exception as e:
+                logger.error(f"Error streaming recipes: {e}")
+                yield f'], "error": {json.dumps(str(e))}}}'
+
+        if ndjson:
+            return Response(stream_with_context(generate_ndjson()), mimetype='application/x-ndjson')
+        return Response(stream_with_context(generate_json()), mimetype='application/json')
+
+    try:
+        limit = min(limit or RECIPES_PAGE_SIZE, RECIPES_PAGE_MAX)
+        page = recipe_cloner.list_recipes(cursor=cursor, limit=limit, **filters)
         return jsonify({
-            "total": len(recipes),
-            "recipes": recipes
+            "recipes": page["recipes"],
+            "count": len(page["recipes"]),
+            "next_cursor": str(page["next_cursor"]) if page["next_cursor"] is not None else None
         }), 200
     except Exception as e:
         logger.error(f"Error fetching recipes: {e}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/clone/search', methods=['GET'])
+def search_recipes():
+    """Tìm công thức theo title, mô tả, các bước và nguyên liệu (xếp hạng BM25)
+
+    Query:
+        q: Từ khoá, không phân biệt dấu (VD: "dau hu" khớp "Đậu hũ")
+        limit: Số kết quả mỗi trang (mặc định SEARCH_PAGE_SIZE, tối đa SEARCH_PAGE_MAX)
+        offset: next_offset của trang trước
+
+    Response: {"query": q, "results": [{id, title, ..., score, snippet}], "count": n,
+               "next_offset": 20 | null}
+    """
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            raise ValueError("q is required")
+        limit = int(request.args['limit']) if request.args.get('limit') else SEARCH_PAGE_SIZE
+        offset = int(request.args['offset']) if request.args.get('offset') else 0
+        if limit < 1 or offset < 0:
+            raise ValueError("limit must be >= 1 and offset >= 0")
+        page = recipe_cloner.search(query, limit=min(limit, SEARCH_PAGE_MAX), offset=offset)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid query: {e}"}), 400
+    except Exception as e:
+        logger.error(f"Error searching recipes: {e}")
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({
+        "query": query,
+        "results": page["results"],
+        "count": len(page["results"]),
+        "next_offset": page["next_offset"]
+    }), 200
+
+
 @app.route('/api/clone/clear', methods=['POST'])
 def clear_all_recipes():
     """Xóa tất cả công thức (CẢNH BÁO!)
@@ -358,9 +1097,11 @@ def clear_all_recipes():
 
 
 if __name__ == '__main__':
-    # Development: địa chỉ 0.0.0.0 để chạy trên mạng cục bộ
+    # Development: địa chỉ 0.0.0.0 để chạy trên mạng cục bộ.
+    # Production dùng serve.py (nhiều worker); FLASK_DEBUG=true để bật debugger/reloader
     logger.info("✅ Backend đã sẵn sàng!")
     logger.info("🌐 Truy cập: http://localhost:5000/api/health")
     logger.info("📱 App sẽ kết nối đến: http://localhost:5000/api")
     logger.info("")
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    init_worker()
+    app.run(host='0.0.0.0', port=5000, debug=os.getenv('FLASK_DEBUG', 'false').lower() == 'true')
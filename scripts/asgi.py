@@ -0,0 +1,128 @@
+"""
+Entry point ASGI cho serve.py (worker uvicorn)
+- POST /api/async/*: chạy thẳng trên event loop của server, request đang chờ AI chỉ
+  là một coroutine chứ không giữ thread, nên AI_MAX_CONCURRENCY và pool httpx
+  (AI_ASYNC_POOL_SIZE) mới dùng hết được
+- Các route còn lại (kể cả preflight CORS) chạy trong Flask app trên thread pool
+  riêng có `threads` thread, như worker gthread
+"""
+
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgiInstance
+
+logger = logging.getLogger(__name__)
+
+# Coroutine nhận body JSON, trả về (kết quả, status)
+AsyncHandler = Callable[[Any], Awaitable[Tuple[Dict[str, Any], int]]]
+
+
+class _PooledWsgiInstance(WsgiToAsgiInstance):
+    """WsgiToAsgiInstance chạy WSGI app trên thread pool cho trước
+
+    Bản gốc của asgiref chạy mọi request trên một thread dùng chung
+    (thread_sensitive), các route đồng bộ sẽ phải xếp hàng nhau.
+    """
+
+    def __init__(self, wsgi_application, executor: ThreadPoolExecutor):
+        super().__init__(wsgi_application)
+        self._executor = executor
+
+    _run_wsgi_app = WsgiToAsgiInstance.__dict__["run_wsgi_app"].func
+
+    async def run_wsgi_app(self, body):
+        await sync_to_async(self._run_wsgi_app, thread_sensitive=False, executor=self._executor)(body)
+
+
+class AsyncRoutes:
+    """ASGI app: route async chạy trên event loop, các route khác chuyển cho WSGI app"""
+
+    def __init__(self, wsgi_app, handlers: Dict[str, AsyncHandler], threads: int = 16,
+                 prefix: str = "/api/async/", dumps: Callable[[Any], str] = json.dumps,
+                 on_response: Optional[Callable[[str, str, int, float], None]] = None):
+        """
+        Args:
+            wsgi_app: Flask app xử lý các route còn lại
+            handlers: Tên route (phần sau prefix) -> coroutine xử lý POST
+            threads: Số thread chạy WSGI app
+            prefix: Tiền tố đường dẫn của route async
+            dumps: Hàm serialize kết quả (VD: app.json.dumps để giống jsonify)
+            on_response: Callback (method, route, status, giây) để ghi metrics
+        """
+        self.wsgi_app = wsgi_app
+        self.handlers = handlers
+        self.prefix = prefix
+        self.dumps = dumps
+        self.on_response = on_response
+        # Thread được tạo khi có request đầu tiên, không phải lúc preload ở process cha
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="wsgi")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"].startswith(self.prefix):
+            handler = self.handlers.get(scope["path"][len(self.prefix):])
+            if handler is not None:
+                await self._handle(handler, scope, receive, send)
+                return
+        await _PooledWsgiInstance(self.wsgi_app, self.executor)(scope, receive, send)
+
+    async def _handle(self, handler: AsyncHandler, scope, receive, send):
+        start = time.perf_counter()
+        try:
+            body = await self._read_body(receive)
+            result, status = await handler(json.loads(body) if body else None)
+        except Exception as e:
+            logger.error(f"Error handling {scope['path']}: {e}")
+            result, status = {"error": str(e)}, 500
+
+        payload = (self.dumps(result) + "\n").encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(payload)).encode("ascii")),
+                # Giống Flask-CORS mặc định của app
+                (b"access-control-allow-origin", b"*"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": payload})
+        if self.on_response is not None:
+            self.on_response(scope["method"], scope["path"], status, time.perf_counter() - start)
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        parts = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                raise ConnectionError("Client disconnected")
+            parts.append(message.get("body", b""))
+            if not message.get("more_body"):
+                return b"".join(parts)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def create_app(threads: int = 16) -> AsyncRoutes:
+    """ASGI app cho serve.py: route async của app.py + Flask app cho các route còn lại"""
+    import app as app_module
+    return AsyncRoutes(
+        app_module.app, app_module.ASYNC_ROUTES, threads=threads,
+        dumps=app_module.app.json.dumps, on_response=app_module.observe_request,
+    )
@@ -0,0 +1,293 @@
+"""
+Phiên bản asyncio của AIService
+- Dùng httpx.AsyncClient thay cho requests
+- Semaphore toàn cục giới hạn số generation chạy đồng thời
+- Chạy trên một event loop nền dùng chung cho cả process
+"""
+
+import os
+import json
+import time
+import asyncio
+import threading
+import concurrent.futures
+from typing import Dict, Any, List, Optional, Coroutine
+
+import httpx
+
+from ai_service import AIService
+from response_cache import ResponseCache
+from schemas import RESPONSE_SCHEMAS
+
+
+class BackgroundLoop:
+    """Event loop chạy trên một thread nền, nhận coroutine từ các thread khác
+
+    Loop và thread chỉ được tạo ở lần submit đầu tiên trong process, nên import
+    app ở process cha của gunicorn (preload) không tạo thread nào.
+    """
+
+    def __init__(self, name: str = "ai-async-loop"):
+        self.name = name
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            # Loop tạo ở process khác (trước fork) không có thread chạy trong process này
+            if self.loop is None or self._pid != os.getpid():
+                self.loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self.loop.run_forever, name=self.name, daemon=True)
+                self._thread.start()
+                self._pid = os.getpid()
+            return self.loop
+
+    def submit(self, coro: Coroutine) -> concurrent.futures.Future:
+        """Đưa coroutine vào loop nền, trả về Future dùng được từ mọi thread"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_started())
+
+    async def run(self, coro: Coroutine) -> Any:
+        """Chạy coroutine trên loop nền và await kết quả từ loop hiện tại"""
+        return await asyncio.wrap_future(self.submit(coro))
+
+    @property
+    def running(self) -> bool:
+        """Loop nền đã chạy trong process này"""
+        return self.loop is not None and self._pid == os.getpid()
+
+    def stop(self):
+        """Dừng loop nền (không làm gì nếu loop chưa chạy trong process này)"""
+        with self._lock:
+            if self.loop is None or self._pid != os.getpid():
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+            self.loop = None
+            self._thread = None
+
+    def restart(self):
+        """Bỏ loop của process trước (sau fork), loop mới được tạo ở lần submit kế tiếp"""
+        with self._lock:
+            self.loop = None
+            self._thread = None
+            self._pid = None
+
+
+class AsyncAIService:
+    """Service AI bất đồng bộ - dùng chung cấu hình, cache và cách parse với AIService"""
+
+    def __init__(self, service: AIService, max_concurrency: int = 256, pool_size: int = 100):
+        """
+        Khởi tạo dịch vụ AI async
+
+        Args:
+            service: AIService đồng bộ cung cấp model, host, sampling options và cache
+            max_concurrency: Số generation tối đa chạy đồng thời (các request khác chờ trong hàng đợi)
+            pool_size: Số kết nối HTTP tối đa tới AI backend
+        """
+        self.service = service
+        self.max_concurrency = max_concurrency
+        self.pool_size = pool_size
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.in_flight = 0
+        self.waiting = 0
+        self.coalesced = 0
+
+    def _ensure_client(self):
+        """Tạo client và semaphore trên event loop đang chạy (lần gọi đầu tiên)"""
+        if self._client is None:
+            connect_timeout, read_timeout = self.service.timeout
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size
+                )
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    async def _call_chat_api(self, messages: List[Dict[str, str]],
+                             schema: Optional[Dict[str, Any]] = None,
+                             kind: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Gọi custom AI API (async)
+
+        Args:
+            messages: Danh sách message định dạng OpenAI
+            schema: JSON schema của response (None = không ràng buộc)
+            kind: Loại yêu cầu (dùng để chọn num_ctx)
+
+        Returns:
+            Response từ API
+        """
+        self._ensure_client()
+        payload = self.service._build_payload(messages, schema=schema, kind=kind)
+
+        key = ResponseCache.make_key(self.service.model, messages, payload["options"])
+
+        cache = self.service.cache
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        # Gộp các request giống hệt nhau đang chạy trên loop
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        task = asyncio.ensure_future(self._fetch(payload, key))
+        self._pending[key] = task
+        task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _fetch(self, payload: Dict[str, Any], key: str) -> Dict[str, Any]:
+        """
+        Gửi payload tới AI backend (giới hạn bởi semaphore, có retry và
+        circuit breaker dùng chung với AIService) và cache response
+        """
+        service = self.service
+        breaker = service.circuit_breaker
+        if not breaker.allow():
+            return {"error": "AI backend tạm thời không khả dụng (circuit breaker đang mở)"}
+
+        service.retry_budget.record_request()
+        attempt = 0
+        # False khi breaker đã cho qua mà chưa ghi nhận kết quả: mọi lối ra khác
+        # (task bị huỷ, hết retry budget) phải trả lượt thử half-open
+        settled = False
+        try:
+            while True:
+                try:
+                    result = await self._send(payload)
+                except (httpx.HTTPError, ValueError) as e:
+                    if self._is_client_error(e):
+                        # Backend vẫn trả lời, lỗi nằm ở request: không tính vào breaker
+                        breaker.release_trial()
+                    else:
+                        breaker.record_failure()
+                    settled = True
+                    if (attempt >= service.retry_policy.max_retries
+                            or service.draining
+                            or not self._is_retryable(e)
+                            or not breaker.allow()):
+                        return {"error": f"Lỗi gọi AI API: {str(e)}"}
+                    settled = False
+                    if not service.retry_budget.try_spend():
+                        return {"error": f"Lỗi gọi AI API: {str(e)}"}
+                    await asyncio.sleep(service.retry_policy.delay(attempt))
+                    attempt += 1
+                    continue
+                breaker.record_success()
+                settled = True
+                service.context_usage.record(payload["options"]["num_ctx"], result)
+                break
+        finally:
+            if not settled:
+                breaker.release_trial()
+
+        if service.cache is not None and "error" not in result:
+            service.cache.set(key, result)
+        return result
+
+    async def _send(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Gửi một request tới backend ít tải nhất
+
+        Raises:
+            httpx.HTTPError: Khi request thất bại
+            ValueError: Khi body không phải JSON
+        """
+        self.waiting += 1
+        async with self._semaphore:
+            self.waiting -= 1
+            self.in_flight += 1
+            backends = self.service.backends
+            backend = backends.acquire()
+            start = time.time()
+            ok = False
+            try:
+                response = await self._client.post(backend.url, json=AIService._payload_for(payload, backend))
+                response.raise_for_status()
+                result = response.json()
+                ok = True
+                return result
+            finally:
+                # Mọi lối ra (kể cả CancelledError) đều trả backend, nếu không
+                # outstanding tăng mãi và backend không được chọn nữa
+                self.in_flight -= 1
+                backends.release(backend, time.time() - start, ok=ok)
+
+    @staticmethod
+    def _is_retryable(error: Exception) -> bool:
+        """Chỉ retry lỗi kết nối, timeout, 429, 5xx và body không phải JSON"""
+        if isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            return status == 429 or status >= 500
+        return isinstance(error, (httpx.TransportError, json.JSONDecodeError))
+
+    @staticmethod
+    def _is_client_error(error: Exception) -> bool:
+        """Lỗi 4xx (trừ 429) do chính request gây ra, không phải do backend"""
+        if isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            return 400 <= status < 500 and status != 429
+        return False
+
+    async def _complete(self, kind: str, prompt: str, error_label: str) -> Dict[str, Any]:
+        """Gọi AI cho một loại yêu cầu, phân tích JSON và kiểm tra theo schema"""
+        try:
+            messages = self.service._build_messages(kind, prompt)
+            response = await self._call_chat_api(messages, RESPONSE_SCHEMAS.get(kind), kind)
+
+            if "error" in response:
+                return response
+
+            content = AIService._extract_content(response)
+            if not content:
+                return {"error": "Không nhận được response từ AI"}
+
+            result = AIService._check_schema(kind, AIService._parse_json_response(content, kind))
+            if "error" in result and self.service.cache is not None:
+                self.service.cache.delete(ResponseCache.make_key(
+                    self.service.model, messages, self.service._build_payload(messages, kind=kind)["options"]
+                ))
+            return result
+        except Exception as e:
+            return {"error": f"{error_label}: {str(e)}"}
+
+    async def generate_recipe(self, prompt: str) -> Dict[str, Any]:
+        """Tạo công thức từ prompt"""
+        return await self._complete("recipe", prompt, "Lỗi tạo công thức")
+
+    async def generate_meal_plan(self, prompt: str) -> Dict[str, Any]:
+        """Tạo kế hoạch ăn uống"""
+        return await self._complete("meal_plan", prompt, "Lỗi tạo kế hoạch")
+
+    async def analyze_nutrition(self, prompt: str) -> Dict[str, Any]:
+        """Phân tích thông tin dinh dưỡng"""
+        return await self._complete("nutrition", prompt, "Lỗi phân tích dinh dưỡng")
+
+    async def get_tips(self, prompt: str) -> Dict[str, Any]:
+        """Lấy mẹo nấu nướng"""
+        return await self._complete("tips", prompt, "Lỗi lấy mẹo")
+
+    async def aclose(self):
+        """Đóng HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Số generation đang chạy / đang chờ semaphore / đã được gộp"""
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,242 @@
+"""
+Cân bằng tải giữa nhiều AI backend
+- Chọn backend có ít request đang chạy nhất (least outstanding requests)
+- Health probe định kỳ, tự loại (eject) backend lỗi/chậm; chỉ nhận lại khi
+  hết thời gian loại và probe thành công
+- Thống kê latency cho từng backend
+"""
+
+import time
+import threading
+import logging
+from collections import deque
+from urllib.parse import urlsplit
+from typing import Dict, Any, List, Optional
+
+import requests
+
+from metrics import histogram, LLM_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+UPSTREAM_DURATION = histogram(
+    "ai_upstream_request_duration_seconds",
+    "Thời gian gọi AI backend",
+    ("backend", "outcome"),
+    LLM_BUCKETS,
+)
+
+
+class Backend:
+    """Trạng thái của một AI backend"""
+
+    def __init__(self, url: str, window: int = 200):
+        self.url = url
+        self.outstanding = 0
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_failures = 0
+        self.ejected = False
+        self.ejected_until = 0.0  # Sớm nhất lúc này probe mới được nhận lại backend
+        self.latencies = deque(maxlen=window)
+        self.last_probe_ms: Optional[float] = None
+
+    @property
+    def openai_format(self) -> bool:
+        """Backend nhận API kiểu OpenAI (/v1/chat/completions) thay vì Ollama (/api/chat)"""
+        return "/v1/" in urlsplit(self.url).path
+
+    @property
+    def probe_url(self) -> str:
+        """URL health probe: /v1/models cho API kiểu OpenAI, /api/tags cho Ollama"""
+        parts = urlsplit(self.url)
+        path = "/v1/models" if parts.path.startswith("/v1/") else "/api/tags"
+        return f"{parts.scheme}://{parts.netloc}{path}"
+
+    def is_available(self) -> bool:
+        return not self.ejected
+
+    def eject(self, now: float, seconds: float):
+        """Loại (hoặc gia hạn loại) backend tới khi probe thành công sau `seconds` giây"""
+        self.ejected = True
+        self.ejected_until = now + seconds
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Latency (giây) ở percentile p trong cửa sổ gần nhất"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class BackendPool:
+    """Danh sách AI backend với least-outstanding balancing và health check (thread-safe)"""
+
+    def __init__(self, urls: List[str],
+                 failure_threshold: int = 3,
+                 eject_seconds: float = 30,
+                 probe_interval: float = 10,
+                 probe_timeout: float = 2,
+                 slow_factor: float = 3.0):
+        """
+        Khởi tạo pool
+
+        Args:
+            urls: Danh sách URL chat API của các backend
+            failure_threshold: Số lỗi liên tiếp trước khi loại backend
+            eject_seconds: Thời gian loại backend trước khi thử lại
+            probe_interval: Chu kỳ health probe (giây)
+            probe_timeout: Probe chậm hơn mức này bị tính là lỗi (giây)
+            slow_factor: Loại backend có latency p50 lớn hơn slow_factor lần backend nhanh nhất
+        """
+        if not urls:
+            raise ValueError("BackendPool cần ít nhất một URL")
+        self.backends = [Backend(url) for url in urls]
+        self.failure_threshold = failure_threshold
+        self.eject_seconds = eject_seconds
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.slow_factor = slow_factor
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._probe_thread: Optional[threading.Thread] = None
+
+    def acquire(self, exclude: Optional[Backend] = None) -> Backend:
+        """
+        Chọn backend đang khoẻ có ít request đang chạy nhất
+
+        Nếu tất cả đều bị loại, vẫn chọn trong toàn bộ danh sách để không chặn request.
+
+        Args:
+            exclude: Backend không muốn chọn (VD: khi gửi request dự phòng)
+        """
+        with self._lock:
+            candidates = [b for b in self.backends if b is not exclude] or self.backends
+            available = [b for b in candidates if b.is_available()] or candidates
+            backend = min(available, key=lambda b: (b.outstanding, b.requests))
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    def release(self, backend: Backend, latency: float, ok: bool):
+        """
+        Trả backend sau khi request kết thúc
+
+        Args:
+            backend: Backend đã dùng
+            latency: Thời gian request (giây)
+            ok: Request thành công hay không
+        """
+        UPSTREAM_DURATION.observe(latency, backend=backend.url, outcome="ok" if ok else "error")
+        with self._lock:
+            backend.outstanding -= 1
+            if ok:
+                backend.latencies.append(latency)
+                backend.consecutive_failures = 0
+            else:
+                backend.errors += 1
+                self._record_failure(backend)
+
+    def cancel(self, backend: Backend):
+        """Trả backend khi request không được gửi đi (VD: hết kết nối trong pool)"""
+        with self._lock:
+            backend.outstanding -= 1
+
+    def _record_failure(self, backend: Backend):
+        """Tăng số lỗi liên tiếp, loại (hoặc gia hạn loại) backend khi vượt ngưỡng (gọi khi đã giữ lock)"""
+        backend.consecutive_failures += 1
+        if backend.consecutive_failures >= self.failure_threshold:
+            if backend.is_available():
+                logger.warning(f"⚠️ AI backend ejected: {backend.url}")
+            backend.eject(time.time(), self.eject_seconds)
+
+    def probe(self, session: requests.Session):
+        """Health probe tất cả backend một lượt"""
+        for backend in self.backends:
+            start = time.time()
+            try:
+                response = session.get(backend.probe_url, timeout=self.probe_timeout)
+                ok = response.status_code < 500
+            except requests.exceptions.RequestException:
+                ok = False
+            elapsed = time.time() - start
+
+            with self._lock:
+                backend.last_probe_ms = round(elapsed * 1000, 1)
+                if ok:
+                    backend.consecutive_failures = 0
+                    # Hết thời gian loại và probe thành công: nhận lại backend
+                    if backend.ejected and backend.ejected_until <= time.time():
+                        backend.ejected = False
+                        backend.ejected_until = 0.0
+                        logger.info(f"✅ AI backend readmitted: {backend.url}")
+                else:
+                    self._record_failure(backend)
+
+        self._eject_slow()
+
+    def _eject_slow(self, min_samples: int = 20):
+        """Loại backend chậm bất thường so với backend nhanh nhất"""
+        if len(self.backends) < 2:
+            return
+        now = time.time()
+        with self._lock:
+            medians = {
+                b: b.percentile(50) for b in self.backends
+                if b.is_available() and len(b.latencies) >= min_samples
+            }
+            if len(medians) < 2:
+                return
+            fastest = min(medians.values())
+            for backend, median in medians.items():
+                if median > fastest * self.slow_factor:
+                    backend.eject(now, self.eject_seconds)
+                    # Xoá cửa sổ latency để lần đánh giá sau dựa trên số liệu mới
+                    backend.latencies.clear()
+                    logger.warning(f"⚠️ AI backend ejected (slow): {backend.url}")
+
+    def start_health_checks(self, session: requests.Session):
+        """Chạy health probe định kỳ trên thread nền"""
+        if self._probe_thread is not None:
+            return
+
+        def loop():
+            while not self._stop.wait(self.probe_interval):
+                self.probe(session)
+
+        self._probe_thread = threading.Thread(target=loop, name="ai-backend-probe", daemon=True)
+        self._probe_thread.start()
+
+    def reset_health_checks(self):
+        """Quên thread probe cũ (VD: trong process con sau fork, thread đó không còn)"""
+        self._stop = threading.Event()
+        self._probe_thread = None
+
+    def stop(self):
+        """Dừng health probe"""
+        self._stop.set()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """
+        Thống kê từng backend
+
+        Returns:
+            Danh sách dict: trạng thái, số request, lỗi, latency p50/p95
+        """
+        result = []
+        with self._lock:
+            for b in self.backends:
+                p50 = b.percentile(50)
+                p95 = b.percentile(95)
+                result.append({
+                    "url": b.url,
+                    "healthy": b.is_available(),
+                    "outstanding": b.outstanding,
+                    "requests": b.requests,
+                    "errors": b.errors,
+                    "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                    "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                    "last_probe_ms": b.last_probe_ms,
+                })
+        return result
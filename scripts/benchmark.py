@@ -0,0 +1,329 @@
+"""
+Benchmark các Flask route với mock AI backend (chạy offline)
+- Tự khởi động mock_llm_server.py (Ollama hoặc OpenAI API) trong process riêng
+- Gọi từng endpoint ở nhiều mức concurrency
+- Báo cáo req/s, p50/p95/p99, bộ nhớ; xuất JSON để so sánh giữa các lần chạy
+
+Ví dụ:
+    python benchmark.py --concurrency 1,8,32 --requests 200 --output bench.json
+    python benchmark.py --latency 0.5 --token-rate 40 --compare bench.json
+    python benchmark.py --url http://localhost:5000 --endpoints health,clone-recipes
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import platform
+import argparse
+import tempfile
+import threading
+import subprocess
+import logging
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, List, Optional, Tuple
+
+import requests
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Tên scenario -> (method, path, hàm tạo body theo số thứ tự request)
+# Body khác nhau giữa các request để cache/single-flight không làm sai số liệu
+SCENARIOS: Dict[str, Tuple[str, str, Callable[[int], Optional[Dict[str, Any]]]]] = {
+    "health": ("GET", "/api/health", lambda i: None),
+    "suggest-recipe": ("POST", "/api/suggest-recipe", lambda i: {
+        "ingredients": ["cà chua", "trứng gà", f"nguyên liệu {i}"], "cuisine": "Việt Nam", "difficulty": "dễ"}),
+    "suggest-recipe-stream": ("POST", "/api/suggest-recipe?stream=1", lambda i: {
+        "ingredients": ["thịt bò", f"nguyên liệu {i}"], "cuisine": "Việt Nam", "difficulty": "dễ"}),
+    "async-suggest-recipe": ("POST", "/api/async/suggest-recipe", lambda i: {
+        "ingredients": ["cá", f"nguyên liệu {i}"], "cuisine": "Việt Nam", "difficulty": "dễ"}),
+    "meal-plan": ("POST", "/api/meal-plan", lambda i: {
+        "days": 7, "dietary": "", "preferences": [f"sở thích {i}"]}),
+    "analyze-recipe": ("POST", "/api/analyze-recipe", lambda i: {
+        "title": f"Món {i}", "ingredients": ["500g thịt bò", "2 cái cà rốt", f"nguyên liệu lạ {i}"]}),
+    "analyze-recipe-local": ("POST", "/api/analyze-recipe", lambda i: {
+        "title": f"Món {i}", "ingredients": ["500g thịt bò", "2 cái cà rốt", f"{i % 9 + 1} quả trứng gà"]}),
+    "cooking-tips": ("POST", "/api/cooking-tips", lambda i: {
+        "dish": f"Món {i}", "problem": "Thịt bị dai"}),
+    "clone-recipes": ("GET", "/api/clone/recipes", lambda i: None),
+    "clone-search": ("GET", "/api/clone/search?q=thit+bo", lambda i: None),
+}
+
+DEFAULT_ENDPOINTS = "health,suggest-recipe,meal-plan,analyze-recipe,cooking-tips,clone-recipes"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _rss_mb() -> Optional[float]:
+    """RSS hiện tại của process (MB), None nếu không đọc được"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """RSS lớn nhất từ lúc process chạy (MB)"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux trả KB, macOS trả byte
+        return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    except (ImportError, OSError):
+        return None
+
+
+def _percentile(ordered: List[float], p: float) -> float:
+    """Percentile theo nearest-rank trên danh sách đã sắp xếp"""
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SCRIPTS_DIR,
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def start_mock(args) -> Tuple[subprocess.Popen, str]:
+    """Chạy mock_llm_server.py trong process riêng, chờ tới khi sẵn sàng"""
+    port = _free_port()
+    command = [
+        sys.executable, os.path.join(SCRIPTS_DIR, "mock_llm_server.py"),
+        "--port", str(port),
+        "--latency", str(args.latency),
+        "--token-rate", str(args.token_rate),
+        "--output-tokens", str(args.output_tokens),
+        "--malformed-ratio", str(args.malformed_ratio),
+    ]
+    if args.seed is not None:
+        command += ["--seed", str(args.seed)]
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            requests.get(f"{base_url}/api/tags", timeout=0.5)
+            return process, base_url
+        except requests.exceptions.RequestException:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Mock LLM server không khởi động được")
+
+
+def load_app(args, mock_url: str):
+    """Import app.py với cấu hình trỏ tới mock, database trong thư mục tạm"""
+    chat_path = "/v1/chat/completions" if args.api == "openai" else "/api/chat"
+    os.environ["AI_HOST"] = mock_url + chat_path
+    os.environ.setdefault("AI_READ_TIMEOUT", "300")
+    if not args.cache:
+        os.environ["AI_CACHE_SIZE"] = "0"
+        os.environ["AI_SEMANTIC_THRESHOLD"] = "0"
+    os.chdir(tempfile.mkdtemp(prefix="cookbook-bench-"))
+    sys.path.insert(0, SCRIPTS_DIR)
+
+    import app as app_module
+    logging.getLogger().setLevel(logging.WARNING)
+    for handler in logging.getLogger().handlers:
+        handler.setLevel(logging.WARNING)
+    app_module.recipe_cloner.clone_from_json(os.path.join(SCRIPTS_DIR, "sample_recipes.json"))
+    return app_module.app
+
+
+class InProcessClient:
+    """Gọi route qua Flask test client (không tính chi phí mạng/WSGI server)"""
+
+    def __init__(self, flask_app):
+        self._app = flask_app
+        self._local = threading.local()
+
+    def request(self, method: str, path: str, body: Optional[Dict[str, Any]]) -> Tuple[int, bytes]:
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self._app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+
+class HTTPClient:
+    """Gọi route qua HTTP tới server đang chạy (VD: serve mode nhiều worker)"""
+
+    def __init__(self, base_url: str, timeout: float = 300):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def request(self, method: str, path: str, body: Optional[Dict[str, Any]]) -> Tuple[int, bytes]:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        response = session.request(method, self.base_url + path, json=body, timeout=self.timeout)
+        return response.status_code, response.content
+
+
+def run_scenario(client, name: str, concurrency: int, total: int, warmup: int = 3) -> Dict[str, Any]:
+    """Gọi một scenario total lần với concurrency worker, trả về thống kê"""
+    method, path, make_body = SCENARIOS[name]
+    for i in range(warmup):
+        client.request(method, path, make_body(-1 - i))
+
+    counter = iter(range(total))
+    counter_lock = threading.Lock()
+    latencies: List[float] = []
+    errors = 0
+    app_errors = 0
+    result_lock = threading.Lock()
+
+    def worker():
+        nonlocal errors, app_errors
+        while True:
+            with counter_lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            start = time.perf_counter()
+            try:
+                status, data = client.request(method, path, make_body(i))
+            except Exception:
+                status, data = 599, b""
+            elapsed = time.perf_counter() - start
+            with result_lock:
+                latencies.append(elapsed)
+                if status >= 400:
+                    errors += 1
+                elif b'"error"' in data:
+                    app_errors += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    duration = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "endpoint": name,
+        "concurrency": concurrency,
+        "requests": len(ordered),
+        "errors": errors,
+        "app_errors": app_errors,
+        "duration_s": round(duration, 3),
+        "rps": round(len(ordered) / duration, 2) if duration else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else 0.0,
+        "p50_ms": round(_percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(_percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(_percentile(ordered, 99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+        "rss_mb": _rss_mb(),
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def print_table(results: List[Dict[str, Any]], baseline: Optional[Dict[Tuple[str, int], Dict]] = None):
+    header = f"{'endpoint':<24}{'conc':>5}{'req':>7}{'err':>5}{'req/s':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'rss MB':>9}"
+    if baseline:
+        header += f"{'Δ req/s':>10}{'Δ p95':>9}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        line = (f"{r['endpoint']:<24}{r['concurrency']:>5}{r['requests']:>7}{r['errors'] + r['app_errors']:>5}"
+                f"{r['rps']:>10.1f}{r['p50_ms']:>9.1f}{r['p95_ms']:>9.1f}{r['p99_ms']:>9.1f}"
+                f"{(r['rss_mb'] or 0):>9.1f}")
+        old = (baseline or {}).get((r["endpoint"], r["concurrency"]))
+        if old:
+            def delta(new, before):
+                return f"{(new - before) / before * 100:+.1f}%" if before else "n/a"
+            line += f"{delta(r['rps'], old['rps']):>10}{delta(r['p95_ms'], old['p95_ms']):>9}"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Cookbook AI backend với mock LLM")
+    parser.add_argument("--endpoints", default=DEFAULT_ENDPOINTS,
+                        help=f"Danh sách scenario, cách nhau bằng dấu phẩy ({', '.join(SCENARIOS)})")
+    parser.add_argument("--concurrency", default="1,8,32", help="Các mức concurrency, VD: 1,8,32")
+    parser.add_argument("--requests", type=int, default=100, help="Số request mỗi scenario mỗi mức")
+    parser.add_argument("--api", choices=("ollama", "openai"), default="ollama", help="Kiểu API của mock")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mock: thời gian tới token đầu (giây)")
+    parser.add_argument("--token-rate", type=float, default=0, help="Mock: token/giây (0 = không giới hạn)")
+    parser.add_argument("--output-tokens", type=int, default=200, help="Mock: số token output")
+    parser.add_argument("--malformed-ratio", type=float, default=0.0, help="Mock: tỉ lệ output hỏng")
+    parser.add_argument("--seed", type=int, default=None, help="Mock: seed random")
+    parser.add_argument("--cache", action="store_true", help="Bật cache AI (mặc định tắt để đo đường gọi thật)")
+    parser.add_argument("--url", default=None, help="Benchmark server đang chạy thay vì import app.py")
+    parser.add_argument("--output", default=None, help="Ghi kết quả JSON ra file")
+    parser.add_argument("--compare", default=None, help="File JSON kết quả cũ để so sánh")
+    args = parser.parse_args(argv)
+
+    names = [n.strip() for n in args.endpoints.split(",") if n.strip()]
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"Scenario không tồn tại: {', '.join(unknown)}")
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    # load_app() chuyển sang thư mục tạm: đổi đường dẫn file sang tuyệt đối trước
+    if args.output:
+        args.output = os.path.abspath(args.output)
+
+    mock = None
+    if args.url:
+        client = HTTPClient(args.url)
+    else:
+        mock, mock_url = start_mock(args)
+        client = InProcessClient(load_app(args, mock_url))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = {(r["endpoint"], r["concurrency"]): r for r in json.load(f)["results"]}
+
+    results = []
+    try:
+        for name in names:
+            for level in levels:
+                result = run_scenario(client, name, level, args.requests)
+                results.append(result)
+                print(f"  {name} x{level}: {result['rps']} req/s, p95 {result['p95_ms']} ms", file=sys.stderr)
+    finally:
+        if mock is not None:
+            mock.terminate()
+            mock.wait(timeout=5)
+
+    print_table(results, baseline)
+
+    if args.output:
+        report = {
+            "meta": {
+                "timestamp": datetime.now().isoformat(timespec="seconds"),
+                "git_commit": _git_commit(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "target": args.url or "in-process",
+                "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+            },
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"💾 Saved results to {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Benchmark thao tác SQLite của RecipeCloner với số lượng công thức lớn
+- Sinh N công thức giả (mỗi công thức vài nguyên liệu) vào database tạm
+- Đo list_all_recipes, một trang list_recipes, import theo lô (add_recipes), tìm kiếm
+  full-text (search) và cách cũ (một query nguyên liệu cho mỗi công thức) để so sánh
+
+Ví dụ:
+    python benchmark_db.py --sizes 1000,10000,100000
+    python benchmark_db.py --sizes 1000,10000 --n-plus-one --output bench_db.json
+"""
+
+import os
+import sys
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import tempfile
+from datetime import datetime
+from typing import Dict, Any, List
+
+from recipe_cloner import RecipeCloner
+
+SEED_INGREDIENTS = ("thịt bò", "thịt gà", "đậu phụ", "cà chua", "hành lá", "tỏi", "nước mắm",
+                    "trứng gà", "cà rốt", "gừng", "sả", "tôm", "nấm hương", "rau muống")
+
+
+def seed(db_path: str, count: int, ingredients_per_recipe: int = 8):
+    """Ghi count công thức giả thẳng vào database (nhanh hơn nhiều so với _add_recipe)"""
+    conn = sqlite3.connect(db_path)
+    now = datetime.now().isoformat()
+    steps = json.dumps(["Sơ chế nguyên liệu", "Nấu", "Trình bày"], ensure_ascii=False)
+    types = ("Việt Nam", "Á Đông", "Âu", "Khác")
+    # Nguyên liệu ghi trước (kết nối này không bật foreign_keys): trigger FTS của
+    # recipes index mỗi công thức một lần thay vì cập nhật lại sau từng nguyên liệu
+    conn.executemany(
+        'INSERT INTO ingredients (recipeId, name, isChecked) VALUES (?, ?, 0)',
+        ((i, f"{j + 1}00g {SEED_INGREDIENTS[(i * 7 + j) % len(SEED_INGREDIENTS)]} {(i * 7 + j) % 500}")
+         for i in range(1, count + 1) for j in range(ingredients_per_recipe))
+    )
+    conn.executemany(
+        'INSERT INTO recipes (id, title, imageUrl, description, steps, durationInMinutes, type, source, cloned_at) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        ((i, f"Món thử {i}", "", f"Mô tả món {i}", steps, 10 + i % 90, types[i % len(types)],
+          "benchmark", now) for i in range(1, count + 1))
+    )
+    conn.commit()
+    conn.close()
+
+
+def list_n_plus_one(db_path: str) -> List[Dict]:
+    """Cách liệt kê cũ: một SELECT nguyên liệu cho mỗi công thức"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    result = []
+    for recipe in cursor.execute('SELECT * FROM recipes').fetchall():
+        recipe_dict = dict(recipe)
+        cursor.execute('SELECT * FROM ingredients WHERE recipeId = ?', (recipe_dict['id'],))
+        recipe_dict['ingredients'] = [dict(ing) for ing in cursor.fetchall()]
+        recipe_dict['steps'] = json.loads(recipe_dict['steps'])
+        result.append(recipe_dict)
+    conn.close()
+    return result
+
+
+def import_batch(cloner: RecipeCloner, prefix: str, count: int = 1000) -> Dict[str, Any]:
+    """Import count công thức mới qua add_recipes (title mới mỗi lần gọi)"""
+    return cloner.add_recipes(
+        {"title": f"{prefix} {i}", "ingredients": ["100g thịt bò", "1 quả trứng gà", "2 cái cà rốt"],
+         "steps": ["Sơ chế", "Nấu"], "durationInMinutes": 20} for i in range(count)
+    )
+
+
+def _time(fn, repeat: int) -> Dict[str, float]:
+    """Chạy fn repeat lần, trả về thời gian tốt nhất/trung bình (ms)"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {"best_ms": round(min(timings), 1), "mean_ms": round(sum(timings) / len(timings), 1)}
+
+
+def run_size(count: int, args) -> List[Dict[str, Any]]:
+    """Benchmark các thao tác trên database có count công thức"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "recipes.db")
+        cloner = RecipeCloner(db_path)
+        start = time.perf_counter()
+        seed(db_path, count, args.ingredients)
+        seed_ms = (time.perf_counter() - start) * 1000
+
+        cases = {
+            "list_all_recipes": lambda: cloner.list_all_recipes(),
+            "list_recipes(limit=100)": lambda: cloner.list_recipes(cursor=count // 2, limit=100),
+            "iter_recipes(type, fields)": lambda: sum(
+                1 for _ in cloner.iter_recipes(recipe_type="Âu", fields=["title", "ingredients"])),
+            "add_recipes(1000)": lambda: import_batch(cloner, f"Import {time.perf_counter_ns()}"),
+            # Từ rất phổ biến / nhiều từ / không dấu với đ / khớp một công thức
+            "search('thit')": lambda: cloner.search("thit"),
+            "search('thit bo ca rot')": lambda: cloner.search("thit bo ca rot"),
+            "search('dau phu', page 3)": lambda: cloner.search("dau phu", offset=40),
+            "search('mon thu 4242')": lambda: cloner.search(f"mon thu {count // 2 + 42}"),
+        }
+        if args.n_plus_one and count <= args.n_plus_one_max:
+            cases["n+1 (cũ)"] = lambda: list_n_plus_one(db_path)
+            # Chạy cuối vì xoá index
+            cases["n+1, không index (cũ)"] = lambda: list_n_plus_one(db_path)
+
+        results = []
+        for name, fn in cases.items():
+            if "không index" in name:
+                with sqlite3.connect(db_path) as conn:
+                    conn.execute('DROP INDEX IF EXISTS idx_ingredients_recipeId')
+            stats = _time(fn, args.repeat)
+            results.append({"recipes": count, "case": name, "seed_ms": round(seed_ms, 1), **stats})
+            print(f"{count:>8} {name:<28} best {stats['best_ms']:>10.1f} ms   mean {stats['mean_ms']:>10.1f} ms",
+                  flush=True)
+        return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark SQLite của RecipeCloner")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Số công thức, VD: 1000,10000")
+    parser.add_argument("--ingredients", type=int, default=8, help="Số nguyên liệu mỗi công thức")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần chạy mỗi thao tác")
+    parser.add_argument("--n-plus-one", action="store_true", help="Đo thêm cách cũ (một query mỗi công thức)")
+    parser.add_argument("--n-plus-one-max", type=int, default=10000,
+                        help="Chỉ đo cách cũ khi số công thức không vượt quá giá trị này")
+    parser.add_argument("--output", default=None, help="Ghi kết quả JSON ra file")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    results = []
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        results.extend(run_size(size, args))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"sqlite": sqlite3.sqlite_version, "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"💾 Saved: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""
+Chọn num_ctx theo từng request thay vì cố định
+- Ước lượng nhanh số token của messages
+- Cộng số token output dự kiến của từng loại yêu cầu
+- Làm tròn lên theo bucket để Ollama không phải load lại model liên tục
+"""
+
+import threading
+from typing import Dict, Any, List, Optional, Tuple
+
+from metrics import counter, histogram, TOKEN_BUCKETS
+
+# Các mức num_ctx được phép dùng
+CONTEXT_BUCKETS = (2048, 4096, 8192, 16384, 32768)
+
+# Số token output dự kiến cho từng loại yêu cầu
+EXPECTED_OUTPUT_TOKENS = {
+    "recipe": 1024,
+    "meal_plan": 2048,
+    "nutrition": 768,
+    "tips": 512,
+}
+DEFAULT_OUTPUT_TOKENS = 1024
+
+# Token phụ cho mỗi message (role, chat template)
+_MESSAGE_OVERHEAD = 8
+
+PROMPT_TOKENS = histogram("ai_prompt_tokens", "Số token prompt mỗi request (backend báo về)", buckets=TOKEN_BUCKETS)
+COMPLETION_TOKENS = histogram("ai_completion_tokens", "Số token output mỗi request (backend báo về)", buckets=TOKEN_BUCKETS)
+# Theo từng bucket num_ctx được cấp: so token thực dùng với mức cấp để chỉnh CONTEXT_BUCKETS
+CONTEXT_REQUESTS = counter("ai_context_requests_total", "Số request theo num_ctx được cấp", ("num_ctx",))
+CONTEXT_USED_TOKENS = histogram(
+    "ai_context_used_tokens", "Số token thực dùng (prompt + output) theo num_ctx được cấp",
+    ("num_ctx",), buckets=TOKEN_BUCKETS,
+)
+CONTEXT_UTILIZATION = histogram(
+    "ai_context_utilization_ratio", "Tỉ lệ token thực dùng / num_ctx được cấp",
+    ("num_ctx",), buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0, 1.5),
+)
+CONTEXT_OVERFLOWS = counter("ai_context_overflows_total", "Số request dùng nhiều token hơn num_ctx được cấp", ("num_ctx",))
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Ước lượng số token của text
+
+    Tiếng Việt có dấu thường tốn ~1 token cho mỗi 2-3 ký tự nên dùng
+    len / 2.5 để ước lượng dư thay vì thiếu.
+    """
+    return len(text) * 2 // 5 + 1
+
+
+def estimate_messages_tokens(messages: List[Dict[str, str]]) -> int:
+    """Ước lượng tổng số token của danh sách message"""
+    return sum(estimate_tokens(m.get("content", "")) + _MESSAGE_OVERHEAD for m in messages)
+
+
+def pick_context_size(messages: List[Dict[str, str]], kind: Optional[str], max_ctx: int) -> int:
+    """
+    Chọn num_ctx cho một request
+
+    Args:
+        messages: Danh sách message gửi đi
+        kind: Loại yêu cầu (recipe, meal_plan, nutrition, tips)
+        max_ctx: Giới hạn trên
+
+    Returns:
+        Bucket nhỏ nhất đủ chứa prompt + output dự kiến (không vượt max_ctx)
+    """
+    needed = estimate_messages_tokens(messages) + EXPECTED_OUTPUT_TOKENS.get(kind, DEFAULT_OUTPUT_TOKENS)
+    for bucket in CONTEXT_BUCKETS:
+        if bucket >= needed:
+            return min(bucket, max_ctx)
+    return max_ctx
+
+
+def token_counts(response: Dict[str, Any]) -> Optional[Tuple[int, int]]:
+    """
+    Số token (prompt, output) từ response của backend
+
+    Hỗ trợ Ollama (prompt_eval_count, eval_count) và OpenAI (usage)
+    """
+    if "usage" in response:
+        usage = response.get("usage") or {}
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    if "eval_count" in response or "prompt_eval_count" in response:
+        return response.get("prompt_eval_count", 0), response.get("eval_count", 0)
+    return None
+
+
+def observed_tokens(response: Dict[str, Any]) -> Optional[int]:
+    """Số token thực tế (prompt + output) từ response của backend"""
+    counts = token_counts(response)
+    return sum(counts) if counts is not None else None
+
+
+class ContextUsage:
+    """Thống kê context được cấp phát so với context thực dùng (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.allocated = 0
+        self.observed = 0
+        self.overflows = 0
+        self.by_bucket: Dict[int, int] = {}
+
+    def record(self, allocated: int, response: Dict[str, Any]):
+        """Ghi nhận một response thành công"""
+        counts = token_counts(response)
+        CONTEXT_REQUESTS.inc(num_ctx=allocated)
+        if counts is not None:
+            used = sum(counts)
+            PROMPT_TOKENS.observe(counts[0])
+            COMPLETION_TOKENS.observe(counts[1])
+            CONTEXT_USED_TOKENS.observe(used, num_ctx=allocated)
+            if allocated:
+                CONTEXT_UTILIZATION.observe(used / allocated, num_ctx=allocated)
+            if used > allocated:
+                CONTEXT_OVERFLOWS.inc(num_ctx=allocated)
+        with self._lock:
+            self.by_bucket[allocated] = self.by_bucket.get(allocated, 0) + 1
+            if counts is None:
+                return
+            used = sum(counts)
+            self.requests += 1
+            self.allocated += allocated
+            self.observed += used
+            if used > allocated:
+                self.overflows += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "avg_allocated": round(self.allocated / self.requests) if self.requests else 0,
+                "avg_observed": round(self.observed / self.requests) if self.requests else 0,
+                "utilization": round(self.observed / self.allocated, 4) if self.allocated else 0.0,
+                "overflows": self.overflows,
+                "by_bucket": {str(k): v for k, v in sorted(self.by_bucket.items())},
+            }
@@ -0,0 +1,153 @@
+"""
+Pipeline import công thức cho file lớn
+- Thread đọc (thread gọi run) parse file và chia lô
+- Process pool chuẩn hoá các lô song song (CPU-bound, không bị GIL giới hạn);
+  với NDJSON, việc parse từng dòng cũng chạy trong process con
+- Một thread ghi duy nhất commit từng lô vào SQLite theo đúng thứ tự đọc
+- Hàng đợi có giới hạn: thread đọc chờ khi thread ghi chưa theo kịp
+
+Chạy: python import_pipeline.py recipes.json --workers 4 [--db recipes.db] [--offset N]
+"""
+
+import os
+import sys
+import time
+import queue
+import logging
+import argparse
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def batched(items: Iterable[Any], size: int) -> Iterable[List[Any]]:
+    """Chia iterable thành các list tối đa size phần tử"""
+    batch: List[Any] = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ImportPipeline:
+    """Chuẩn hoá song song trên process pool, ghi tuần tự trên một thread"""
+
+    def __init__(self,
+                 normalize: Callable[[List[Any]], Any],
+                 write: Callable[..., Dict[str, Any]],
+                 workers: Optional[int] = None,
+                 queue_size: Optional[int] = None):
+        """
+        Khởi tạo pipeline
+
+        Args:
+            normalize: Hàm chuẩn hoá một lô, chạy trong process con nên phải pickle được
+                       (hàm top-level hoặc functools.partial của hàm top-level)
+            write: Hàm ghi kết quả của normalize (gọi write(*kết quả)), trả về thống kê lô
+            workers: Số process chuẩn hoá (mặc định số CPU)
+            queue_size: Số lô tối đa đang chuẩn hoá/chờ ghi (mặc định 2 x workers)
+        """
+        self.normalize = normalize
+        self.write = write
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size or self.workers * 2
+
+    def run(self, batches: Iterable[Tuple[List[Any], Any]],
+            on_batch: Callable[[Dict[str, Any], Any], None]):
+        """
+        Chạy pipeline tới khi hết batches
+
+        Args:
+            batches: Iterable (lô, context); context được trả lại nguyên vẹn cho on_batch
+                     (VD: byte offset sau lô để resume)
+            on_batch: Gọi trên thread ghi sau mỗi lô, theo thứ tự lô, với (thống kê, context)
+
+        Raises:
+            Lỗi đầu tiên của on_batch hoặc của việc đọc batches
+        """
+        pending: "queue.Queue[Optional[Tuple[Any, int, Any]]]" = queue.Queue(maxsize=self.queue_size)
+        errors: List[BaseException] = []
+
+        def writer():
+            while True:
+                item = pending.get()
+                if item is None:
+                    return
+                future, size, context = item
+                if errors:
+                    future.cancel()
+                    continue  # Đã lỗi: chỉ rút hết hàng đợi để thread đọc không bị chặn
+                try:
+                    normalized = future.result()
+                    stats = self.write(*normalized)
+                except Exception as e:
+                    logger.error(f"❌ Error importing batch: {e}")
+                    stats = {"inserted": 0, "skipped": 0, "failed": size, "errors": [{"error": str(e)}]}
+                try:
+                    on_batch(stats, context)
+                except Exception as e:
+                    errors.append(e)
+
+        # spawn: giống nhau trên mọi hệ điều hành và không fork process đang có thread
+        with ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            thread = threading.Thread(target=writer, name="recipe-import-writer", daemon=True)
+            thread.start()
+            try:
+                for batch, context in batches:
+                    if errors:
+                        break
+                    # Chặn khi hàng đợi đầy (backpressure)
+                    pending.put((executor.submit(self.normalize, batch), len(batch), context))
+            finally:
+                pending.put(None)
+                thread.join()
+        if errors:
+            raise errors[0]
+
+
+def main(argv=None):
+    from recipe_cloner import RecipeCloner, IMPORT_BATCH_SIZE
+
+    parser = argparse.ArgumentParser(description="Import file công thức lớn (mảng JSON hoặc NDJSON)")
+    parser.add_argument("file", help="Đường dẫn file JSON/NDJSON")
+    parser.add_argument("--db", default="recipes.db", help="Database đích")
+    # Chừa một core cho thread đọc/ghi; máy một core chạy tuần tự (pickle chỉ tốn thêm)
+    parser.add_argument("--workers", type=int, default=max((os.cpu_count() or 1) - 1, 0),
+                        help="Số process chuẩn hoá (0 = chạy tuần tự)")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Số công thức mỗi transaction")
+    parser.add_argument("--offset", type=int, default=0, help="Byte offset để tiếp tục lần import trước")
+    parser.add_argument("--source", default="json_import", help="Giá trị cột source")
+    args = parser.parse_args(argv)
+
+    cloner = RecipeCloner(args.db)
+    start = time.perf_counter()
+
+    def on_progress(progress):
+        percent = progress["offset"] * 100 / max(progress["total_bytes"], 1)
+        rate = progress["records"] / max(time.perf_counter() - start, 1e-9)
+        print(f"\r📥 {percent:5.1f}%  {progress['records']} đọc, {progress['inserted']} thêm, "
+              f"{progress['skipped']} trùng, {progress['failed']} lỗi  ({rate:.0f}/s)  offset {progress['offset']}",
+              end="", flush=True)
+
+    result = cloner.import_json(args.file, offset=args.offset, batch_size=args.batch_size,
+                                on_progress=on_progress, workers=args.workers, source=args.source)
+    print()
+    print(f"✅ {result['inserted']} thêm, {result['skipped']} trùng, {result['failed']} lỗi "
+          f"trong {time.perf_counter() - start:.1f}s")
+    if "error" in result:
+        print(f"❌ {result['error']}")
+        if "offset" in result:
+            print(f"   Tiếp tục bằng: --offset {result['offset']}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,232 @@
+"""
+Hàng đợi job nền cho các generation chạy lâu (VD: meal-plan 7+ ngày)
+- Submit trả về job ID ngay, worker pool riêng chạy job
+- Trạng thái và kết quả lưu trong SQLite, tự xoá sau TTL
+"""
+
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, wait
+from typing import Dict, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+
+
+class JobQueue:
+    """Worker pool + lưu trạng thái job trong SQLite (thread-safe)"""
+
+    def __init__(self, db_path: str = "jobs.db", workers: int = 4,
+                 ttl: float = 86400, max_pending: int = 100):
+        """
+        Khởi tạo hàng đợi
+
+        Args:
+            db_path: Đường dẫn SQLite lưu job
+            workers: Số job chạy song song
+            ttl: Thời gian giữ job sau khi tạo/kết thúc (giây)
+            max_pending: Số job đang chờ + đang chạy tối đa
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_pending = max_pending
+        self.pending = 0
+        self.submitted = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._last_purge = 0.0
+        # job ID -> Future của job chưa xong, để shutdown huỷ/chờ có thời hạn
+        self._futures: Dict[str, Future] = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job-worker')
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def _init_db(self):
+        """Tạo bảng jobs, đánh dấu lỗi các job dở dang của lần chạy trước"""
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        now = time.time()
+        conn.execute('DELETE FROM jobs WHERE expires_at < ?', (now,))
+        conn.execute(
+            'UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE status IN (?, ?)',
+            (ERROR, "Server khởi động lại khi job đang chạy", now, QUEUED, RUNNING)
+        )
+        conn.commit()
+        conn.close()
+
+    def _purge_expired(self):
+        """Xoá job hết hạn (tối đa mỗi phút một lần)"""
+        now = time.time()
+        with self._lock:
+            if now - self._last_purge < 60:
+                return
+            self._last_purge = now
+        try:
+            conn = self._connect()
+            conn.execute('DELETE FROM jobs WHERE expires_at < ?', (now,))
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Job purge error: {e}")
+
+    def submit(self, job_type: str, fn: Callable[[], Dict[str, Any]]) -> Optional[str]:
+        """
+        Đưa job vào hàng đợi
+
+        Args:
+            job_type: Loại job (VD: tên endpoint)
+            fn: Hàm chạy job, trả về dict kết quả (có key "error" nếu thất bại)
+
+        Returns:
+            Job ID, hoặc None nếu hàng đợi đã đầy
+        """
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                return None
+            self.pending += 1
+            self.submitted += 1
+
+        self._purge_expired()
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute(
+                'INSERT INTO jobs (id, type, status, created_at, expires_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, job_type, QUEUED, now, now + self.ttl)
+            )
+            conn.commit()
+            conn.close()
+        except sqlite3.Error:
+            with self._lock:
+                self.pending -= 1
+            raise
+
+        with self._lock:
+            self._futures[job_id] = self._executor.submit(self._run, job_id, fn)
+        logger.info(f"📥 Job queued: {job_id} ({job_type})")
+        return job_id
+
+    def _run(self, job_id: str, fn: Callable[[], Dict[str, Any]]):
+        """Chạy job trên worker và lưu kết quả"""
+        try:
+            self._update(job_id, status=RUNNING, started_at=time.time())
+            try:
+                result = fn()
+                error = result.get("error") if isinstance(result, dict) else None
+            except Exception as e:
+                result, error = None, str(e)
+
+            now = time.time()
+            self._update(
+                job_id,
+                status=ERROR if error else DONE,
+                result=json.dumps(result, ensure_ascii=False) if result is not None else None,
+                error=error,
+                finished_at=now,
+                expires_at=now + self.ttl,
+            )
+            logger.info(f"{'❌' if error else '✅'} Job {job_id} finished")
+        except sqlite3.Error as e:
+            logger.error(f"Error saving job {job_id}: {e}")
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self._futures.pop(job_id, None)
+
+    def _fail(self, job_id: str, error: str):
+        """Đánh dấu job lỗi (không raise)"""
+        now = time.time()
+        try:
+            self._update(job_id, status=ERROR, error=error, finished_at=now, expires_at=now + self.ttl)
+        except sqlite3.Error as e:
+            logger.error(f"Error saving job {job_id}: {e}")
+
+    def _update(self, job_id: str, **fields):
+        columns = ', '.join(f'{name} = ?' for name in fields)
+        conn = self._connect()
+        conn.execute(f'UPDATE jobs SET {columns} WHERE id = ?', (*fields.values(), job_id))
+        conn.commit()
+        conn.close()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Lấy trạng thái và kết quả job
+
+        Returns:
+            Dict {id, type, status, result, error, created_at, started_at, finished_at}
+            hoặc None nếu không tồn tại / đã hết hạn
+        """
+        conn = self._connect()
+        conn.row_factory = sqlite3.Row
+        row = conn.execute(
+            'SELECT * FROM jobs WHERE id = ? AND expires_at >= ?', (job_id, time.time())
+        ).fetchone()
+        conn.close()
+        if row is None:
+            return None
+
+        job = dict(row)
+        job.pop('expires_at')
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê hàng đợi"""
+        with self._lock:
+            return {
+                "pending": self.pending,
+                "max_pending": self.max_pending,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+            }
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """
+        Dừng worker pool
+
+        Job chưa chạy bị huỷ và đánh dấu lỗi ngay. Job đang chạy được chờ tối đa
+        timeout giây (None = chờ hết); quá hạn thì cũng đánh dấu lỗi vì process sắp
+        thoát, job vẫn xong kịp thì kết quả ghi đè trạng thái lỗi.
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            futures = dict(self._futures)
+        running = {}
+        for job_id, future in futures.items():
+            if future.cancelled():
+                with self._lock:
+                    self.pending -= 1
+                    self._futures.pop(job_id, None)
+                self._fail(job_id, "Server dừng trước khi job chạy")
+            else:
+                running[future] = job_id
+        if not running:
+            return
+        _, unfinished = wait(running, timeout=timeout)
+        for future in unfinished:
+            logger.warning(f"⚠️ Job {running[future]} still running at shutdown")
+            self._fail(running[future], "Server dừng khi job đang chạy")
@@ -0,0 +1,272 @@
+"""
+Trích xuất JSON từ output của model
+- Quét một lần để tìm object/array JSON cân bằng đầu tiên (bỏ qua prose, ``` fence),
+  có thể chỉ nhận object ngoài cùng hoặc bỏ qua giá trị không đúng schema
+- Sửa lỗi thường gặp: dấu phẩy thừa, output bị cắt giữa chừng
+- Hoạt động tăng dần trên token stream (feed từng đoạn)
+"""
+
+import json
+from typing import Any, Callable, List, Optional
+
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+class JSONExtractionError(ValueError):
+    """Không tìm thấy JSON hợp lệ trong output"""
+
+
+def _remove_trailing_commas(text: str) -> str:
+    """Bỏ dấu phẩy đứng ngay trước } hoặc ] (không đụng tới nội dung chuỗi)"""
+    out: List[str] = []
+    in_string = False
+    escape = False
+    pending_comma = -1
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch in '}]' and pending_comma >= 0:
+            del out[pending_comma]
+        if ch == ',':
+            pending_comma = len(out)
+        elif not ch.isspace():
+            pending_comma = -1
+        if ch == '"':
+            in_string = True
+        out.append(ch)
+    return ''.join(out)
+
+
+def _loads(text: str) -> Any:
+    """json.loads, thử lại sau khi bỏ dấu phẩy thừa"""
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(_remove_trailing_commas(text))
+
+
+class JSONExtractor:
+    """
+    Bộ trích xuất JSON tăng dần
+
+    Gọi feed() với từng đoạn text; khi object/array JSON đầu tiên khép lại
+    và parse được, feed() trả về kết quả. finish() thử sửa output bị cắt.
+
+    expect=dict chỉ nhận object ở ngoài cùng ("xem [1] rồi {...}" lấy object);
+    accept(value) trả False thì bỏ qua giá trị đó và quét tiếp phần sau nó.
+    Các đoạn text được giữ trong list, chỉ nối lại khi cần cắt ra một ứng viên.
+    """
+
+    def __init__(self, expect: Optional[type] = None, accept: Optional[Callable[[Any], bool]] = None):
+        self._openers = {'{': '}'} if expect is dict else {'[': ']'} if expect is list else _CLOSERS
+        self._accept = accept
+        # Các đoạn text chưa bỏ đi; _base là vị trí (tính từ đầu stream) của ký tự đầu tiên
+        self._parts: List[str] = []
+        self._base = 0
+        self._size = 0
+        self._pos = 0
+        self._start = -1
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self.result: Any = None
+        # Giá trị parse được đầu tiên nhưng bị accept loại
+        self.rejected: Any = None
+        self.done = False
+
+    def feed(self, chunk: str) -> Optional[Any]:
+        """
+        Thêm một đoạn text
+
+        Returns:
+            Giá trị JSON nếu vừa tìm được, ngược lại None
+        """
+        if self.done or not chunk:
+            return None
+        self._parts.append(chunk)
+        self._size += len(chunk)
+        return self._scan()
+
+    def _text(self, start: int, end: int = None) -> str:
+        """Đoạn text [start, end) tính theo vị trí từ đầu stream"""
+        text = ''.join(self._parts)
+        self._parts = [text]
+        return text[start - self._base:None if end is None else end - self._base]
+
+    def _window(self):
+        """(đoạn text chứa _pos tới hết buffer, vị trí của ký tự đầu đoạn)"""
+        last = self._parts[-1]
+        offset = self._size - len(last)
+        if self._pos < offset:
+            # Quét lại phần cũ (sau khi bỏ ứng viên): gộp các đoạn làm một
+            self._text(self._base)
+            return self._parts[0], self._base
+        return last, offset
+
+    def _drop_before(self, pos: int):
+        """Bỏ các đoạn nằm trọn trước vị trí pos"""
+        while len(self._parts) > 1 and self._base + len(self._parts[0]) <= pos:
+            self._base += len(self._parts.pop(0))
+        if pos >= self._size:
+            self._parts = []
+            self._base = self._size
+
+    def _reset_candidate(self, pos: int):
+        """Bỏ ứng viên hiện tại, quét lại từ vị trí pos"""
+        self._pos = pos
+        self._start = -1
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+
+    def _scan(self) -> Optional[Any]:
+        while self._pos < self._size:
+            buf, offset = self._window()
+            i = self._pos - offset
+            n = len(buf)
+            rescan = False
+            while i < n:
+                ch = buf[i]
+                if self._start < 0:
+                    if ch in self._openers:
+                        self._start = offset + i
+                        self._stack = [self._openers[ch]]
+                    i += 1
+                    continue
+
+                if self._in_string:
+                    if self._escape:
+                        self._escape = False
+                    elif ch == '\\':
+                        self._escape = True
+                    elif ch == '"':
+                        self._in_string = False
+                elif ch == '"':
+                    self._in_string = True
+                elif ch in _CLOSERS:
+                    self._stack.append(_CLOSERS[ch])
+                elif ch in '}]':
+                    if ch != self._stack[-1]:
+                        self._reset_candidate(self._start + 1)
+                        rescan = True
+                        break
+                    self._stack.pop()
+                    if not self._stack:
+                        end = offset + i + 1
+                        try:
+                            value = _loads(self._text(self._start, end))
+                        except json.JSONDecodeError:
+                            # Ngoặc trong prose: quét lại ngay sau điểm bắt đầu
+                            self._reset_candidate(self._start + 1)
+                            rescan = True
+                            break
+                        if self._accept is None or self._accept(value):
+                            self.result = value
+                            self.done = True
+                            self._parts = []
+                            return value
+                        # JSON hợp lệ nhưng không đúng loại cần: bỏ qua cả giá trị
+                        if self.rejected is None:
+                            self.rejected = value
+                        self._reset_candidate(end)
+                        rescan = True
+                        break
+                i += 1
+            if not rescan:
+                self._pos = offset + n
+
+        # Chưa có ứng viên thì không cần giữ phần prose đã quét
+        self._drop_before(self._pos if self._start < 0 else self._start)
+        return None
+
+    def finish(self) -> Any:
+        """
+        Kết thúc stream, thử đóng các chuỗi/ngoặc còn mở nếu output bị cắt
+
+        Returns:
+            Giá trị JSON
+
+        Raises:
+            JSONExtractionError: Khi không khôi phục được JSON hợp lệ
+        """
+        if self.done:
+            return self.result
+        if self._start >= 0:
+            text = self._text(self._start)
+            # Thử đóng nguyên văn, sau đó bỏ dần phần tử cuối chưa hoàn chỉnh
+            cut = len(text)
+            for _ in range(4):
+                candidate = _close_truncated(text[:cut])
+                if candidate is not None:
+                    try:
+                        self.result = _loads(candidate)
+                        self.done = True
+                        return self.result
+                    except json.JSONDecodeError:
+                        pass
+                cut = text.rfind(',', 0, cut)
+                if cut <= 0:
+                    break
+        raise JSONExtractionError("Không tìm thấy JSON hợp lệ trong response")
+
+
+def _close_truncated(text: str) -> Optional[str]:
+    """Đóng chuỗi và các ngoặc còn mở của một đoạn JSON bị cắt"""
+    stack: List[str] = []
+    in_string = False
+    escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+        elif ch in '}]':
+            if not stack or stack.pop() != ch:
+                return None
+    if in_string:
+        text += '"'
+    text = text.rstrip().rstrip(',:').rstrip()
+    return text + ''.join(reversed(stack))
+
+
+def extract_json(text: str, expect: Optional[type] = None,
+                 accept: Optional[Callable[[Any], bool]] = None) -> Any:
+    """
+    Trích xuất giá trị JSON đầu tiên trong text
+
+    Args:
+        text: Output của model (có thể kèm prose, ``` fence, dấu phẩy thừa)
+        expect: dict hoặc list - chỉ nhận giá trị ngoài cùng thuộc loại này
+        accept: Hàm kiểm tra; giá trị bị loại được bỏ qua để tìm giá trị phía sau
+
+    Returns:
+        Giá trị JSON (dict hoặc list). Không có giá trị nào qua accept thì trả về
+        giá trị bị loại đầu tiên để nơi gọi báo lỗi cụ thể.
+
+    Raises:
+        JSONExtractionError: Khi không khôi phục được JSON hợp lệ
+    """
+    extractor = JSONExtractor(expect=expect, accept=accept)
+    result = extractor.feed(text)
+    if extractor.done:
+        return result
+    try:
+        return extractor.finish()
+    except JSONExtractionError:
+        if extractor.rejected is not None:
+            return extractor.rejected
+        raise
@@ -0,0 +1,127 @@
+"""
+Đọc từng bản ghi từ file JSON lớn mà không nạp cả file vào bộ nhớ
+- Mảng JSON ở top-level: [ {...}, {...} ]
+- NDJSON / chuỗi các giá trị JSON cách nhau bởi khoảng trắng
+- Trả kèm byte offset sau mỗi bản ghi để tiếp tục (resume) từ đó
+"""
+
+import re
+import json
+import codecs
+from typing import Any, Iterator, Tuple
+
+CHUNK_SIZE = 1 << 20
+# Một bản ghi lớn hơn mức này coi như file hỏng (tránh đọc cả file vào buffer)
+MAX_RECORD_SIZE = 64 << 20
+
+_ARRAY_GAP = re.compile(r'[\s,]*')
+_VALUE_GAP = re.compile(r'\s*')
+_BOM = codecs.BOM_UTF8
+
+
+def detect_array(path: str) -> Tuple[bool, int]:
+    """
+    File là mảng JSON hay chuỗi giá trị (NDJSON)
+
+    Returns:
+        (is_array, offset): offset là byte ngay sau '[' (hoặc đầu dữ liệu sau BOM)
+    """
+    with open(path, 'rb') as f:
+        head = f.read(4096)
+    start = len(_BOM) if head.startswith(_BOM) else 0
+    stripped = head[start:].lstrip()
+    start = len(head) - len(stripped)
+    if stripped.startswith(b'['):
+        return True, start + 1
+    return False, start
+
+
+def _iter_lines(path: str, offset: int) -> Iterator[Tuple[str, int]]:
+    """Từng dòng không rỗng của file NDJSON kèm byte offset sau dòng"""
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        for line in f:
+            offset += len(line)
+            if line.strip():
+                yield line.decode('utf-8', errors='replace'), offset
+
+
+def iter_json_records(path: str, offset: int = 0,
+                      chunk_size: int = CHUNK_SIZE, raw: bool = False) -> Iterator[Tuple[Any, int]]:
+    """
+    Duyệt từng bản ghi của file JSON, bộ nhớ chỉ cần cho một chunk và một bản ghi
+
+    Args:
+        path: Đường dẫn file (UTF-8)
+        offset: Byte offset để tiếp tục, lấy từ lần đọc trước (0 = từ đầu file)
+        chunk_size: Số byte mỗi lần đọc
+        raw: Với file không phải mảng, trả về từng dòng (chuỗi JSON chưa parse) để
+             parse ở nơi khác (VD: process con); file khi đó phải là NDJSON đúng nghĩa
+
+    Returns:
+        Iterator (bản ghi, byte offset ngay sau bản ghi). Với NDJSON, dòng không
+        parse được trả về dưới dạng json.JSONDecodeError thay cho bản ghi rồi
+        đọc tiếp dòng sau.
+
+    Raises:
+        ValueError: Nếu mảng JSON bị hỏng (không thể đọc tiếp phần sau)
+    """
+    is_array, data_start = detect_array(path)
+    if raw and not is_array:
+        yield from _iter_lines(path, max(offset, data_start))
+        return
+    gap = _ARRAY_GAP if is_array else _VALUE_GAP
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    with open(path, 'rb') as f:
+        offset = max(offset, data_start)
+        f.seek(offset)
+        text, pos, eof = '', 0, False
+
+        def fill():
+            nonlocal text, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            text = text[pos:] + utf8.decode(chunk, final=eof)
+            pos = 0
+
+        def advance(end: int):
+            nonlocal pos, offset
+            offset += len(text[pos:end].encode('utf-8'))
+            pos = end
+
+        while True:
+            advance(gap.match(text, pos).end())
+            if pos >= len(text):
+                if eof:
+                    if is_array:
+                        raise ValueError(f"Unexpected end of JSON array at byte {offset}")
+                    return
+                fill()
+                continue
+            if is_array and text[pos] == ']':
+                return
+
+            try:
+                value, end = decoder.raw_decode(text, pos)
+            except json.JSONDecodeError as e:
+                # NDJSON: lỗi nằm ngay trên dòng đầu thì dòng đó hỏng (chuỗi JSON không
+                # chứa xuống dòng); ngược lại bản ghi có thể chỉ bị cắt ở cuối buffer
+                newline = -1 if is_array else text.find('\n', pos)
+                truncated = newline < 0 or e.pos > newline
+                if truncated and not eof and len(text) - pos < MAX_RECORD_SIZE:
+                    fill()
+                    continue
+                if is_array:
+                    raise ValueError(f"Invalid JSON at byte {offset}: {e.msg}") from e
+                # NDJSON: bỏ qua dòng hỏng
+                while newline < 0 and not eof:
+                    fill()
+                    newline = text.find('\n', pos)
+                advance(len(text) if newline < 0 else newline + 1)
+                yield e, offset
+                continue
+
+            advance(end)
+            yield value, offset
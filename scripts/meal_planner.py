@@ -0,0 +1,324 @@
+"""
+Tạo kế hoạch ăn uống từ công thức có sẵn trong recipes.db
+- Lọc theo chế độ ăn (chay, thuần chay) và sở thích ("không cay", "có cá")
+- Giới hạn thời gian nấu cho từng bữa, không lặp món trong N ngày
+- Chỉ những bữa không có công thức phù hợp mới cần hỏi AI
+"""
+
+import re
+import time
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+
+from semantic_cache import fold_text
+
+SLOTS = ("breakfast", "lunch", "dinner")
+DAY_NAMES = ("Thứ 2", "Thứ 3", "Thứ 4", "Thứ 5", "Thứ 6", "Thứ 7", "Chủ nhật")
+MAX_DAYS = 31
+
+# Từ khoá (có dấu) của nguyên liệu động vật, dùng cho bộ lọc chế độ ăn.
+# So khớp có dấu để không nhầm "cá" với "cà", "bò" với "bơ"; từ viết không dấu
+# trong công thức ("thit bo") thì so với từ khoá đã bỏ dấu (thà loại nhầm "ca chua")
+_MEAT_WORDS = {
+    "thịt", "gà", "bò", "heo", "lợn", "vịt", "ngan", "sườn", "xương", "pâté", "pate",
+    "chả", "giò", "nem", "lạp", "xúc", "bacon", "cá", "tôm", "mực", "cua", "ghẹ",
+    "sò", "hến", "ốc", "nghêu", "mắm",
+}
+_ANIMAL_PRODUCT_WORDS = {"trứng", "sữa", "phô", "bơ", "mật", "mayonnaise"}
+
+_DIET_KEYWORDS = {
+    "vegetarian": _MEAT_WORDS, "chay": _MEAT_WORDS, "ăn chay": _MEAT_WORDS,
+    "vegan": _MEAT_WORDS | _ANIMAL_PRODUCT_WORDS, "thuần chay": _MEAT_WORDS | _ANIMAL_PRODUCT_WORDS,
+}
+# Tên chế độ ăn (có hoặc không dấu) -> (từ khoá có dấu, từ khoá đã bỏ dấu)
+_DIETS = {
+    name: (keywords, {fold_text(w) for w in keywords})
+    for diet, keywords in _DIET_KEYWORDS.items()
+    for name in (diet, fold_text(diet))
+}
+
+# Sở thích phủ định -> từ khoá cần loại thêm (ngoài chính cụm từ đó)
+_NEGATIVE_EXTRA = {"cay": ("ớt", "sa tế", "tương ớt")}
+_NEGATIVE_PREFIXES = ("không ", "khong ", "no ", "tránh ", "tranh ")
+_POSITIVE_PREFIXES = ("có ", "co ", "thích ", "thich ", "nhiều ", "nhieu ")
+
+_WORD_RE = re.compile(r"\w+")
+_RECIPE_FIELDS = ("id", "title", "description", "type", "durationInMinutes", "ingredients")
+
+
+def _parse_int(value: Any, name: str) -> int:
+    """Số nguyên từ request body (int hoặc chuỗi số), báo lỗi theo tên trường"""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"{name} must be an integer")
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an integer")
+
+
+def parse_days(value: Any) -> int:
+    """
+    Số ngày của meal-plan, giới hạn trong 1..MAX_DAYS
+
+    Raises:
+        ValueError: Nếu value không phải số nguyên
+    """
+    return min(max(_parse_int(value, "days"), 1), MAX_DAYS)
+
+
+def parse_no_repeat_days(value: Any) -> int:
+    """
+    Số ngày liền nhau không lặp lại một món, tối thiểu 1
+
+    Raises:
+        ValueError: Nếu value không phải số nguyên
+    """
+    return max(1, _parse_int(value, "no_repeat_days"))
+
+
+def _words(text: str) -> List[str]:
+    """Tách từ giữ nguyên dấu (chữ thường, NFC)"""
+    return _WORD_RE.findall(unicodedata.normalize('NFC', str(text).lower()))
+
+
+def _fits(recipe: Dict[str, Any], limit: Optional[int]) -> bool:
+    """Công thức có nấu kịp trong limit phút không (None = không giới hạn)"""
+    return limit is None or (recipe["duration"] is not None and recipe["duration"] <= limit)
+
+
+def _contains(words: List[str], term: str) -> bool:
+    """Cụm từ term có xuất hiện liên tiếp trong danh sách từ không"""
+    needle = _words(term)
+    size = len(needle)
+    return size > 0 and any(words[i:i + size] == needle for i in range(len(words) - size + 1))
+
+
+class MealPlanner:
+    """Xếp công thức trong recipes.db vào kế hoạch ăn uống"""
+
+    def __init__(self, recipe_cloner, refresh_interval: float = 30):
+        """
+        Khởi tạo planner
+
+        Args:
+            recipe_cloner: RecipeCloner chứa công thức
+            refresh_interval: Chu kỳ đồng bộ công thức mới từ database (giây)
+        """
+        self.recipe_cloner = recipe_cloner
+        self.refresh_interval = refresh_interval
+        self._recipes: Dict[int, Dict[str, Any]] = {}
+        self._max_id = 0
+        self._loaded_at = 0.0
+        self.full_loads = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _index(recipe: Dict[str, Any]) -> Dict[str, Any]:
+        """Tách từ sẵn cho một công thức"""
+        text = " ".join(
+            [recipe.get('title') or '', recipe.get('description') or '', recipe.get('type') or '']
+            + [ing['name'] if isinstance(ing, dict) else str(ing)
+               for ing in recipe.get('ingredients', [])]
+        )
+        words = _words(text)
+        folded = [fold_text(w) for w in words]
+        return {
+            "id": recipe['id'],
+            "title": recipe['title'],
+            "duration": recipe.get('durationInMinutes'),
+            "words": words,
+            "word_set": set(words),
+            # Từ viết không dấu trong công thức, so với từ khoá chế độ ăn đã bỏ dấu
+            "plain_set": {f for w, f in zip(words, folded) if w == f},
+            "folded": folded,
+        }
+
+    def _load(self) -> List[Dict[str, Any]]:
+        """
+        Danh sách công thức đã tách từ sẵn
+
+        Sau refresh_interval (hoặc invalidate) chỉ đọc công thức có id lớn hơn id
+        đã biết (công thức chỉ được thêm, không sửa); đọc lại toàn bộ khi số công
+        thức không khớp database (đã xoá: clear_all, dedup_titles).
+        """
+        with self._lock:
+            if time.time() - self._loaded_at < self.refresh_interval:
+                return list(self._recipes.values())
+
+            self._sync(self._max_id)
+            if len(self._recipes) != self.recipe_cloner.count_recipes():
+                self._recipes, self._max_id = {}, 0
+                self._sync(0)
+            self._loaded_at = time.time()
+            return list(self._recipes.values())
+
+    def _sync(self, after_id: int):
+        """Đọc công thức có id > after_id vào index (gọi khi đã giữ lock)"""
+        if after_id == 0:
+            self.full_loads += 1
+        for recipe in self.recipe_cloner.iter_recipes(after_id=after_id, fields=_RECIPE_FIELDS):
+            self._recipes[recipe['id']] = self._index(recipe)
+            self._max_id = recipe['id']
+
+    def invalidate(self):
+        """Đồng bộ công thức mới ở lần gọi sau (VD: sau khi import)"""
+        with self._lock:
+            self._loaded_at = 0.0
+
+    @staticmethod
+    def _parse_preferences(preferences: List[str]) -> Tuple[List[str], List[str]]:
+        """Tách sở thích thành (cụm từ cần tránh, cụm từ ưu tiên)"""
+        avoid, prefer = [], []
+        for pref in preferences:
+            pref = " ".join(_words(pref))
+            negative = next((p for p in _NEGATIVE_PREFIXES if pref.startswith(p)), None)
+            if negative:
+                term = pref[len(negative):]
+                avoid.append(term)
+                avoid.extend(_NEGATIVE_EXTRA.get(fold_text(term), ()))
+                continue
+            positive = next((p for p in _POSITIVE_PREFIXES if pref.startswith(p)), None)
+            prefer.append(pref[len(positive):] if positive else pref)
+        return [t for t in avoid if t], [t for t in prefer if t]
+
+    @staticmethod
+    def _time_budget(data: Dict[str, Any]) -> Dict[str, Optional[int]]:
+        """max_minutes: số (áp dụng mọi bữa) hoặc dict theo bữa"""
+        budget = data.get('max_minutes')
+        if isinstance(budget, dict):
+            return {slot: budget.get(slot) for slot in SLOTS}
+        return {slot: budget for slot in SLOTS}
+
+    def solve(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Xếp công thức vào từng bữa
+
+        Args:
+            data: Request body của /api/meal-plan, thêm các trường tuỳ chọn:
+                  max_minutes (số hoặc {"breakfast": 20, ...}), no_repeat_days (mặc định 3)
+
+        Returns:
+            Dict {plan, recipe_ids, gaps, candidates}: gaps là danh sách (ngày, bữa) chưa xếp được
+
+        Raises:
+            ValueError: Nếu days hoặc no_repeat_days không phải số nguyên
+        """
+        days = parse_days(data.get('days', 7))
+        no_repeat = parse_no_repeat_days(data.get('no_repeat_days', 3))
+        banned, banned_plain = _DIETS.get(" ".join(_words(data.get('dietary', ''))), (set(), set()))
+        preferences = data.get('preferences', [])
+        avoid, prefer = self._parse_preferences(preferences)
+        budget = self._time_budget(data)
+
+        # Sở thích gõ không dấu thì so khớp không dấu, ngược lại so khớp có dấu
+        # để "cay" không khớp "cây", "cá" không khớp "cà"
+        field = "words" if any(fold_text(p) != " ".join(_words(p)) for p in preferences) else "folded"
+        if field == "folded":
+            avoid, prefer = [fold_text(t) for t in avoid], [fold_text(t) for t in prefer]
+
+        # Lọc cứng theo chế độ ăn + sở thích phủ định, chấm điểm theo sở thích ưu tiên
+        by_score: Dict[int, List[Dict[str, Any]]] = {}
+        slot_sizes = dict.fromkeys(SLOTS, 0)
+        candidates = 0
+        for recipe in self._load():
+            if banned & recipe["word_set"] or banned_plain & recipe["plain_set"]:
+                continue
+            if any(_contains(recipe[field], term) for term in avoid):
+                continue
+            score = sum(1 for term in prefer if _contains(recipe[field], term))
+            by_score.setdefault(score, []).append(recipe)
+            candidates += 1
+            for slot in SLOTS:
+                if _fits(recipe, budget[slot]):
+                    slot_sizes[slot] += 1
+        scores = sorted(by_score, reverse=True)
+
+        # Với mỗi (bữa, điểm): con trỏ tới món chưa dùng kế tiếp trong by_score[điểm]
+        # và hàng đợi món đã dùng theo lần dùng gần nhất tăng dần. Điểm cao trước, trong
+        # cùng điểm món chưa dùng trước rồi tới món lâu chưa dùng nhất, nên mỗi bữa chỉ
+        # xét đầu hàng đợi thay vì duyệt lại mọi công thức
+        cursors = {slot: dict.fromkeys(scores, 0) for slot in SLOTS}
+        used_queues = {slot: {score: OrderedDict() for score in scores} for slot in SLOTS}
+        last_used: Dict[int, int] = {}
+
+        def pick(slot: str, day: int) -> Tuple[Optional[Dict[str, Any]], int]:
+            limit = budget[slot]
+            for score in scores:
+                recipes, i = by_score[score], cursors[slot][score]
+                while i < len(recipes) and (recipes[i]["id"] in last_used or not _fits(recipes[i], limit)):
+                    i += 1
+                cursors[slot][score] = i
+                if i < len(recipes):
+                    return recipes[i], score
+                queue = used_queues[slot][score]
+                if queue:
+                    head = next(iter(queue.values()))
+                    if day - last_used[head["id"]] >= no_repeat:
+                        return head, score
+            return None, 0
+
+        # Bữa ít lựa chọn nhất được xếp trước
+        slot_order = sorted(SLOTS, key=lambda slot: slot_sizes[slot])
+        plan, recipe_ids, gaps = [], [], []
+        for day in range(days):
+            entry = {"day": DAY_NAMES[day % len(DAY_NAMES)]}
+            ids = {}
+            for slot in slot_order:
+                recipe, score = pick(slot, day)
+                if recipe is None:
+                    entry[slot] = ""
+                    ids[slot] = None
+                    gaps.append((day, slot))
+                    continue
+                last_used[recipe["id"]] = day
+                for other in SLOTS:
+                    if _fits(recipe, budget[other]):
+                        queue = used_queues[other][score]
+                        queue[recipe["id"]] = recipe
+                        queue.move_to_end(recipe["id"])
+                entry[slot] = recipe["title"]
+                ids[slot] = recipe["id"]
+            plan.append({"day": entry["day"], **{slot: entry[slot] for slot in SLOTS}})
+            recipe_ids.append({slot: ids[slot] for slot in SLOTS})
+
+        return {"plan": plan, "recipe_ids": recipe_ids, "gaps": gaps, "candidates": candidates}
+
+    @staticmethod
+    def to_result(solution: Dict[str, Any], source: str = "local") -> Dict[str, Any]:
+        """Kết quả meal-plan theo MEAL_PLAN_SCHEMA, kèm recipeIds cho từng ngày"""
+        return {
+            "plan": [
+                {**entry, "recipeIds": ids}
+                for entry, ids in zip(solution["plan"], solution["recipe_ids"])
+            ],
+            "source": source,
+        }
+
+    def merge(self, solution: Dict[str, Any], ai_result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Điền các bữa còn trống bằng kết quả AI
+
+        ai_result là response cho prompt build_meal_plan_gaps_prompt: danh sách ngày
+        (theo thứ tự gửi đi) có đủ ba bữa. Chỉ các bữa còn trống được lấy từ AI.
+        Nếu AI lỗi vẫn trả kế hoạch đã xếp, kèm "unfilled" và "warning".
+        """
+        gap_days = sorted({day for day, _ in solution["gaps"]})
+        ai_plan = ai_result.get("plan") if isinstance(ai_result.get("plan"), list) else []
+        by_day = dict(zip(gap_days, ai_plan))
+
+        unfilled = []
+        for day, slot in solution["gaps"]:
+            value = by_day.get(day, {}).get(slot) if isinstance(by_day.get(day), dict) else None
+            if isinstance(value, str) and value.strip():
+                solution["plan"][day][slot] = value.strip()
+            else:
+                unfilled.append({"day": solution["plan"][day]["day"], "meal": slot})
+
+        result = self.to_result(solution, source="mixed")
+        if unfilled:
+            result["unfilled"] = unfilled
+            if "error" in ai_result:
+                result["warning"] = ai_result["error"]
+        return result
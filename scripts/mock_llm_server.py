@@ -0,0 +1,268 @@
+"""
+Mock AI backend cho benchmark (không cần GPU/model thật)
+Hỗ trợ:
+- Ollama: POST /api/chat (NDJSON khi stream), GET /api/tags
+- OpenAI: POST /v1/chat/completions (SSE khi stream), GET /v1/models
+- Cấu hình độ trễ, tốc độ sinh token và tỉ lệ output hỏng
+
+Chạy: python mock_llm_server.py --port 18080 --latency 0.2 --token-rate 50
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Any, Optional, Tuple
+
+# Object thoả mọi schema của AIService khi request không gửi schema
+_DEFAULT_OBJECT = {
+    "title": "Món thử nghiệm",
+    "description": "",
+    "ingredients": ["100g thịt bò", "1 quả trứng gà"],
+    "steps": ["Sơ chế", "Nấu", "Trình bày"],
+    "plan": [{"day": "Thứ 2", "breakfast": "Phở", "lunch": "Cơm tấm", "dinner": "Bún chả"}],
+    "calories": 500, "protein": 25, "carbs": 60, "fat": 15,
+    "tips": ["Mẹo 1", "Mẹo 2"],
+    "explanation": "",
+}
+
+
+def _sample(schema: Dict[str, Any]) -> Any:
+    """Sinh giá trị đơn giản thoả JSON schema"""
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: _sample(sub) for name, sub in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_sample(schema.get("items", {"type": "string"})) for _ in range(3)]
+    if kind in ("number", "integer"):
+        return 100
+    if kind == "boolean":
+        return True
+    return "Lorem ipsum"
+
+
+def _request_schema(payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Schema trong payload: Ollama 'format' hoặc OpenAI 'response_format'"""
+    if isinstance(payload.get("format"), dict):
+        return payload["format"]
+    response_format = payload.get("response_format") or {}
+    return (response_format.get("json_schema") or {}).get("schema")
+
+
+class MockConfig:
+    """Cấu hình hành vi của mock backend"""
+
+    def __init__(self, latency: float = 0.1, token_rate: float = 0, output_tokens: int = 200,
+                 malformed_ratio: float = 0.0, seed: Optional[int] = None):
+        """
+        Args:
+            latency: Thời gian tới token đầu tiên (giây)
+            token_rate: Số token/giây khi sinh output (0 = trả ngay)
+            output_tokens: Số token output xấp xỉ của mỗi response
+            malformed_ratio: Tỉ lệ response có JSON hỏng (0..1)
+            seed: Seed cho random (None = ngẫu nhiên)
+        """
+        self.latency = latency
+        self.token_rate = token_rate
+        self.output_tokens = output_tokens
+        self.malformed_ratio = malformed_ratio
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.malformed = 0
+
+    def build_content(self, payload: Dict[str, Any]) -> str:
+        """Nội dung trả về: JSON theo schema, độn cho đủ output_tokens, có thể bị làm hỏng"""
+        schema = _request_schema(payload)
+        value = _sample(schema) if schema else dict(_DEFAULT_OBJECT)
+        content = json.dumps(value, ensure_ascii=False)
+        filler = max(0, self.output_tokens * 4 - len(content))
+        if filler and isinstance(value, dict):
+            field = next((k for k, v in value.items() if isinstance(v, str)), "note")
+            value[field] = ("lorem ipsum " * (filler // 12 + 1))[:filler]
+            content = json.dumps(value, ensure_ascii=False)
+
+        with self.lock:
+            self.requests += 1
+            malformed = self.random.random() < self.malformed_ratio
+            if malformed:
+                self.malformed += 1
+                mode = self.random.choice(("prose", "truncated", "garbage"))
+        if not malformed:
+            return content
+        if mode == "prose":
+            return f"Đây là kết quả:\n```json\n{content[:-1]},}}\n```\nChúc ngon miệng!"
+        if mode == "truncated":
+            return content[:len(content) // 2]
+        return "Xin lỗi, tôi không thể trả lời yêu cầu này."
+
+    def tokens(self, content: str):
+        """Chia content thành token (~4 ký tự) kèm độ trễ theo token_rate"""
+        delay = 1 / self.token_rate if self.token_rate > 0 else 0
+        for i in range(0, len(content), 4):
+            if delay:
+                time.sleep(delay)
+            yield content[i:i + 4]
+
+
+def _prompt_tokens(payload: Dict[str, Any]) -> int:
+    return sum(len(str(m.get("content", ""))) for m in payload.get("messages", [])) // 4 + 1
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """HTTP handler cho cả hai kiểu API"""
+
+    protocol_version = "HTTP/1.1"
+    # Header và body được ghi riêng: tắt Nagle để không cộng thêm ~40ms delayed ACK
+    disable_nagle_algorithm = True
+    config: MockConfig = MockConfig()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data: Dict[str, Any], status: int = 200):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, text: str):
+        data = text.encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.startswith("/v1/models"):
+            self._send_json({"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        elif self.path.startswith("/api/tags"):
+            self._send_json({"models": [{"name": "mock"}]})
+        else:
+            self._send_json({"error": "not found"}, 404)
+
+    def do_POST(self):
+        openai = self.path.startswith("/v1/chat/completions")
+        if not openai and not self.path.startswith("/api/chat"):
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json({"error": "invalid JSON"}, 400)
+            return
+
+        config = self.config
+        content = config.build_content(payload)
+        counts = (_prompt_tokens(payload), len(content) // 4 + 1)
+        time.sleep(config.latency)
+
+        if payload.get("stream"):
+            self._stream(openai, payload, content, counts)
+            return
+        # Không stream: vẫn tốn thời gian sinh token như khi stream
+        if config.token_rate > 0:
+            time.sleep(counts[1] / config.token_rate)
+        self._send_json(self._response(openai, payload, content, counts))
+
+    @staticmethod
+    def _response(openai: bool, payload: Dict[str, Any], content: str, counts: Tuple[int, int]) -> Dict[str, Any]:
+        model = payload.get("model", "mock")
+        if openai:
+            return {
+                "id": "chatcmpl-mock", "object": "chat.completion", "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": counts[0], "completion_tokens": counts[1],
+                          "total_tokens": sum(counts)},
+            }
+        return {
+            "model": model, "message": {"role": "assistant", "content": content}, "done": True,
+            "prompt_eval_count": counts[0], "eval_count": counts[1],
+        }
+
+    def _stream(self, openai: bool, payload: Dict[str, Any], content: str, counts: Tuple[int, int]):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream" if openai else "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        model = payload.get("model", "mock")
+        try:
+            for token in self.config.tokens(content):
+                if openai:
+                    chunk = {"object": "chat.completion.chunk", "model": model,
+                             "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                    self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n")
+                else:
+                    chunk = {"model": model, "message": {"role": "assistant", "content": token}, "done": False}
+                    self._write_chunk(json.dumps(chunk, ensure_ascii=False) + "\n")
+            if openai:
+                chunk = {"object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n")
+            else:
+                chunk = {"model": model, "message": {"role": "assistant", "content": ""}, "done": True,
+                         "prompt_eval_count": counts[0], "eval_count": counts[1]}
+                self._write_chunk(json.dumps(chunk) + "\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # Client ngắt sớm (VD: đã nhận đủ JSON)
+            pass
+
+
+class MockLLMServer:
+    """Chạy mock backend trên thread nền (dùng trong benchmark/thử nghiệm)"""
+
+    def __init__(self, config: MockConfig, host: str = "127.0.0.1", port: int = 0):
+        handler = type("ConfiguredMockHandler", (MockHandler,), {"config": config})
+        self.config = config
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mock Ollama/OpenAI chat backend")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency", type=float, default=0.1, help="Thời gian tới token đầu (giây)")
+    parser.add_argument("--token-rate", type=float, default=0, help="Token/giây (0 = không giới hạn)")
+    parser.add_argument("--output-tokens", type=int, default=200, help="Số token output mỗi response")
+    parser.add_argument("--malformed-ratio", type=float, default=0.0, help="Tỉ lệ output JSON hỏng (0..1)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    config = MockConfig(args.latency, args.token_rate, args.output_tokens, args.malformed_ratio, args.seed)
+    server = MockLLMServer(config, args.host, args.port)
+    print(f"🧪 Mock LLM server: {server.base_url}/api/chat | {server.base_url}/v1/chat/completions",
+          flush=True)
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""
+Bảng dinh dưỡng cục bộ cho /api/analyze-recipe
+- Bảng macro trên 100g (nutrition_table.json), tra cứu theo tên giữ nguyên dấu;
+  bỏ dấu chỉ dùng cho tên nhiều âm tiết không bị trùng (cá/cà, gà/ga, bơ/bò)
+- Tách số lượng + đơn vị từ chuỗi nguyên liệu ("500g thịt bò", "2 cái cà rốt")
+- Công thức có mọi nguyên liệu tra được thì trả kết quả ngay, không gọi AI
+"""
+
+import os
+import re
+import json
+import unicodedata
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+from semantic_cache import fold_text
+
+logger = logging.getLogger(__name__)
+
+MACROS = ("calories", "protein", "carbs", "fat")
+
+# Đơn vị khối lượng -> gram
+_MASS_UNITS = {
+    "mg": 0.001, "g": 1, "gr": 1, "gam": 1, "gram": 1, "kg": 1000,
+}
+
+# Đơn vị thể tích -> ml (đổi sang gram bằng density của nguyên liệu)
+_VOLUME_UNITS = {
+    "ml": 1, "l": 1000, "lít": 1000,
+    "muỗng canh": 15, "thìa canh": 15, "muỗng cơm": 15, "tbsp": 15,
+    "muỗng cà phê": 5, "thìa cà phê": 5, "muỗng nhỏ": 5, "thìa nhỏ": 5, "tsp": 5,
+    "muỗng": 10, "thìa": 10,
+    "chén": 200, "bát": 200, "cup": 240, "tô": 400,
+}
+
+# Đơn vị đếm -> số lượng x unitWeight của nguyên liệu. Không có "lá": "lá chuối",
+# "lá chanh" là nguyên liệu khác hẳn chuối, chanh
+_COUNT_UNITS = (
+    "quả", "trái", "cái", "chiếc", "củ", "cây", "con", "lát", "tép",
+    "nhánh", "miếng", "bó", "gói", "hộp", "khúc",
+)
+
+# Cách viết -> đơn vị. Viết không dấu chỉ nhận với đơn vị nhiều âm tiết:
+# một âm tiết bỏ dấu dễ trùng từ khác ("cai" là cái hay cải, "bo" là bó hay bò)
+_UNIT_SPELLINGS = {u: u for u in list(_MASS_UNITS) + list(_VOLUME_UNITS) + list(_COUNT_UNITS)}
+for _unit in list(_UNIT_SPELLINGS):
+    if " " in _unit:
+        _UNIT_SPELLINGS.setdefault(fold_text(_unit), _unit)
+
+_UNIT_PATTERN = "|".join(re.escape(u) for u in sorted(_UNIT_SPELLINGS, key=len, reverse=True))
+# "1.500" / "1.500,5": dấu chấm trước đúng ba chữ số là phân cách hàng nghìn (cách viết
+# tiếng Việt); các trường hợp khác ("1.5", "0.500") dấu chấm là dấu thập phân
+_GROUPED = r"[1-9]\d{0,2}(?:\.\d{3})+(?:,\d+)?(?![\d.,]\d|\d)"
+_GROUPED_RE = re.compile(_GROUPED)
+_NUMBER = rf"(?:{_GROUPED}|\d+(?:[.,]\d+)?)(?:\s*/\s*\d+)?"
+_QUANTITY = rf"(?P<qty>{_NUMBER})(?:\s*-\s*(?P<qty_max>{_NUMBER}))?"
+_LEADING_RE = re.compile(rf"^{_QUANTITY}\s*(?:(?P<unit>{_UNIT_PATTERN})\b)?\s*(?P<name>.*)$")
+_TRAILING_RE = re.compile(rf"^(?P<name>.*?)[\s:]+{_QUANTITY}\s*(?:(?P<unit>{_UNIT_PATTERN})\b)?$")
+_PARENS_RE = re.compile(r"\([^)]*\)")
+_WORD_RE = re.compile(r"\w+")
+
+_MAX_NGRAM = 4
+# Từ chỉ lượng đứng trước tên nguyên liệu ("một ít muối", "vài nhánh sả")
+_FILLER_WORDS = {"một", "ít", "chút", "vài", "khoảng", "mot", "it", "chut", "vai", "khoang"}
+
+
+def _normalize(text: str) -> str:
+    """Chữ thường, NFC, gộp khoảng trắng (giữ nguyên dấu)"""
+    return " ".join(unicodedata.normalize('NFC', str(text).lower()).split())
+
+
+def _to_number(text: str) -> float:
+    """'1,5' -> 1.5, '1/2' -> 0.5, '1.500' -> 1500"""
+    text = text.replace(" ", "")
+    if _GROUPED_RE.fullmatch(text):
+        text = text.replace(".", "")
+    text = text.replace(",", ".")
+    if "/" in text:
+        num, den = text.split("/", 1)
+        return float(num) / float(den) if float(den) else 0.0
+    return float(text)
+
+
+def parse_ingredient(line: str) -> Tuple[Optional[float], Optional[str], str]:
+    """
+    Tách số lượng, đơn vị và tên từ một dòng nguyên liệu
+
+    Hỗ trợ dạng "500g thịt bò", "3-4 quả hồi", "1/2 dưa chuột" và
+    "Thịt bò: 500g". Khoảng (3-4) lấy trung bình, phần trong ngoặc bị bỏ.
+
+    Returns:
+        (số lượng hoặc None, đơn vị (có dấu) hoặc None, tên chữ thường giữ nguyên dấu)
+    """
+    text = _normalize(_PARENS_RE.sub(" ", line))
+    match = _LEADING_RE.match(text)
+    if match is None or not match.group("name"):
+        match = _TRAILING_RE.match(text)
+    if match is None:
+        return None, None, text.strip(" :-,")
+
+    quantity = _to_number(match.group("qty"))
+    if match.group("qty_max"):
+        quantity = (quantity + _to_number(match.group("qty_max"))) / 2
+    unit = _UNIT_SPELLINGS[match.group("unit")] if match.group("unit") else None
+    return quantity, unit, match.group("name").strip(" :-,")
+
+
+class NutritionDB:
+    """Bảng dinh dưỡng trên 100g, tra cứu theo tên nguyên liệu"""
+
+    def __init__(self, table_file: str = None):
+        """
+        Khởi tạo bảng
+
+        Args:
+            table_file: File JSON bảng dinh dưỡng (default: nutrition_table.json cạnh module)
+        """
+        if table_file is None:
+            table_file = os.path.join(os.path.dirname(__file__), "nutrition_table.json")
+
+        with open(table_file, 'r', encoding='utf-8') as f:
+            self.entries: List[Dict[str, Any]] = json.load(f)
+
+        # Index chính: tên + alias giữ nguyên dấu -> entry
+        self._index: Dict[str, Dict[str, Any]] = {}
+        # Index phụ cho nguyên liệu gõ không dấu: chỉ tên nhiều âm tiết và không trùng
+        # với tên khác khi bỏ dấu. Tên một âm tiết bỏ dấu quá dễ nhầm ("ca" là cá, cà
+        # hay ca; "bo" là bò hay bơ) nên chỉ khớp khi có dấu
+        self._folded_index: Dict[str, Dict[str, Any]] = {}
+        folded_owners: Dict[str, set] = {}
+        for entry in self.entries:
+            for alias in [entry["name"]] + entry.get("aliases", []):
+                self._index.setdefault(_normalize(alias), entry)
+                folded = fold_text(alias)
+                if " " in folded:
+                    folded_owners.setdefault(folded, set()).add(entry["name"])
+                    self._folded_index.setdefault(folded, entry)
+        for folded, owners in folded_owners.items():
+            if len(owners) > 1:
+                del self._folded_index[folded]
+
+        logger.info(f"✅ Nutrition table loaded: {len(self.entries)} foods, {len(self._index)} names")
+
+    def lookup(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        Tìm nguyên liệu theo tên (cụm từ dài nhất ở đầu tên khớp với index)
+
+        Chỉ xét cụm từ ở đầu tên vì danh từ chính đứng trước: "thịt heo ba chỉ" khớp
+        "thịt heo ba chỉ" trước "thịt heo", còn "lá chuối" không phải "chuối" và
+        "cà tím" không phải "cá". Không khớp thì trả None để hỏi AI.
+        """
+        tokens = _WORD_RE.findall(_normalize(name))
+        while tokens and tokens[0] in _FILLER_WORDS:
+            tokens = tokens[1:]
+        for size in range(min(_MAX_NGRAM, len(tokens)), 0, -1):
+            key = " ".join(tokens[:size])
+            entry = self._index.get(key) or self._folded_index.get(fold_text(key))
+            if entry is not None:
+                return entry
+        return None
+
+    @staticmethod
+    def _grams(entry: Dict[str, Any], quantity: Optional[float], unit: Optional[str]) -> Optional[float]:
+        """Đổi số lượng + đơn vị sang gram, None nếu không đổi được"""
+        if quantity is None:
+            return entry.get("defaultGrams")
+        if unit in _MASS_UNITS:
+            return quantity * _MASS_UNITS[unit]
+        if unit in _VOLUME_UNITS:
+            return quantity * _VOLUME_UNITS[unit] * entry.get("density", 1.0)
+        if "unitWeight" in entry:
+            return quantity * entry["unitWeight"]
+        return None
+
+    def resolve(self, line: str) -> Optional[Dict[str, Any]]:
+        """
+        Tính macro cho một dòng nguyên liệu
+
+        Returns:
+            Dict {line, food, grams, calories, protein, carbs, fat} hoặc None nếu không tra được
+        """
+        quantity, unit, name = parse_ingredient(line)
+        entry = self.lookup(name)
+        if entry is None:
+            return None
+        grams = self._grams(entry, quantity, unit)
+        if grams is None:
+            return None
+
+        item = {"line": line, "food": entry["name"], "group": entry.get("group"), "grams": round(grams, 1)}
+        for macro in MACROS:
+            item[macro] = entry["per100g"][macro] * grams / 100
+        return item
+
+    def analyze(self, ingredients: List[Any]) -> Dict[str, Any]:
+        """
+        Tính dinh dưỡng cho danh sách nguyên liệu
+
+        Args:
+            ingredients: Chuỗi nguyên liệu hoặc dict có key "name" (dạng lưu trong recipes.db)
+
+        Returns:
+            Dict {items, unresolved, totals}
+        """
+        items, unresolved = [], []
+        for ingredient in ingredients:
+            line = ingredient.get("name", "") if isinstance(ingredient, dict) else str(ingredient)
+            if not line.strip():
+                continue
+            item = self.resolve(line)
+            if item is None:
+                unresolved.append(line)
+            else:
+                items.append(item)
+
+        totals = {macro: sum(item[macro] for item in items) for macro in MACROS}
+        return {"items": items, "unresolved": unresolved, "totals": totals}
+
+    @staticmethod
+    def _rounded(values: Dict[str, float]) -> Dict[str, float]:
+        return {
+            macro: round(values[macro]) if macro == "calories" else round(values[macro], 1)
+            for macro in MACROS
+        }
+
+    @staticmethod
+    def _breakdown(analysis: Dict[str, Any]) -> List[Dict[str, Any]]:
+        return [
+            {"line": item["line"], "food": item["food"], "grams": item["grams"],
+             **NutritionDB._rounded(item)}
+            for item in analysis["items"]
+        ]
+
+    @staticmethod
+    def _health_benefits(totals: Dict[str, float], items: List[Dict[str, Any]]) -> List[str]:
+        """Nhận xét theo tỉ lệ năng lượng từ protein/carbs/fat và số loại rau củ"""
+        energy = totals["protein"] * 4 + totals["carbs"] * 4 + totals["fat"] * 9
+        benefits = []
+        if energy:
+            if totals["protein"] * 4 / energy >= 0.25:
+                benefits.append("Giàu protein, tốt cho cơ bắp")
+            if totals["carbs"] * 4 / energy >= 0.5:
+                benefits.append("Cung cấp năng lượng từ tinh bột")
+            if totals["fat"] * 9 / energy <= 0.25:
+                benefits.append("Ít chất béo")
+        vegetables = {item["food"] for item in items if item.get("group") in ("vegetable", "fruit")}
+        if len(vegetables) >= 2:
+            benefits.append("Nhiều rau củ quả, bổ sung chất xơ và vitamin")
+        return benefits
+
+    def to_result(self, analysis: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Kết quả analyze-recipe khi mọi nguyên liệu đều tra được (không cần AI)
+
+        Returns:
+            Dict theo NUTRITION_SCHEMA, kèm breakdown từng nguyên liệu và source="local"
+        """
+        totals = analysis["totals"]
+        rounded = self._rounded(totals)
+        energy = totals["protein"] * 4 + totals["carbs"] * 4 + totals["fat"] * 9
+        shares = ""
+        if energy:
+            shares = (
+                f" Tỉ lệ năng lượng: protein {round(totals['protein'] * 400 / energy)}%, "
+                f"carbs {round(totals['carbs'] * 400 / energy)}%, "
+                f"fat {round(totals['fat'] * 900 / energy)}%."
+            )
+        return {
+            **rounded,
+            "nutrition": (
+                f"Ước tính từ bảng dinh dưỡng cho {len(analysis['items'])} nguyên liệu: "
+                f"{rounded['calories']} kcal, protein {rounded['protein']}g, "
+                f"carbs {rounded['carbs']}g, fat {rounded['fat']}g.{shares}"
+            ),
+            "healthBenefits": self._health_benefits(totals, analysis["items"]),
+            "ingredients": self._breakdown(analysis),
+            "source": "local",
+        }
+
+    def merge(self, analysis: Dict[str, Any], ai_result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Gộp phần đã tính cục bộ với kết quả AI cho các nguyên liệu còn lại
+
+        Args:
+            analysis: Kết quả analyze()
+            ai_result: Response AI (calories..fat chỉ tính cho nguyên liệu chưa tra được)
+
+        Returns:
+            Kết quả tổng hợp với source="mixed" (trả nguyên ai_result nếu có lỗi)
+        """
+        if "error" in ai_result:
+            return ai_result
+        totals = {
+            macro: analysis["totals"][macro] + float(ai_result.get(macro) or 0)
+            for macro in MACROS
+        }
+        return {
+            **ai_result,
+            **self._rounded(totals),
+            "ingredients": self._breakdown(analysis),
+            "unresolved": analysis["unresolved"],
+            "source": "mixed",
+        }
@@ -0,0 +1,168 @@
+"""
+Tạo prompt cho các AI endpoint
+Dùng chung cho route đồng bộ, route async và các luồng xử lý nền
+"""
+
+from typing import Dict, Any
+
+
+def build_suggest_recipe_prompt(data: Dict[str, Any]) -> str:
+    """Prompt gợi ý công thức từ request body của /api/suggest-recipe"""
+    ingredients = data.get('ingredients', [])
+    cuisine = data.get('cuisine', '')
+    difficulty = data.get('difficulty', '')
+
+    return f"""Gợi ý một công thức nấu ăn dựa trên:
+- Nguyên liệu: {', '.join(ingredients)}
+- Loại ẩm thực: {cuisine}
+- Mức độ khó: {difficulty}
+
+Vui lòng trả lời dưới dạng JSON với các field:
+{{
+    "title": "Tên công thức",
+    "description": "Mô tả ngắn",
+    "ingredients": ["Nguyên liệu 1", "Nguyên liệu 2"],
+    "steps": ["Bước 1", "Bước 2"],
+    "estimatedTime": "30 phút",
+    "servings": 4
+}}
+"""
+
+
+def build_meal_plan_prompt(data: Dict[str, Any]) -> str:
+    """Prompt kế hoạch ăn uống từ request body của /api/meal-plan"""
+    days = data.get('days', 7)
+    dietary = data.get('dietary', '')
+    preferences = data.get('preferences', [])
+
+    return f"""Tạo kế hoạch ăn uống {days} ngày với:
+- Chế độ ăn: {dietary}
+- Sở thích: {', '.join(preferences)}
+
+Trả lời dưới dạng JSON:
+{{
+    "plan": [
+        {{
+            "day": "Thứ 2",
+            "breakfast": "Tên công thức",
+            "lunch": "Tên công thức",
+            "dinner": "Tên công thức"
+        }}
+    ]
+}}
+"""
+
+
+def build_meal_plan_gaps_prompt(data: Dict[str, Any], solution: Dict[str, Any]) -> str:
+    """Prompt điền các bữa còn trống của kế hoạch đã xếp từ recipes.db
+
+    Args:
+        data: Request body của /api/meal-plan
+        solution: Kết quả MealPlanner.solve()
+    """
+    dietary = data.get('dietary', '')
+    preferences = data.get('preferences', [])
+    gap_days = sorted({day for day, _ in solution['gaps']})
+    meals = ('breakfast', 'lunch', 'dinner')
+    used = sorted({entry[meal] for entry in solution['plan'] for meal in meals if entry[meal]})
+    lines = []
+    for day in gap_days:
+        entry = solution['plan'][day]
+        slots = ', '.join(f"{meal}: {entry[meal] or '(cần gợi ý)'}" for meal in meals)
+        lines.append(f"- {entry['day']}: {slots}")
+
+    return f"""Hoàn thiện kế hoạch ăn uống với:
+- Chế độ ăn: {dietary}
+- Sở thích: {', '.join(preferences)}
+
+Chỉ gợi ý món cho các bữa ghi "(cần gợi ý)", giữ nguyên các bữa đã có, không trùng với: {', '.join(used)}
+{chr(10).join(lines)}
+
+Trả lời dưới dạng JSON, mỗi ngày ở trên một phần tử theo đúng thứ tự:
+{{
+    "plan": [
+        {{
+            "day": "Thứ 2",
+            "breakfast": "Tên công thức",
+            "lunch": "Tên công thức",
+            "dinner": "Tên công thức"
+        }}
+    ]
+}}
+"""
+
+
+def build_analyze_recipe_prompt(data: Dict[str, Any]) -> str:
+    """Prompt phân tích dinh dưỡng từ request body của /api/analyze-recipe"""
+    title = data.get('title', '')
+    ingredients = data.get('ingredients', [])
+
+    return f"""Phân tích thông tin dinh dưỡng của công thức: {title}
+Nguyên liệu:
+{chr(10).join(['- ' + ing for ing in ingredients])}
+
+Trả lời dưới dạng JSON:
+{{
+    "calories": 500,
+    "protein": 25,
+    "carbs": 60,
+    "fat": 15,
+    "nutrition": "Phân tích chi tiết",
+    "healthBenefits": ["Lợi ích 1", "Lợi ích 2"]
+}}
+"""
+
+
+def build_partial_nutrition_prompt(data: Dict[str, Any], analysis: Dict[str, Any]) -> str:
+    """Prompt phân tích dinh dưỡng khi một phần nguyên liệu đã tính từ bảng dinh dưỡng
+
+    Args:
+        data: Request body của /api/analyze-recipe
+        analysis: Kết quả NutritionDB.analyze()
+    """
+    title = data.get('title', '')
+    totals = analysis['totals']
+    known = ', '.join(item['line'] for item in analysis['items'])
+
+    return f"""Phân tích thông tin dinh dưỡng của công thức: {title}
+Đã tính sẵn từ bảng dinh dưỡng ({known}): {round(totals['calories'])} kcal, protein {round(totals['protein'], 1)}g, carbs {round(totals['carbs'], 1)}g, fat {round(totals['fat'], 1)}g.
+
+Chỉ ước tính calories, protein, carbs, fat cho các nguyên liệu còn lại:
+{chr(10).join(['- ' + line for line in analysis['unresolved']])}
+
+Phần "nutrition" và "healthBenefits" nhận xét cho cả món.
+Trả lời dưới dạng JSON (calories, protein, carbs, fat chỉ là tổng của các nguyên liệu còn lại):
+{{
+    "calories": 150,
+    "protein": 5,
+    "carbs": 20,
+    "fat": 5,
+    "nutrition": "Phân tích chi tiết",
+    "healthBenefits": ["Lợi ích 1", "Lợi ích 2"]
+}}
+"""
+
+
+def build_cooking_tips_prompt(data: Dict[str, Any]) -> str:
+    """Prompt mẹo nấu nướng từ request body của /api/cooking-tips"""
+    dish = data.get('dish', '')
+    problem = data.get('problem', '')
+
+    return f"""Cung cấp mẹo nấu nướng cho: {dish}
+Vấn đề: {problem}
+
+Trả lời dưới dạng JSON:
+{{
+    "tips": ["Mẹo 1", "Mẹo 2", "Mẹo 3"],
+    "explanation": "Giải thích chi tiết"
+}}
+"""
+
+
+# Tên endpoint -> (loại yêu cầu của AIService, hàm tạo prompt)
+AI_ENDPOINTS = {
+    'suggest-recipe': ('recipe', build_suggest_recipe_prompt),
+    'meal-plan': ('meal_plan', build_meal_plan_prompt),
+    'analyze-recipe': ('nutrition', build_analyze_recipe_prompt),
+    'cooking-tips': ('tips', build_cooking_tips_prompt),
+}
@@ -8,14 +8,22 @@ Hỗ trợ:
 """
 
 import os
+import re
 import sys
 import json
 import sqlite3
 import requests
+import functools
+import threading
+import unicodedata
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Sequence, Tuple
 import logging
 
+from metrics import histogram
+from json_stream import iter_json_records
+from import_pipeline import ImportPipeline, batched
+
 # Cấu hình logging
 logging.basicConfig(
     level=logging.INFO,
@@ -23,25 +31,284 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+QUERY_DURATION = histogram(
+    "recipe_db_query_duration_seconds",
+    "Thời gian thao tác SQLite của RecipeCloner",
+    ("operation",),
+)
+
+# Các trường trả về được của một công thức (ingredients lấy từ bảng ingredients)
+RECIPE_FIELDS = (
+    "id", "title", "imageUrl", "description", "steps", "durationInMinutes",
+    "type", "source", "cloned_at", "ingredients",
+)
+_INGREDIENT_COLUMNS = ("id", "recipeId", "name", "isChecked")
+
+# PRAGMA cho mỗi kết nối. journal_mode=WAL được lưu trong file database nên chỉ
+# cần đặt một lần ở _init_db; WAL cho phép đọc song song khi đang ghi/import.
+_CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",   # An toàn với WAL, chỉ có thể mất commit cuối khi mất điện
+    "PRAGMA cache_size = -16000",    # Page cache ~16MB mỗi kết nối
+    "PRAGMA mmap_size = 268435456",  # Đọc qua mmap tối đa 256MB
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
+
+# Số công thức mỗi transaction khi import hàng loạt
+IMPORT_BATCH_SIZE = 500
+
+# Tìm kiếm full-text (FTS5): unicode61 + remove_diacritics 2 bỏ dấu tiếng Việt
+# ("Phở" -> "pho") nhưng giữ nguyên chữ đ, xem _fts_query
+_FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+# Trọng số BM25 theo cột của recipes_fts: title, description, steps, ingredients
+_FTS_WEIGHTS = (10.0, 2.0, 1.0, 4.0)
+_FTS_TOKEN = re.compile(r'[^\W_]+')
+_FTS_MAX_TERMS = 16
+# Số chữ d tối đa mỗi từ được mở rộng thành biến thể d/đ (2^3 phrase)
+_FTS_MAX_D_VARIANTS = 3
+_SEARCH_COLUMNS = ("id", "title", "imageUrl", "type", "durationInMinutes", "score", "snippet")
+
+
+def _fts_ingredients(recipe_id: str) -> str:
+    """Biểu thức SQL: tên nguyên liệu của công thức, nối bằng dấu phẩy"""
+    return f"(SELECT group_concat(name, ', ') FROM ingredients WHERE recipeId = {recipe_id})"
+
+
+def _fts_document(recipe: str) -> str:
+    """Biểu thức SQL (title, description, steps, ingredients) của dòng FTS cho công thức recipe"""
+    # steps là mảng JSON: chỉ index nội dung các bước, snippet không chứa ngoặc/nháy
+    return (
+        f"{recipe}.title, {recipe}.description, "
+        f"CASE WHEN json_valid({recipe}.steps) "
+        f"THEN (SELECT group_concat(value, ' ') FROM json_each({recipe}.steps)) ELSE {recipe}.steps END, "
+        f"{_fts_ingredients(recipe + '.id')}"
+    )
+
+
+# recipes_fts_paused có dòng (chỉ trong transaction của _write_batch) thì trigger thêm
+# mới bỏ qua: _write_batch index cả lô một lần thay vì cập nhật FTS cho từng nguyên liệu
+_FTS_NOT_PAUSED = "NOT EXISTS (SELECT 1 FROM recipes_fts_paused)"
+_FTS_INSERT = "INSERT INTO recipes_fts (rowid, title, description, steps, ingredients)"
+_SEARCH_TRIGGERS = (
+    f'''
+    CREATE TRIGGER IF NOT EXISTS recipes_fts_insert AFTER INSERT ON recipes
+    WHEN {_FTS_NOT_PAUSED}
+    BEGIN
+        {_FTS_INSERT} SELECT new.id, {_fts_document("new")};
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS recipes_fts_update
+    AFTER UPDATE OF id, title, description, steps ON recipes
+    BEGIN
+        DELETE FROM recipes_fts WHERE rowid = old.id;
+        {_FTS_INSERT} SELECT new.id, {_fts_document("new")};
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS recipes_fts_delete AFTER DELETE ON recipes
+    BEGIN
+        DELETE FROM recipes_fts WHERE rowid = old.id;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS ingredients_fts_insert AFTER INSERT ON ingredients
+    WHEN {_FTS_NOT_PAUSED}
+    BEGIN
+        UPDATE recipes_fts SET ingredients = {_fts_ingredients("new.recipeId")} WHERE rowid = new.recipeId;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS ingredients_fts_update AFTER UPDATE OF recipeId, name ON ingredients
+    BEGIN
+        UPDATE recipes_fts SET ingredients = {_fts_ingredients("old.recipeId")} WHERE rowid = old.recipeId;
+        UPDATE recipes_fts SET ingredients = {_fts_ingredients("new.recipeId")} WHERE rowid = new.recipeId;
+    END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS ingredients_fts_delete AFTER DELETE ON ingredients
+    BEGIN
+        UPDATE recipes_fts SET ingredients = {_fts_ingredients("old.recipeId")} WHERE rowid = old.recipeId;
+    END
+    ''',
+)
+# Index các công thức có id > ? (backfill khi tạo bảng, hoặc một lô của _write_batch)
+_FTS_INDEX_AFTER = f"{_FTS_INSERT} SELECT recipes.id, {_fts_document('recipes')} FROM recipes WHERE id > ?"
+
+
+def _fts_query(text: str) -> str:
+    """
+    Chuyển chuỗi người dùng nhập thành biểu thức MATCH của FTS5
+    
+    Mỗi từ thành một phrase trong ngoặc kép (cú pháp FTS5 trong text không có tác dụng),
+    các từ nối bằng AND. Tokenizer không đổi đ thành d nên từ có chữ d được mở rộng
+    thành các biến thể d/đ: "dau hu" -> ("dau" OR "đau") AND "hu".
+    
+    Raises:
+        ValueError: Nếu text không có từ nào
+    """
+    tokens = _FTS_TOKEN.findall(unicodedata.normalize('NFC', text).lower())
+    terms = []
+    for token in dict.fromkeys(tokens):
+        variants = [token]
+        for i in [i for i, ch in enumerate(token) if ch == 'd'][:_FTS_MAX_D_VARIANTS]:
+            variants += [v[:i] + 'đ' + v[i + 1:] for v in variants]
+        phrases = ' OR '.join(f'"{v}"' for v in variants)
+        terms.append(f'({phrases})' if len(variants) > 1 else phrases)
+    if not terms:
+        raise ValueError("search query has no words")
+    return ' AND '.join(terms[:_FTS_MAX_TERMS])
+
+
+def _normalize_recipe(recipe_data: Any, source: str, cloned_at: str) -> Tuple[tuple, List[str]]:
+    """
+    Chuẩn hoá một công thức thành dòng của bảng recipes và danh sách nguyên liệu
+    
+    Nguyên liệu có thể là chuỗi hoặc dict {"name": ...} (preset_recipes.json).
+    
+    Raises:
+        ValueError: Nếu dữ liệu không hợp lệ (VD: thiếu title)
+    """
+    if isinstance(recipe_data, str):
+        # Dòng NDJSON chưa parse (ImportPipeline parse trong process con)
+        try:
+            recipe_data = json.loads(recipe_data)
+        except ValueError as e:
+            raise ValueError(f"invalid JSON: {e}")
+    if isinstance(recipe_data, ValueError):
+        # Bản ghi không parse được từ iter_json_records
+        raise ValueError(f"invalid JSON: {recipe_data}")
+    if not isinstance(recipe_data, dict):
+        raise ValueError("recipe must be an object")
+    title = str(recipe_data.get('title') or '').strip()
+    if not title:
+        raise ValueError("missing title")
+    
+    ingredients = []
+    for ingredient in recipe_data.get('ingredients') or []:
+        name = ingredient.get('name') if isinstance(ingredient, dict) else ingredient
+        if name is not None and str(name).strip():
+            ingredients.append(str(name).strip())
+    
+    steps = recipe_data.get('steps') or []
+    if not isinstance(steps, list):
+        steps = [steps]
+    try:
+        duration = int(recipe_data.get('durationInMinutes', 30))
+    except (TypeError, ValueError):
+        raise ValueError(f"invalid durationInMinutes: {recipe_data.get('durationInMinutes')!r}")
+    
+    row = (
+        title,
+        str(recipe_data.get('imageUrl') or ''),
+        str(recipe_data.get('description') or ''),
+        json.dumps([str(step) for step in steps], ensure_ascii=False),
+        duration,
+        str(recipe_data.get('type') or 'Khác'),
+        source,
+        cloned_at,
+    )
+    return row, ingredients
+
+
+def normalize_batch(recipes: List[Any], source: str,
+                    cloned_at: str) -> Tuple[List[tuple], Dict[str, List[str]], List[Dict[str, Any]]]:
+    """
+    Chuẩn hoá một lô công thức (chạy được trong process con của ImportPipeline)
+    
+    Returns:
+        (rows, ingredients, errors): ingredients theo title, trùng title trong cùng
+        lô thì chỉ bản đầu tiên được giữ; errors là [{index, error}] của dòng không hợp lệ
+    """
+    rows, ingredients, errors = [], {}, []
+    for index, recipe_data in enumerate(recipes):
+        try:
+            row, names = _normalize_recipe(recipe_data, source, cloned_at)
+        except ValueError as e:
+            errors.append({"index": index, "error": str(e)})
+            continue
+        rows.append(row)
+        ingredients.setdefault(row[0], names)
+    return rows, ingredients, errors
+
+
+def _timed_query(operation: str):
+    """Đo thời gian một thao tác database vào QUERY_DURATION"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with QUERY_DURATION.time(operation=operation):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
 
 class RecipeCloner:
     """Tool để clone và thêm công thức vào database"""
     
-    def __init__(self, db_path: str = "recipes.db"):
+    def __init__(self, db_path: str = "recipes.db", busy_timeout: float = 10):
         """
         Khởi tạo RecipeCloner
         
         Args:
             db_path: Đường dẫn đến database
+            busy_timeout: Thời gian chờ khi database đang bị khóa ghi (giây)
         """
         self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.connections_opened = 0
+        self.search_enabled = False
+        self.unique_titles = False
         self._init_db()
         logger.info(f"✅ RecipeCloner initialized with database: {db_path}")
     
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Kết nối SQLite của thread hiện tại (mở một lần rồi dùng lại)
+        
+        Mỗi thread giữ một kết nối riêng nên không cần khóa giữa các thread,
+        và cache prepared statement của kết nối được dùng lại giữa các lần gọi.
+        Kết nối mở trước khi fork (gunicorn preload) không được dùng trong
+        process con, nên kết nối được gắn với pid đã tạo ra nó.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, cached_statements=256)
+        for pragma in _CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        with self._lock:
+            self.connections_opened += 1
+        return conn
+    
+    def close(self):
+        """Đóng kết nối của thread hiện tại"""
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            conn.close()
+        self._local.conn = None
+    
+    def stats(self) -> Dict[str, Any]:
+        """Thông tin kết nối database (cho /api/health)"""
+        return {
+            "db_path": self.db_path,
+            "journal_mode": self._connect().execute('PRAGMA journal_mode').fetchone()[0],
+            "connections_opened": self.connections_opened,
+            "search_enabled": self.search_enabled,
+        }
+    
+    @_timed_query("init_db")
     def _init_db(self):
         """Tạo tables nếu chưa tồn tại"""
         try:
-            conn = sqlite3.connect(self.db_path)
+            # Kết nối riêng, đóng ngay: _init_db chạy ở process cha trước khi fork
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+            conn.execute('PRAGMA journal_mode = WAL')
             cursor = conn.cursor()
             
             # Tạo bảng recipes
@@ -70,6 +337,15 @@ class RecipeCloner:
                 )
             ''')
             
+            # Index cho việc lấy nguyên liệu theo công thức (không có thì mỗi lần là full scan)
+            cursor.execute(
+                'CREATE INDEX IF NOT EXISTS idx_ingredients_recipeId ON ingredients(recipeId)'
+            )
+            
+            self.unique_titles = self._init_title_index(cursor)
+            
+            self.search_enabled = self._init_search(cursor)
+            
             conn.commit()
             conn.close()
             logger.info("📊 Database tables verified/created successfully")
@@ -77,6 +353,114 @@ class RecipeCloner:
             logger.error(f"❌ Error initializing database: {e}")
             raise
     
+    def _init_title_index(self, cursor: sqlite3.Cursor) -> bool:
+        """
+        Tạo UNIQUE index trên title để import dùng INSERT ... ON CONFLICT
+        
+        Database cũ có thể đã có title trùng: khi đó không xoá gì, chỉ tạo index
+        thường để import kiểm tra trùng bằng lookup, cho tới khi chạy dedup_titles().
+        
+        Returns:
+            True nếu title đã có UNIQUE index
+        """
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_recipes_title'"
+        )
+        if cursor.fetchone() is not None:
+            return True
+        cursor.execute(
+            'SELECT COUNT(*) FROM (SELECT 1 FROM recipes GROUP BY title HAVING COUNT(*) > 1)'
+        )
+        duplicates = cursor.fetchone()[0]
+        if duplicates:
+            logger.warning(
+                f"⚠️ {duplicates} titles have duplicate recipes; run dedup_titles() "
+                f"(CLI: python recipe_cloner.py, option 8) to enable fast imports"
+            )
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_recipes_title_lookup ON recipes(title)')
+            return False
+        cursor.execute('CREATE UNIQUE INDEX idx_recipes_title ON recipes(title)')
+        cursor.execute('DROP INDEX IF EXISTS idx_recipes_title_lookup')
+        return True
+    
+    def dedup_titles(self, export_file: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Xoá công thức trùng title (giữ bản được thêm đầu tiên) rồi tạo UNIQUE index
+        
+        Bước migration chạy thủ công: mỗi công thức bị xoá được ghi log, và nếu có
+        export_file thì được ghi ra NDJSON (cùng format import_json, có thể import lại).
+        
+        Args:
+            export_file: File NDJSON lưu các công thức bị xoá (None = chỉ ghi log)
+            
+        Returns:
+            Dict {removed, export_file}
+        """
+        columns = [f for f in RECIPE_FIELDS if f != "ingredients"]
+        conn = self._connect()
+        export = open(export_file, 'w', encoding='utf-8') if export_file else None
+        try:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                ids = [row[0] for row in conn.execute(
+                    'SELECT id FROM recipes WHERE id NOT IN (SELECT MIN(id) FROM recipes GROUP BY title) ORDER BY id'
+                )]
+                for start in range(0, len(ids), 500):
+                    chunk = ids[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    names: Dict[int, List[str]] = {}
+                    for recipe_id, name in conn.execute(
+                        f'SELECT recipeId, name FROM ingredients WHERE recipeId IN ({placeholders}) '
+                        'ORDER BY recipeId, id', chunk
+                    ):
+                        names.setdefault(recipe_id, []).append(name)
+                    for row in conn.execute(
+                        f'SELECT {", ".join(columns)} FROM recipes WHERE id IN ({placeholders}) ORDER BY id', chunk
+                    ).fetchall():
+                        recipe = dict(zip(columns, row))
+                        recipe["steps"] = json.loads(recipe["steps"] or "[]")
+                        recipe["ingredients"] = names.get(recipe["id"], [])
+                        logger.info(f"🧹 Removing duplicate recipe #{recipe['id']}: {recipe['title']}")
+                        if export is not None:
+                            export.write(json.dumps(recipe, ensure_ascii=False) + "\n")
+                    conn.execute(f'DELETE FROM ingredients WHERE recipeId IN ({placeholders})', chunk)
+                    conn.execute(f'DELETE FROM recipes WHERE id IN ({placeholders})', chunk)
+                self.unique_titles = self._init_title_index(conn.cursor())
+        finally:
+            if export is not None:
+                export.close()
+        
+        logger.warning(f"⚠️ Removed {len(ids)} recipes with duplicate titles"
+                       + (f" (exported to {export_file})" if export_file else ""))
+        return {"removed": len(ids), "export_file": export_file}
+    
+    def _init_search(self, cursor: sqlite3.Cursor) -> bool:
+        """
+        Tạo bảng FTS5 recipes_fts (rowid = id công thức) và trigger giữ nó đồng bộ
+        với recipes và ingredients; bảng mới tạo được index từ dữ liệu sẵn có
+        
+        Returns:
+            False nếu SQLite không hỗ trợ FTS5 (tìm kiếm bị tắt)
+        """
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'recipes_fts'")
+        exists = cursor.fetchone() is not None
+        try:
+            cursor.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts
+                USING fts5(title, description, steps, ingredients, tokenize = "{_FTS_TOKENIZER}")
+            ''')
+        except sqlite3.OperationalError as e:
+            logger.warning(f"⚠️ Full-text search disabled (FTS5 not available): {e}")
+            return False
+        
+        cursor.execute('CREATE TABLE IF NOT EXISTS recipes_fts_paused (paused INTEGER)')
+        for trigger in _SEARCH_TRIGGERS:
+            cursor.execute(trigger)
+        if not exists:
+            cursor.execute(_FTS_INDEX_AFTER, (0,))
+            logger.info(f"🔎 Indexed {cursor.rowcount} recipes for full-text search")
+        return True
+    
     def clone_from_json(self, json_file: str) -> int:
         """
         Clone công thức từ JSON file
@@ -100,33 +484,85 @@ class RecipeCloner:
         Returns:
             Số công thức được thêm thành công
         """
+        return self.import_json(json_file)["inserted"]
+    
+    def import_json(self, json_file: str, offset: int = 0,
+                    batch_size: int = IMPORT_BATCH_SIZE,
+                    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    workers: int = 0,
+                    source: str = "json_import") -> Dict[str, Any]:
+        """
+        Import công thức từ JSON file theo lô, đọc file từng bản ghi
+        
+        File có thể là mảng JSON (format như clone_from_json) hoặc NDJSON. Bộ nhớ
+        không phụ thuộc kích thước file: mỗi lúc chỉ giữ một lô công thức.
+        
+        Args:
+            json_file: Đường dẫn file JSON/NDJSON
+            offset: Byte offset để tiếp tục lần import bị dừng ("offset" của kết quả/progress trước)
+            batch_size: Số công thức mỗi transaction
+            on_progress: Hàm được gọi sau mỗi lô với {offset, total_bytes, records,
+                         inserted, skipped, failed} (cộng dồn)
+            workers: Số process chuẩn hoá song song (0 = tuần tự), xem ImportPipeline
+            source: Giá trị cột source
+            
+        Returns:
+            Dict {inserted, skipped, failed, batches, records, offset, total_bytes}, có thêm "error"
+            nếu file hỏng giữa chừng (các lô trước đó đã được lưu, offset là chỗ tiếp tục)
+        """
         logger.info(f"📂 Reading recipes from JSON: {json_file}")
         
         if not os.path.exists(json_file):
             logger.error(f"❌ File not found: {json_file}")
-            return 0
+            return self._empty_import(f"File not found: {json_file}")
         
-        try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                recipes = json.load(f)
-            
-            if not isinstance(recipes, list):
-                recipes = [recipes]
-            
-            count = 0
-            for recipe in recipes:
-                if self._add_recipe(recipe, source="json_import"):
+        total_bytes = os.path.getsize(json_file)
+        progress = {"offset": offset, "total_bytes": total_bytes, "records": 0,
+                    "inserted": 0, "skipped": 0, "failed": 0}
+        error = None
+        
+        def batches():
+            # Mỗi lô kèm (offset ngay sau bản ghi cuối, số bản ghi đã đọc): khi lô được
+            # commit, offset đó là chỗ tiếp tục an toàn
+            nonlocal error
+            batch, end, count = [], offset, 0
+            try:
+                # Có process chuẩn hoá: dòng NDJSON được parse luôn trong process con
+                for record, end in iter_json_records(json_file, offset, raw=workers > 0):
+                    batch.append(record)
                     count += 1
-            
-            logger.info(f"✅ Successfully imported {count}/{len(recipes)} recipes")
-            return count
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"❌ Invalid JSON format: {e}")
-            return 0
-        except Exception as e:
-            logger.error(f"❌ Error reading JSON file: {e}")
-            return 0
+                    if len(batch) >= batch_size:
+                        yield batch, (end, count)
+                        batch = []
+            except (OSError, ValueError) as e:
+                # Dừng đọc nhưng vẫn lưu lô đang dở
+                error = str(e)
+            if batch:
+                yield batch, (end, count)
+        
+        def on_batch(stats, context):
+            progress["offset"], progress["records"] = context
+            for key in ("inserted", "skipped", "failed"):
+                progress[key] += stats[key]
+            # Chỉ giữ số đếm của từng lô, lỗi từng dòng ghi ra log
+            for error in stats.pop("errors"):
+                logger.warning(f"⚠️ Skipping recipe in batch {stats['batch']}: {error}")
+            if on_progress is not None:
+                on_progress(dict(progress))
+            else:
+                logger.info(
+                    f"📥 {progress['records']} recipes read "
+                    f"({progress['offset'] * 100 // max(total_bytes, 1)}%), {progress['inserted']} inserted"
+                )
+        
+        result = self._import_batches(batches(), source, on_batch, workers)
+        result.update(progress)
+        if error:
+            logger.error(f"❌ Invalid JSON format: {error}")
+            result["error"] = f"Invalid JSON format: {error}"
+        else:
+            logger.info(f"✅ Successfully imported {result['inserted']}/{result['records']} recipes")
+        return result
     
     def clone_from_api(self, api_url: str, headers: Optional[Dict] = None) -> int:
         """
@@ -139,6 +575,19 @@ class RecipeCloner:
         Returns:
             Số công thức được thêm thành công
         """
+        return self.import_api(api_url, headers)["inserted"]
+    
+    def import_api(self, api_url: str, headers: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        Import công thức từ API theo lô (xem add_recipes)
+        
+        Args:
+            api_url: URL của API
+            headers: Headers cho request (optional)
+            
+        Returns:
+            Kết quả add_recipes, có thêm "error" nếu không lấy được dữ liệu
+        """
         logger.info(f"🌐 Fetching recipes from API: {api_url}")
         
         try:
@@ -156,23 +605,19 @@ class RecipeCloner:
             if not isinstance(recipes, list):
                 recipes = [recipes]
             
-            count = 0
-            for recipe in recipes:
-                if self._add_recipe(recipe, source="api_import"):
-                    count += 1
-            
-            logger.info(f"✅ Successfully imported {count}/{len(recipes)} recipes from API")
-            return count
+            result = self.add_recipes(recipes, source="api_import")
+            logger.info(f"✅ Successfully imported {result['inserted']}/{len(recipes)} recipes from API")
+            return result
             
         except requests.RequestException as e:
             logger.error(f"❌ API request error: {e}")
-            return 0
+            return self._empty_import(f"API request error: {e}")
         except json.JSONDecodeError as e:
             logger.error(f"❌ Invalid API response format: {e}")
-            return 0
+            return self._empty_import(f"Invalid API response format: {e}")
         except Exception as e:
             logger.error(f"❌ Error fetching from API: {e}")
-            return 0
+            return self._empty_import(str(e))
     
     def clone_from_preset(self, preset_file: str = None) -> int:
         """
@@ -229,6 +674,7 @@ class RecipeCloner:
         
         return self._add_recipe(recipe, source="manual_input")
     
+    @_timed_query("add_recipe")
     def _add_recipe(self, recipe_data: Dict[str, Any], source: str = "unknown") -> bool:
         """
         Thêm công thức vào database
@@ -258,37 +704,35 @@ class RecipeCloner:
             # Convert steps to JSON string
             steps_json = json.dumps(steps, ensure_ascii=False) if steps else json.dumps([])
             
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            # Kiểm tra công thức đã tồn tại chưa (theo title)
-            cursor.execute('SELECT id FROM recipes WHERE title = ?', (title,))
-            if cursor.fetchone():
-                logger.warning(f"⚠️ Recipe already exists: {title}")
-                conn.close()
-                return False
-            
-            # Thêm công thức
-            cursor.execute('''
-                INSERT INTO recipes 
-                (title, imageUrl, description, steps, durationInMinutes, type, source, cloned_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                title, image_url, description, steps_json, duration, 
-                recipe_type, source, datetime.now().isoformat()
-            ))
-            
-            recipe_id = cursor.lastrowid
-            
-            # Thêm nguyên liệu
-            for ingredient in ingredients:
+            conn = self._connect()
+            # with conn: commit khi thành công, rollback khi lỗi để kết nối
+            # dùng lại không bị kẹt trong transaction dở dang
+            with conn:
+                cursor = conn.cursor()
+                
+                # Kiểm tra công thức đã tồn tại chưa (theo title)
+                cursor.execute('SELECT id FROM recipes WHERE title = ?', (title,))
+                if cursor.fetchone():
+                    logger.warning(f"⚠️ Recipe already exists: {title}")
+                    return False
+                
+                # Thêm công thức
                 cursor.execute('''
+                    INSERT INTO recipes 
+                    (title, imageUrl, description, steps, durationInMinutes, type, source, cloned_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    title, image_url, description, steps_json, duration, 
+                    recipe_type, source, datetime.now().isoformat()
+                ))
+                
+                recipe_id = cursor.lastrowid
+                
+                # Thêm nguyên liệu
+                cursor.executemany('''
                     INSERT INTO ingredients (recipeId, name, isChecked)
                     VALUES (?, ?, 0)
-                ''', (recipe_id, ingredient))
-            
-            conn.commit()
-            conn.close()
+                ''', [(recipe_id, ingredient) for ingredient in ingredients])
             
             logger.info(f"✅ Recipe added: {title} (ID: {recipe_id}, {len(ingredients)} ingredients)")
             return True
@@ -300,45 +744,290 @@ class RecipeCloner:
             logger.error(f"❌ Error adding recipe: {e}")
             return False
     
+    @staticmethod
+    def _empty_import(error: Optional[str] = None) -> Dict[str, Any]:
+        result = {"inserted": 0, "skipped": 0, "failed": 0, "batches": []}
+        if error:
+            result["error"] = error
+        return result
+    
+    def add_recipes(self,
+                    recipes: Iterable[Dict[str, Any]],
+                    source: str = "unknown",
+                    batch_size: int = IMPORT_BATCH_SIZE,
+                    on_batch: Optional[Callable[[Dict[str, Any]], None]] = None,
+                    workers: int = 0) -> Dict[str, Any]:
+        """
+        Thêm nhiều công thức, mỗi lô một transaction
+        
+        Mỗi lô: executemany INSERT ... ON CONFLICT(title) DO NOTHING cho recipes
+        (INSERT ... WHERE NOT EXISTS khi chưa có UNIQUE index, xem dedup_titles),
+        rồi executemany cho ingredients của các công thức vừa thêm. Công thức trùng
+        title (đã có trong database hoặc trùng trong cùng lô) được bỏ qua.
+        Lô lỗi được rollback và tính là failed, các lô khác vẫn tiếp tục.
+        
+        Args:
+            recipes: Iterable các dict công thức (đọc lần lượt, không cần list)
+            source: Nguồn gốc (json_import, api_import, ...)
+            batch_size: Số công thức mỗi transaction
+            on_batch: Hàm được gọi sau mỗi lô với thống kê của lô đó
+            workers: Số process chuẩn hoá song song qua ImportPipeline (0 = tuần tự
+                     trên thread hiện tại, phù hợp cho lô nhỏ)
+            
+        Returns:
+            Dict {inserted, skipped, failed, batches}: batches là thống kê từng lô
+            {batch, inserted, skipped, failed, errors}
+        """
+        return self._import_batches(
+            ((batch, None) for batch in batched(recipes, batch_size)),
+            source,
+            (lambda stats, _: on_batch(stats)) if on_batch is not None else None,
+            workers,
+        )
+    
+    def _import_batches(self, batches: Iterable[Tuple[List[Any], Any]], source: str,
+                        on_batch: Optional[Callable[[Dict[str, Any], Any], None]],
+                        workers: int) -> Dict[str, Any]:
+        """Ghi các lô (lô, context) tuần tự hoặc qua ImportPipeline, cộng dồn thống kê"""
+        result = self._empty_import()
+        
+        def record(stats, context):
+            stats["batch"] = len(result["batches"])
+            result["batches"].append(stats)
+            for key in ("inserted", "skipped", "failed"):
+                result[key] += stats[key]
+            if on_batch is not None:
+                on_batch(stats, context)
+        
+        if workers > 0:
+            pipeline = ImportPipeline(
+                functools.partial(normalize_batch, source=source, cloned_at=datetime.now().isoformat()),
+                self._write_batch,
+                workers=workers,
+            )
+            pipeline.run(batches, record)
+        else:
+            for batch, context in batches:
+                record(self._insert_batch(batch, source), context)
+        return result
+    
+    def _insert_batch(self, recipes: List[Any], source: str) -> Dict[str, Any]:
+        """Chuẩn hoá và thêm một lô công thức trong một transaction (xem add_recipes)"""
+        return self._write_batch(*normalize_batch(recipes, source, datetime.now().isoformat()))
+    
+    @_timed_query("insert_batch")
+    def _write_batch(self, rows: List[tuple], ingredients: Dict[str, List[str]],
+                     errors: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Ghi một lô đã chuẩn hoá (kết quả normalize_batch) trong một transaction"""
+        stats = {"inserted": 0, "skipped": 0, "failed": len(errors), "errors": errors}
+        if not rows:
+            return stats
+        
+        conn = self._connect()
+        try:
+            with conn:
+                # Giữ khóa ghi từ đầu để id mới chắc chắn lớn hơn last_id
+                conn.execute('BEGIN IMMEDIATE')
+                last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM recipes').fetchone()[0]
+                if self.search_enabled:
+                    conn.execute('INSERT INTO recipes_fts_paused VALUES (1)')
+                if self.unique_titles:
+                    conn.executemany('''
+                        INSERT INTO recipes
+                        (title, imageUrl, description, steps, durationInMinutes, type, source, cloned_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        ON CONFLICT(title) DO NOTHING
+                    ''', rows)
+                else:
+                    # Database còn title trùng (chưa chạy dedup_titles): kiểm tra bằng lookup
+                    conn.executemany('''
+                        INSERT INTO recipes
+                        (title, imageUrl, description, steps, durationInMinutes, type, source, cloned_at)
+                        SELECT ?, ?, ?, ?, ?, ?, ?, ?
+                        WHERE NOT EXISTS (SELECT 1 FROM recipes WHERE title = ?)
+                    ''', [row + (row[0],) for row in rows])
+                inserted = conn.execute(
+                    'SELECT id, title FROM recipes WHERE id > ?', (last_id,)
+                ).fetchall()
+                conn.executemany(
+                    'INSERT INTO ingredients (recipeId, name, isChecked) VALUES (?, ?, 0)',
+                    [(recipe_id, name) for recipe_id, title in inserted for name in ingredients[title]]
+                )
+                if self.search_enabled:
+                    # Index cả lô một lần (trigger sẽ cập nhật FTS một lần cho mỗi nguyên liệu)
+                    conn.execute('DELETE FROM recipes_fts_paused')
+                    conn.execute(_FTS_INDEX_AFTER, (last_id,))
+        except sqlite3.Error as e:
+            logger.error(f"❌ Error importing batch: {e}")
+            stats["failed"] += len(rows)
+            stats["errors"].append({"error": str(e)})
+            return stats
+        
+        stats["inserted"] = len(inserted)
+        stats["skipped"] = len(rows) - len(inserted)
+        return stats
+    
+    @_timed_query("list_all_recipes")
     def list_all_recipes(self) -> List[Dict]:
         """
         Liệt kê tất cả công thức
         
+        Nguyên liệu được lấy theo lô (WHERE recipeId IN (...)) thay vì một query
+        cho mỗi công thức, xem iter_recipes.
+        
         Returns:
             Danh sách công thức với ingredients
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT * FROM recipes')
-            recipes = cursor.fetchall()
-            
-            result = []
-            for recipe in recipes:
-                recipe_dict = dict(recipe)
-                
-                # Lấy nguyên liệu
-                cursor.execute(
-                    'SELECT * FROM ingredients WHERE recipeId = ?',
-                    (recipe_dict['id'],)
-                )
-                ingredients = [dict(ing) for ing in cursor.fetchall()]
-                recipe_dict['ingredients'] = ingredients
-                
-                # Parse steps
-                recipe_dict['steps'] = json.loads(recipe_dict['steps'])
-                
-                result.append(recipe_dict)
-            
-            conn.close()
-            return result
-            
+            return list(self.iter_recipes())
         except Exception as e:
             logger.error(f"❌ Error listing recipes: {e}")
             return []
     
+    def iter_recipes(self,
+                     after_id: Optional[int] = None,
+                     limit: Optional[int] = None,
+                     recipe_type: Optional[str] = None,
+                     source: Optional[str] = None,
+                     min_duration: Optional[int] = None,
+                     max_duration: Optional[int] = None,
+                     fields: Optional[Sequence[str]] = None,
+                     batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """
+        Duyệt công thức theo id tăng dần (keyset pagination), đọc từng lô từ SQLite
+
+        Mỗi lô là một câu query "id > id cuối của lô trước" nên không giữ
+        transaction đọc mở suốt quá trình stream, và bộ nhớ chỉ cần cho một lô.
+
+        Args:
+            after_id: Chỉ lấy công thức có id lớn hơn (cursor của trang trước)
+            limit: Số công thức tối đa (None = tất cả)
+            recipe_type: Lọc theo loại
+            source: Lọc theo nguồn (json_import, api_import, manual_input...)
+            min_duration: Thời gian nấu tối thiểu (phút)
+            max_duration: Thời gian nấu tối đa (phút)
+            fields: Các trường cần lấy trong RECIPE_FIELDS (None = tất cả, luôn có id)
+            batch_size: Số công thức mỗi lần query
+
+        Returns:
+            Iterator các dict công thức
+
+        Raises:
+            ValueError: Nếu fields có trường không hợp lệ
+        """
+        fields = list(fields) if fields else list(RECIPE_FIELDS)
+        unknown = [f for f in fields if f not in RECIPE_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        columns = ["id"] + [f for f in RECIPE_FIELDS if f in fields and f not in ("id", "ingredients")]
+        with_ingredients = "ingredients" in fields
+
+        where, params = ["id > ?"], []
+        for clause, value in (("type = ?", recipe_type), ("source = ?", source),
+                              ("durationInMinutes >= ?", min_duration),
+                              ("durationInMinutes <= ?", max_duration)):
+            if value is not None:
+                where.append(clause)
+                params.append(value)
+        query = f"SELECT {', '.join(columns)} FROM recipes WHERE {' AND '.join(where)} ORDER BY id LIMIT ?"
+
+        last_id = after_id or 0
+        remaining = limit
+        conn = self._connect()
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            with QUERY_DURATION.time(operation="iter_recipes"):
+                rows = conn.execute(query, [last_id, *params, size]).fetchall()
+                ingredients: Dict[int, List[Dict]] = {}
+                if with_ingredients and rows:
+                    ids = [row[0] for row in rows]
+                    for ing in conn.execute(
+                        'SELECT id, recipeId, name, isChecked FROM ingredients '
+                        f'WHERE recipeId IN ({",".join("?" * len(ids))}) ORDER BY recipeId, id', ids
+                    ):
+                        ingredients.setdefault(ing[1], []).append(dict(zip(_INGREDIENT_COLUMNS, ing)))
+
+            # Tuple + zip nhanh hơn sqlite3.Row + dict() với hàng trăm nghìn dòng
+            for row in rows:
+                recipe = dict(zip(columns, row))
+                if "steps" in recipe:
+                    recipe["steps"] = json.loads(recipe["steps"] or "[]")
+                if with_ingredients:
+                    recipe["ingredients"] = ingredients.get(row[0], [])
+                yield recipe
+
+            if len(rows) < size:
+                break
+            last_id = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+
+    def list_recipes(self, cursor: Optional[int] = None, limit: int = 100, **filters) -> Dict[str, Any]:
+        """
+        Lấy một trang công thức
+
+        Args:
+            cursor: next_cursor của trang trước (None = trang đầu)
+            limit: Số công thức mỗi trang
+            **filters: recipe_type, source, min_duration, max_duration, fields (xem iter_recipes)
+
+        Returns:
+            Dict {recipes, next_cursor}: next_cursor là None nếu đã hết
+        """
+        recipes = list(self.iter_recipes(after_id=cursor, limit=limit + 1, **filters))
+        next_cursor = recipes[limit - 1]["id"] if len(recipes) > limit else None
+        return {"recipes": recipes[:limit], "next_cursor": next_cursor}
+
+    @_timed_query("search")
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        """
+        Tìm công thức theo title, mô tả, các bước và tên nguyên liệu (FTS5, xếp hạng BM25)
+        
+        Không phân biệt hoa thường và dấu ("pho bo" khớp "Phở bò", "dau" khớp "đậu"),
+        mọi từ trong query phải xuất hiện. Mọi công thức khớp đều được xếp hạng
+        (ORDER BY bm25 ... LIMIT/OFFSET), snippet chỉ tính cho trang trả về.
+        
+        Args:
+            query: Chuỗi người dùng nhập (không phải cú pháp FTS5)
+            limit: Số kết quả mỗi trang
+            offset: Số kết quả bỏ qua (next_offset của trang trước)
+        
+        Returns:
+            Dict {results, next_offset}: mỗi kết quả gồm id, title, imageUrl, type,
+            durationInMinutes, score (càng lớn càng liên quan) và snippet (từ khớp
+            bọc trong <b>...</b>); next_offset là None nếu đã hết
+        
+        Raises:
+            ValueError: Nếu query không có từ nào
+            RuntimeError: Nếu SQLite không hỗ trợ FTS5
+        """
+        if not self.search_enabled:
+            raise RuntimeError("Full-text search is not available (SQLite built without FTS5)")
+        match = _fts_query(query)
+        
+        rows = self._connect().execute(f'''
+            SELECT r.id, r.title, r.imageUrl, r.type, r.durationInMinutes,
+                   bm25(recipes_fts, {", ".join(map(str, _FTS_WEIGHTS))}) AS score,
+                   snippet(recipes_fts, -1, '<b>', '</b>', '…', 16)
+            FROM recipes_fts CROSS JOIN recipes AS r ON r.id = recipes_fts.rowid
+            WHERE recipes_fts MATCH ?
+            ORDER BY score, r.id DESC
+            LIMIT ? OFFSET ?
+        ''', (match, limit + 1, offset)).fetchall()
+        
+        results = []
+        for row in rows[:limit]:
+            result = dict(zip(_SEARCH_COLUMNS, row))
+            result["score"] = round(-result["score"], 4)  # bm25() âm, càng nhỏ càng khớp
+            results.append(result)
+        return {"results": results, "next_offset": offset + limit if len(rows) > limit else None}
+    
+    @_timed_query("count_recipes")
+    def count_recipes(self) -> int:
+        """Số công thức trong database"""
+        return self._connect().execute('SELECT COUNT(*) FROM recipes').fetchone()[0]
+    
+    @_timed_query("get_statistics")
     def get_statistics(self) -> Dict:
         """
         Lấy thống kê
@@ -347,8 +1036,7 @@ class RecipeCloner:
             Dict chứa thống kê
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            cursor = self._connect().cursor()
             
             # Tổng số công thức
             cursor.execute('SELECT COUNT(*) FROM recipes')
@@ -374,8 +1062,6 @@ class RecipeCloner:
             cursor.execute('SELECT COUNT(*) FROM ingredients')
             total_ingredients = cursor.fetchone()[0]
             
-            conn.close()
-            
             return {
                 "total_recipes": total_recipes,
                 "by_type": by_type,
@@ -387,6 +1073,7 @@ class RecipeCloner:
             logger.error(f"❌ Error getting statistics: {e}")
             return {}
     
+    @_timed_query("clear_all")
     def clear_all(self) -> bool:
         """
         Xóa tất cả công thức (CẢNH BÁO!)
@@ -395,14 +1082,13 @@ class RecipeCloner:
             True nếu thực hiện thành công
         """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('DELETE FROM ingredients')
-            cursor.execute('DELETE FROM recipes')
-            
-            conn.commit()
-            conn.close()
+            conn = self._connect()
+            with conn:
+                if self.search_enabled:
+                    # Xoá index trước để trigger của ingredients không phải cập nhật từng dòng FTS
+                    conn.execute('DELETE FROM recipes_fts')
+                conn.execute('DELETE FROM ingredients')
+                conn.execute('DELETE FROM recipes')
             
             logger.warning(f"⚠️ All recipes and ingredients have been deleted")
             return True
@@ -434,9 +1120,10 @@ def main():
         print("5. 📊 Xem thống kê")
         print("6. 📖 Liệt kê tất cả công thức")
         print("7. 🗑️  Xóa tất cả (CẢNH BÁO!)")
+        print("8. 🧹 Xoá công thức trùng title (migration)")
         print("0. ❌ Thoát")
         
-        choice = input("\n👉 Chọn (0-7): ").strip()
+        choice = input("\n👉 Chọn (0-8): ").strip()
         
         if choice == '1':
             json_file = input("Nhập đường dẫn file JSON: ").strip()
@@ -503,6 +1190,15 @@ def main():
             else:
                 print("❌ Đã hủy")
         
+        elif choice == '8':
+            export_file = input("File lưu công thức bị xoá [duplicates.ndjson]: ").strip() or "duplicates.ndjson"
+            confirm = input("⚠️  Giữ bản thêm đầu tiên, xoá các bản trùng? (yes/no): ").strip().lower()
+            if confirm == 'yes':
+                result = cloner.dedup_titles(export_file)
+                print(f"✅ Đã xoá {result['removed']} công thức trùng (lưu tại {export_file})")
+            else:
+                print("❌ Đã hủy")
+        
         elif choice == '0':
             print("\n👋 Tạm biệt!")
             break
@@ -0,0 +1,162 @@
+"""
+Cơ chế chịu lỗi cho lời gọi AI backend
+- RetryPolicy: retry với exponential backoff + jitter
+- RetryBudget: giới hạn tổng số retry theo tỉ lệ request (tránh retry storm)
+- CircuitBreaker: fail fast khi backend đang lỗi liên tục
+"""
+
+import json
+import time
+import random
+import threading
+from typing import Dict, Any
+
+import requests
+
+
+class RetryPolicy:
+    """Retry với exponential backoff"""
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 1, max_delay: float = 10):
+        """
+        Args:
+            max_retries: Số lần retry tối đa cho một request
+            base_delay: Thời gian chờ trước lần retry đầu tiên (giây)
+            max_delay: Thời gian chờ tối đa giữa hai lần retry (giây)
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """Thời gian chờ trước lần retry thứ attempt (bắt đầu từ 0), có full jitter"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        """Chỉ retry lỗi kết nối, timeout, 429, 5xx và body không phải JSON (VD: trang lỗi của proxy)"""
+        if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+            status = error.response.status_code
+            return status == 429 or status >= 500
+        return isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout, json.JSONDecodeError))
+
+    @staticmethod
+    def is_client_error(error: Exception) -> bool:
+        """Lỗi 4xx (trừ 429) do chính request gây ra, không phải do backend"""
+        if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+            status = error.response.status_code
+            return 400 <= status < 500 and status != 429
+        return False
+
+
+class RetryBudget:
+    """
+    Ngân sách retry dùng chung cho cả process
+
+    Mỗi request nạp thêm `ratio` token (tối đa `max_tokens`), mỗi retry tốn
+    một token. Khi backend lỗi hàng loạt, số retry bị giới hạn theo tỉ lệ
+    traffic thay vì nhân lên theo max_retries.
+    """
+
+    def __init__(self, ratio: float = 0.2, max_tokens: float = 10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = max_tokens
+        self.retries = 0
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self.tokens = min(self.max_tokens, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Lấy một token cho lần retry, False nếu đã hết ngân sách"""
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.retries += 1
+                return True
+            self.exhausted += 1
+            return False
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker ba trạng thái: closed -> open -> half_open
+
+    - closed: cho phép mọi request, mở khi lỗi liên tiếp đạt ngưỡng
+    - open: từ chối ngay trong reset_timeout giây
+    - half_open: cho một request thử, thành công thì đóng lại, lỗi thì mở tiếp
+
+    Request được allow() phải kết thúc bằng record_success, record_failure hoặc
+    release_trial; lượt thử không báo kết quả sau trial_timeout giây bị bỏ.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30, trial_timeout: float = 60):
+        """
+        Args:
+            failure_threshold: Số lỗi liên tiếp trước khi mở
+            reset_timeout: Thời gian mở trước khi cho request thử (giây)
+            trial_timeout: Thời gian tối đa chờ kết quả của request thử (giây)
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.trial_timeout = trial_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Request có được gửi đi không"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.time()
+            if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._trial_in_flight and now - self._trial_started >= self.trial_timeout:
+                self._trial_in_flight = False  # Request thử bị bỏ dở, không báo kết quả
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._trial_started = now
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def release_trial(self):
+        """Trả lượt thử half-open khi request không có kết quả (bị huỷ, hết retry budget)"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.time()
+                self._trial_in_flight = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "rejected": self.rejected,
+            }
@@ -0,0 +1,220 @@
+"""
+Cache cho response của AI backend
+- Tầng 1: LRU trong bộ nhớ (giới hạn số phần tử + TTL)
+- Tầng 2: SQLite (tuỳ chọn) để giữ cache qua các lần khởi động lại; dòng hết hạn
+  được xoá định kỳ (mỗi purge_every lần ghi) và số dòng bị giới hạn bởi max_rows
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Cache LRU + TTL cho các lần gọi chat API"""
+
+    def __init__(self, max_size: int = 256, ttl: float = 3600, db_path: Optional[str] = None,
+                 max_rows: int = 10000, purge_every: int = 100):
+        """
+        Khởi tạo cache
+
+        Args:
+            max_size: Số response tối đa giữ trong bộ nhớ
+            ttl: Thời gian sống của một response (giây)
+            db_path: Đường dẫn SQLite cho tầng lưu trữ bền (None = tắt)
+            max_rows: Số dòng tối đa trong SQLite, vượt quá thì xoá dòng sắp hết hạn nhất
+            purge_every: Số lần ghi SQLite giữa hai lần dọn dòng hết hạn / vượt max_rows
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.db_path = db_path
+        self.max_rows = max_rows
+        self.purge_every = max(1, purge_every)
+        self._writes = 0
+        self.purged = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.db_path:
+            self._init_db()
+
+    def _init_db(self):
+        """Tạo bảng cache nếu chưa tồn tại"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS response_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_response_cache_expires ON response_cache (expires_at)')
+        self._purge(conn)
+        conn.commit()
+        conn.close()
+
+    def _purge(self, conn: sqlite3.Connection):
+        """Xoá dòng hết hạn, rồi xoá dòng sắp hết hạn nhất (ghi sớm nhất) khi vượt max_rows"""
+        deleted = conn.execute('DELETE FROM response_cache WHERE expires_at <= ?', (time.time(),)).rowcount
+        excess = conn.execute('SELECT COUNT(*) FROM response_cache').fetchone()[0] - self.max_rows
+        if excess > 0:
+            deleted += conn.execute(
+                'DELETE FROM response_cache WHERE key IN '
+                '(SELECT key FROM response_cache ORDER BY expires_at LIMIT ?)',
+                (excess,)
+            ).rowcount
+        if deleted:
+            with self._lock:
+                self.purged += deleted
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], options: Dict[str, Any]) -> str:
+        """
+        Tạo cache key từ model, các message (system + user) và sampling options
+
+        Returns:
+            Chuỗi sha256 hex
+        """
+        raw = json.dumps(
+            {"model": model, "messages": messages, "options": options},
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Lấy response từ cache
+
+        Returns:
+            Response đã cache hoặc None nếu không có / đã hết hạn
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._entries[key]
+
+        if self.db_path:
+            value = self._db_get(key, now)
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, value[0], value[1])
+                return value[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        """Lưu response vào cache (bộ nhớ và SQLite nếu bật)"""
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires_at)
+        if self.db_path:
+            self._db_set(key, value, expires_at)
+
+    def _store(self, key: str, value: Dict[str, Any], expires_at: float):
+        """Ghi vào tầng LRU, loại bỏ phần tử cũ nhất khi vượt giới hạn (gọi khi đã giữ lock)"""
+        if self.max_size <= 0:
+            return
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _db_get(self, key: str, now: float) -> Optional[tuple]:
+        try:
+            conn = sqlite3.connect(self.db_path)
+            row = conn.execute(
+                'SELECT value, expires_at FROM response_cache WHERE key = ? AND expires_at > ?',
+                (key, now)
+            ).fetchone()
+            conn.close()
+            if row:
+                return json.loads(row[0]), row[1]
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            logger.warning(f"⚠️ Response cache read error: {e}")
+        return None
+
+    def _db_set(self, key: str, value: Dict[str, Any], expires_at: float):
+        try:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute(
+                'INSERT OR REPLACE INTO response_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, json.dumps(value, ensure_ascii=False), expires_at)
+            )
+            with self._lock:
+                self._writes += 1
+                purge = self._writes % self.purge_every == 0
+            if purge:
+                self._purge(conn)
+            conn.commit()
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ Response cache write error: {e}")
+
+    def delete(self, key: str):
+        """Xoá một response khỏi cache (VD: response không dùng được)"""
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.db_path:
+            try:
+                conn = sqlite3.connect(self.db_path)
+                conn.execute('DELETE FROM response_cache WHERE key = ?', (key,))
+                conn.commit()
+                conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ Response cache delete error: {e}")
+
+    def clear(self):
+        """Xoá toàn bộ cache"""
+        with self._lock:
+            self._entries.clear()
+        if self.db_path:
+            conn = sqlite3.connect(self.db_path)
+            conn.execute('DELETE FROM response_cache')
+            conn.commit()
+            conn.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Thống kê cache
+
+        Returns:
+            Dict chứa số hit/miss và kích thước hiện tại
+        """
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "persistent": bool(self.db_path),
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "purged": self.purged,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+            }
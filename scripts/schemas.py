@@ -0,0 +1,159 @@
+"""
+Schema JSON của response cho từng AI endpoint
+- Gửi cho backend qua option structured output (Ollama `format`, OpenAI `response_format`)
+- Kiểm tra response và sửa nhẹ các lỗi kiểu dữ liệu thường gặp
+"""
+
+import re
+from typing import Any, Dict, List
+
+RECIPE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "title": {"type": "string"},
+        "description": {"type": "string"},
+        "ingredients": {"type": "array", "items": {"type": "string"}},
+        "steps": {"type": "array", "items": {"type": "string"}},
+        "estimatedTime": {"type": "string"},
+        "servings": {"type": "integer"},
+    },
+    "required": ["title", "ingredients", "steps"],
+}
+
+MEAL_PLAN_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "plan": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "day": {"type": "string"},
+                    "breakfast": {"type": "string"},
+                    "lunch": {"type": "string"},
+                    "dinner": {"type": "string"},
+                },
+                "required": ["day", "breakfast", "lunch", "dinner"],
+            },
+        },
+    },
+    "required": ["plan"],
+}
+
+NUTRITION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "calories": {"type": "number"},
+        "protein": {"type": "number"},
+        "carbs": {"type": "number"},
+        "fat": {"type": "number"},
+        "nutrition": {"type": "string"},
+        "healthBenefits": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["calories", "protein", "carbs", "fat"],
+}
+
+TIPS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "tips": {"type": "array", "items": {"type": "string"}},
+        "explanation": {"type": "string"},
+    },
+    "required": ["tips"],
+}
+
+# Loại yêu cầu của AIService -> schema response
+RESPONSE_SCHEMAS = {
+    "recipe": RECIPE_SCHEMA,
+    "meal_plan": MEAL_PLAN_SCHEMA,
+    "nutrition": NUTRITION_SCHEMA,
+    "tips": TIPS_SCHEMA,
+}
+
+# "1,500" / "12,345,678.5": dấu phẩy trước đúng ba chữ số là phân cách hàng nghìn;
+# các trường hợp khác ("2,5", "0,500") dấu phẩy là dấu thập phân
+_NUMBER_RE = re.compile(r'-?(?:(?P<grouped>[1-9]\d{0,2}(?:,\d{3})+(?:\.\d+)?)(?!\d|,\d)|\d+(?:[.,]\d+)?)')
+
+
+def _parse_number(match: re.Match) -> float:
+    if match.group('grouped'):
+        return float(match.group().replace(',', ''))
+    return float(match.group().replace(',', '.'))
+
+
+def _type_ok(value: Any, expected: str) -> bool:
+    if expected == "object":
+        return isinstance(value, dict)
+    if expected == "array":
+        return isinstance(value, list)
+    if expected == "string":
+        return isinstance(value, str)
+    if expected == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if expected == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if expected == "boolean":
+        return isinstance(value, bool)
+    return True
+
+
+def validate(value: Any, schema: Dict[str, Any], path: str = "$") -> List[str]:
+    """
+    Kiểm tra value theo schema (hỗ trợ type, properties, required, items)
+
+    Returns:
+        Danh sách lỗi (rỗng nếu hợp lệ)
+    """
+    expected = schema.get("type")
+    if expected and not _type_ok(value, expected):
+        return [f"{path}: expected {expected}, got {type(value).__name__}"]
+
+    errors = []
+    if isinstance(value, dict):
+        for field in schema.get("required", []):
+            if field not in value:
+                errors.append(f"{path}.{field}: missing")
+        for field, sub_schema in schema.get("properties", {}).items():
+            if field in value:
+                errors.extend(validate(value[field], sub_schema, f"{path}.{field}"))
+    elif isinstance(value, list) and "items" in schema:
+        for i, item in enumerate(value):
+            errors.extend(validate(item, schema["items"], f"{path}[{i}]"))
+    return errors
+
+
+def repair(value: Any, schema: Dict[str, Any]) -> Any:
+    """
+    Sửa nhẹ các lỗi kiểu dữ liệu thường gặp của model (không gọi lại AI)
+    - "500 kcal" -> 500, "1,500 kcal" -> 1500, "2,5 g" -> 2.5 cho field số
+    - chuỗi đơn -> [chuỗi] cho field mảng
+    - số -> chuỗi cho field chuỗi
+
+    Returns:
+        Giá trị đã sửa (value gốc không bị thay đổi)
+    """
+    expected = schema.get("type")
+
+    if expected in ("integer", "number") and isinstance(value, str):
+        match = _NUMBER_RE.search(value)
+        if match:
+            number = _parse_number(match)
+            return int(round(number)) if expected == "integer" else number
+        return value
+    if expected == "integer" and isinstance(value, float):
+        return int(round(value))
+    if expected == "string" and isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    if expected == "string" and isinstance(value, list) and all(isinstance(v, str) for v in value):
+        return "\n".join(value)
+    if expected == "array" and isinstance(value, (str, dict)):
+        value = [value]
+
+    if isinstance(value, dict) and "properties" in schema:
+        return {
+            key: repair(item, schema["properties"][key]) if key in schema["properties"] else item
+            for key, item in value.items()
+        }
+    if isinstance(value, list) and "items" in schema:
+        return [repair(item, schema["items"]) for item in value]
+    return value
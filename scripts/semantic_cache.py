@@ -0,0 +1,187 @@
+"""
+Cache gần đúng cho /api/suggest-recipe
+- Chuẩn hoá nguyên liệu: chữ thường, bỏ dấu tiếng Việt, bỏ trùng, sắp xếp
+- Tìm response đã cache có tập nguyên liệu giống (Jaccard >= threshold)
+  bằng MinHash + LSH banding, sau đó xác nhận bằng Jaccard chính xác
+"""
+
+import time
+import random
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict, defaultdict
+from typing import Dict, Any, FrozenSet, List, Optional, Tuple
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def fold_text(text: str) -> str:
+    """Chữ thường, bỏ dấu (kể cả đ -> d), gộp khoảng trắng"""
+    text = unicodedata.normalize('NFD', str(text).lower().replace('đ', 'd'))
+    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    return ' '.join(text.split())
+
+
+def canonical_ingredients(ingredients: List[str]) -> Tuple[str, ...]:
+    """Tập nguyên liệu chuẩn hoá, sắp xếp, không trùng"""
+    folded = {fold_text(i) for i in ingredients}
+    folded.discard('')
+    return tuple(sorted(folded))
+
+
+def canonical_suggest_request(data: Dict[str, Any]) -> Tuple[Tuple[str, ...], str, str]:
+    """
+    Dạng chuẩn của request body /api/suggest-recipe
+
+    Returns:
+        (nguyên liệu chuẩn hoá, cuisine đã fold, difficulty đã fold)
+    """
+    return (
+        canonical_ingredients(data.get('ingredients', [])),
+        fold_text(data.get('cuisine', '')),
+        fold_text(data.get('difficulty', '')),
+    )
+
+
+class MinHasher:
+    """Tạo chữ ký MinHash cho tập chuỗi"""
+
+    def __init__(self, num_perm: int = 64, seed: int = 42):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._params = [
+            (rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+            for _ in range(num_perm)
+        ]
+
+    def signature(self, items: Tuple[str, ...]) -> Tuple[int, ...]:
+        hashes = [
+            int.from_bytes(hashlib.blake2b(item.encode('utf-8'), digest_size=8).digest(), 'big')
+            for item in items
+        ] or [0]
+        return tuple(
+            min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+            for a, b in self._params
+        )
+
+
+class SemanticCache:
+    """Cache suggest-recipe theo độ giống nhau của tập nguyên liệu (thread-safe)"""
+
+    def __init__(self, threshold: float = 0.8, max_size: int = 1024, ttl: float = 3600,
+                 num_perm: int = 64, bands: int = 16):
+        """
+        Args:
+            threshold: Jaccard tối thiểu để dùng lại kết quả đã cache
+            max_size: Số kết quả tối đa (LRU)
+            ttl: Thời gian sống (giây)
+            num_perm: Số hàm hash của MinHash
+            bands: Số band LSH (num_perm phải chia hết cho bands)
+        """
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._hasher = MinHasher(num_perm)
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._buckets: Dict[tuple, set] = defaultdict(set)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.near_hits = 0
+        self.misses = 0
+
+    def _band_keys(self, scope: Tuple[str, str], signature: Tuple[int, ...]) -> List[tuple]:
+        return [
+            (scope, band, signature[band * self.rows:(band + 1) * self.rows])
+            for band in range(self.bands)
+        ]
+
+    @staticmethod
+    def _jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+        if not a and not b:
+            return 1.0
+        return len(a & b) / len(a | b)
+
+    def get(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Tìm kết quả đã cache cho request suggest-recipe
+
+        Returns:
+            Kết quả đã cache hoặc None
+        """
+        ingredients, cuisine, difficulty = canonical_suggest_request(data)
+        scope = (cuisine, difficulty)
+        key = (ingredients, cuisine, difficulty)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[0]
+
+        if not ingredients:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        signature = self._hasher.signature(ingredients)
+        wanted = frozenset(ingredients)
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(scope, signature):
+                candidates |= self._buckets.get(band_key, set())
+
+            best, best_score = None, 0.0
+            for candidate in candidates:
+                entry = self._entries.get(candidate)
+                if entry is None or entry[1] <= now:
+                    continue
+                score = self._jaccard(wanted, frozenset(candidate[0]))
+                if score >= self.threshold and score > best_score:
+                    best, best_score = candidate, score
+
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.near_hits += 1
+            return self._entries[best][0]
+
+    def set(self, data: Dict[str, Any], result: Dict[str, Any]):
+        """Lưu kết quả suggest-recipe"""
+        ingredients, cuisine, difficulty = canonical_suggest_request(data)
+        key = (ingredients, cuisine, difficulty)
+        signature = self._hasher.signature(ingredients)
+        band_keys = self._band_keys((cuisine, difficulty), signature)
+
+        with self._lock:
+            self._entries[key] = (result, time.time() + self.ttl, band_keys)
+            self._entries.move_to_end(key)
+            for band_key in band_keys:
+                self._buckets[band_key].add(key)
+            while len(self._entries) > self.max_size:
+                old_key, (_, _, old_bands) = self._entries.popitem(last=False)
+                for band_key in old_bands:
+                    bucket = self._buckets.get(band_key)
+                    if bucket is not None:
+                        bucket.discard(old_key)
+                        if not bucket:
+                            del self._buckets[band_key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Thống kê hit/miss"""
+        with self._lock:
+            hits = self.exact_hits + self.near_hits
+            total = hits + self.misses
+            return {
+                "size": len(self._entries),
+                "threshold": self.threshold,
+                "exact_hits": self.exact_hits,
+                "near_hits": self.near_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 4) if total else 0.0,
+            }
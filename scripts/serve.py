@@ -0,0 +1,160 @@
+"""
+Chạy backend ở chế độ production (gunicorn, worker uvicorn hoặc gthread)
+- Có uvicorn (SERVE_ASGI=true, mặc định): worker ASGI (asgi.py), route /api/async/*
+  chạy trên event loop nên một worker giữ được hàng trăm generation đang chờ; các
+  route khác chạy trên --threads thread. Không có uvicorn: worker gthread, mỗi
+  request (kể cả /api/async/*) giữ một thread tới khi xong
+- App được import một lần ở process cha (preload) rồi fork: AIService, RecipeCloner,
+  cache và bảng dinh dưỡng không phải khởi tạo lại trong từng worker
+- SERVE_MAX_REQUESTS > 0: thay worker sau chừng đó request (chặn rò rỉ bộ nhớ)
+- SIGTERM: worker ngừng nhận request, chờ request đang chạy xong; sau đó lời gọi AI
+  không retry nữa, job chưa chạy bị huỷ và job đang chạy được chờ tối đa nửa
+  SERVE_GRACEFUL_TIMEOUT giây, để worker tự thoát trước khi bị SIGKILL
+- Import app (preload ở process cha) không chạy thread nào: health probe và event
+  loop async chỉ chạy trong worker (post_fork)
+
+Mặc định chỉ một worker: phần lớn thời gian request là chờ AI backend nên thread
+là đủ, và mọi trạng thái trong bộ nhớ là của từng process. Với --workers > 1:
+- /api/metrics và các thống kê cache/backend chỉ là số liệu của worker nhận request
+- Response cache, semantic cache, single-flight và circuit breaker không dùng chung
+  giữa các worker (cache trên đĩa qua AI_CACHE_DB thì dùng chung)
+- JOBS_MAX_PENDING và JOBS_WORKERS (số job chạy song song) là của từng worker
+Thay worker (SERVE_MAX_REQUESTS) cũng xoá các trạng thái này của worker cũ.
+
+Chạy: python serve.py --threads 16
+Windows (không có gunicorn): một process uvicorn, không có uvicorn thì server
+threaded của Flask, debug tắt
+"""
+
+import os
+import sys
+import logging
+import argparse
+from typing import Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+def default_options() -> Dict[str, Any]:
+    """Cấu hình gunicorn đọc từ biến môi trường SERVE_*"""
+    return {
+        "bind": os.getenv('SERVE_BIND', '0.0.0.0:5000'),
+        # Một worker: metrics, cache và hàng đợi job trong bộ nhớ là của từng process
+        "workers": int(os.getenv('SERVE_WORKERS', '1')),
+        # Phần lớn thời gian request là chờ AI backend nên mỗi worker chạy nhiều thread
+        "threads": int(os.getenv('SERVE_THREADS', '16')),
+        "max_requests": int(os.getenv('SERVE_MAX_REQUESTS', '0')),
+        "max_requests_jitter": int(os.getenv('SERVE_MAX_REQUESTS_JITTER', '100')),
+        # Lớn hơn AI_READ_TIMEOUT để lời gọi AI đang chạy kịp xong khi tắt/thay worker
+        "graceful_timeout": int(os.getenv('SERVE_GRACEFUL_TIMEOUT', '90')),
+        "timeout": int(os.getenv('SERVE_TIMEOUT', '120')),
+        "keepalive": int(os.getenv('SERVE_KEEPALIVE', '5')),
+        "loglevel": os.getenv('SERVE_LOG_LEVEL', 'info'),
+        "asgi": os.getenv('SERVE_ASGI', 'true').lower() == 'true',
+    }
+
+
+def _has_uvicorn() -> bool:
+    try:
+        import uvicorn.workers  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _post_fork(server, worker):
+    import app as app_module
+    app_module.init_worker()
+
+
+def _worker_exit(server, worker):
+    import app as app_module
+    # Nửa graceful timeout đã dành cho request đang chạy, nửa còn lại cho job nền
+    app_module.shutdown_worker(timeout=max(1, worker.cfg.graceful_timeout / 2))
+
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:  # Windows: gunicorn không hỗ trợ
+    BaseApplication = None
+
+if BaseApplication is not None:
+    class CookbookApplication(BaseApplication):
+        """Gunicorn application nhúng, cấu hình bằng dict thay vì file/CLI của gunicorn"""
+
+        def __init__(self, options: Dict[str, Any]):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                if key in self.cfg.settings and value is not None:
+                    self.cfg.set(key, value)
+            self.cfg.set("worker_class", "uvicorn.workers.UvicornWorker" if self.options["asgi"] else "gthread")
+            self.cfg.set("preload_app", True)
+            self.cfg.set("post_fork", _post_fork)
+            self.cfg.set("worker_exit", _worker_exit)
+
+        def load(self):
+            if self.options["asgi"]:
+                from asgi import create_app
+                return create_app(self.options["threads"])
+            from app import app
+            return app
+
+
+def _run_threaded(options: Dict[str, Any]):
+    """Fallback khi không có gunicorn: một process, uvicorn nếu có, không thì mỗi request một thread"""
+    host, _, port = options["bind"].rpartition(":")
+    if options["asgi"]:
+        import uvicorn
+        import app as app_module
+        from asgi import create_app
+        app_module.init_worker()
+        uvicorn.run(create_app(options["threads"]), host=host or '0.0.0.0', port=int(port))
+        return
+    from app import app, init_worker
+    init_worker()
+    logger.warning("⚠️ gunicorn không khả dụng, chạy server threaded của Flask (1 process)")
+    app.run(host=host or '0.0.0.0', port=int(port), threaded=True, debug=False)
+
+
+def main(argv=None):
+    options = default_options()
+    parser = argparse.ArgumentParser(description="Cookbook AI backend (production)")
+    parser.add_argument("--bind", default=options["bind"], help="host:port")
+    parser.add_argument("--workers", type=int, default=options["workers"],
+                        help="Số worker process (metrics/cache/job queue tách riêng từng worker)")
+    parser.add_argument("--threads", type=int, default=options["threads"], help="Số thread mỗi worker")
+    parser.add_argument("--max-requests", type=int, default=options["max_requests"],
+                        help="Thay worker sau N request (0 = không thay)")
+    parser.add_argument("--graceful-timeout", type=int, default=options["graceful_timeout"],
+                        help="Thời gian chờ request đang chạy khi dừng worker (giây)")
+    parser.add_argument("--no-asgi", dest="asgi", action="store_false", default=options["asgi"],
+                        help="Dùng worker gthread thay cho uvicorn")
+    args = parser.parse_args(argv)
+    options.update(
+        bind=args.bind, workers=args.workers, threads=args.threads,
+        max_requests=args.max_requests, graceful_timeout=args.graceful_timeout, asgi=args.asgi,
+    )
+
+    # app.py chia pool kết nối AI theo số thread gọi AI
+    os.environ["SERVE_THREADS"] = str(options["threads"])
+
+    logging.basicConfig(level=logging.INFO)
+    if options["asgi"] and not _has_uvicorn():
+        logger.warning("⚠️ uvicorn không khả dụng: /api/async/* giữ một thread mỗi request (tối đa --threads)")
+        options["asgi"] = False
+    if options["workers"] > 1:
+        logger.warning(
+            f"⚠️ {options['workers']} workers: metrics, cache stats and job queue limits are per worker"
+        )
+    if BaseApplication is None:
+        _run_threaded(options)
+    else:
+        CookbookApplication(options).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""
+Single-flight: gộp các lời gọi đồng thời có cùng key thành một lời gọi duy nhất
+Các caller đến sau chờ kết quả của caller đầu tiên thay vì gọi lại backend
+"""
+
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+
+class _Call:
+    """Một lời gọi đang chạy và các caller đang chờ nó"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Gộp lời gọi trùng key đang chạy đồng thời (thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Chạy fn() một lần cho mỗi key đang in-flight
+
+        Args:
+            key: Key định danh lời gọi (VD: hash của payload)
+            fn: Hàm thực hiện lời gọi thật
+
+        Returns:
+            (kết quả, shared) - shared=True nếu kết quả lấy từ lời gọi của caller khác
+
+        Raises:
+            Exception do fn() ném ra (được chuyển cho tất cả caller đang chờ)
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.executions += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Thống kê single-flight
+
+        Returns:
+            Dict chứa tổng số lời gọi, số lần gọi thật và số lời gọi được gộp
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "executions": self.executions,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls),
+            }
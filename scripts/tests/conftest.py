@@ -0,0 +1,14 @@
+"""
+Cấu hình pytest cho các module trong scripts/
+
+Chạy: cd scripts && python -m pytest tests
+"""
+
+import os
+import sys
+import logging
+
+# Các module trong scripts/ import lẫn nhau bằng tên phẳng (from metrics import ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logging.disable(logging.INFO)
@@ -0,0 +1,243 @@
+import json
+
+import pytest
+import requests
+
+from ai_service import AIService
+from resilience import RetryPolicy, CircuitBreaker
+
+
+class FakeResponse:
+    def __init__(self, status=200, body=None, lines=()):
+        self.status_code = status
+        self._body = body
+        self._lines = lines
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            response = requests.Response()
+            response.status_code = self.status_code
+            raise requests.exceptions.HTTPError(f"{self.status_code}", response=response)
+
+    def json(self):
+        return self._body
+
+    def iter_lines(self):
+        for line in self._lines:
+            yield line.encode("utf-8")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """Thay requests.Session: trả lần lượt các response đã chuẩn bị"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        return self.responses.pop(0)
+
+
+def _service(*responses, **kwargs):
+    kwargs.setdefault("retry_policy", RetryPolicy(max_retries=0))
+    service = AIService(host="http://backend/api/chat", cache=None, **kwargs)
+    service.session = FakeSession(*responses)
+    return service
+
+
+@pytest.mark.parametrize("status, state", [
+    (400, CircuitBreaker.CLOSED),
+    (429, CircuitBreaker.OPEN),
+    (503, CircuitBreaker.OPEN),
+])
+def test_fetch_client_errors_do_not_trip_breaker(status, state):
+    service = _service(FakeResponse(status), circuit_breaker=CircuitBreaker(failure_threshold=1))
+    result = service._fetch({"options": {"num_ctx": 2048}}, "key")
+    assert "error" in result
+    assert service.circuit_breaker.state == state
+
+
+def test_fetch_does_not_retry_client_errors():
+    service = _service(FakeResponse(400), FakeResponse(200, {"message": {"content": "ok"}}),
+                       retry_policy=RetryPolicy(max_retries=2, base_delay=0))
+    assert "error" in service._fetch({"options": {"num_ctx": 2048}}, "key")
+    assert service.session.calls == 1
+
+
+def _ollama_lines(*tokens, done=True):
+    lines = [json.dumps({"message": {"content": t}, "done": False}) for t in tokens]
+    if done:
+        lines.append(json.dumps({"message": {"content": ""}, "done": True,
+                                 "prompt_eval_count": 30, "eval_count": 12}))
+    return lines
+
+
+class MemoryCache:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value):
+        self.data[key] = value
+
+
+def test_stream_chat_caches_and_records_complete_stream():
+    service = _service(FakeResponse(lines=_ollama_lines("Xin ", "chào")))
+    service.cache = MemoryCache()
+    messages = [{"role": "user", "content": "hi"}]
+    assert "".join(service.stream_chat(messages)) == "Xin chào"
+    [cached] = service.cache.data.values()
+    assert cached["message"]["content"] == "Xin chào"
+    assert cached["usage"] == {"prompt_tokens": 30, "completion_tokens": 12}
+    assert service.context_usage.stats()["requests"] == 1
+
+
+def test_stream_chat_skips_cache_without_done():
+    service = _service(FakeResponse(lines=_ollama_lines("Xin ", "ch", done=False)))
+    service.cache = MemoryCache()
+    assert "".join(service.stream_chat([{"role": "user", "content": "hi"}])) == "Xin ch"
+    assert service.cache.data == {}
+    assert service.context_usage.stats()["by_bucket"] == {}
+
+
+def test_stream_chat_skips_cache_when_client_disconnects():
+    service = _service(FakeResponse(lines=_ollama_lines("Xin ", "chào")))
+    service.cache = MemoryCache()
+    stream = service.stream_chat([{"role": "user", "content": "hi"}])
+    assert next(stream) == "Xin "
+    stream.close()
+    assert service.cache.data == {}
+    assert service.backends.backends[0].outstanding == 0
+
+
+def test_stream_chat_on_complete_only_after_done():
+    completed = []
+    service = _service(FakeResponse(lines=_ollama_lines("Xin ", "chào")),
+                       FakeResponse(lines=_ollama_lines("Xin ", "ch", done=False)))
+    messages = [{"role": "user", "content": "hi"}]
+    assert "".join(service.stream_chat(messages, on_complete=completed.append)) == "Xin chào"
+    assert [r["message"]["content"] for r in completed] == ["Xin chào"]
+    assert "".join(service.stream_chat(messages, on_complete=completed.append)) == "Xin ch"
+    assert len(completed) == 1
+
+
+def test_stream_chat_on_complete_fires_on_cache_hit():
+    service = _service(FakeResponse(lines=_ollama_lines("Xin ", "chào")))
+    service.cache = MemoryCache()
+    messages = [{"role": "user", "content": "hi"}]
+    "".join(service.stream_chat(messages))
+    completed = []
+    assert "".join(service.stream_chat(messages, on_complete=completed.append)) == "Xin chào"
+    assert len(completed) == 1
+
+
+def test_parse_openai_stream_usage_chunk():
+    line = "data: " + json.dumps({"choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": 7}})
+    token, done, chunk = AIService._parse_stream_line(line)
+    assert (token, done) == ("", False)
+    assert chunk["usage"]["completion_tokens"] == 7
+    assert AIService._parse_stream_line("data: [DONE]") == ("", True, {})
+
+
+def test_parse_json_response_skips_values_that_do_not_match_schema():
+    content = 'Ví dụ [1] và {"note": "x"}, kết quả: {"tips": ["Rửa sạch"]}'
+    assert AIService._parse_json_response(content) == [1]
+    assert AIService._parse_json_response(content, "tips") == {"tips": ["Rửa sạch"]}
+
+
+def test_fetch_does_not_retry_while_draining():
+    service = _service(FakeResponse(status=503), FakeResponse(body={"message": {"content": "{}"}}),
+                       retry_policy=RetryPolicy(max_retries=2, base_delay=0))
+    service.draining = True
+    assert "error" in service._fetch({"options": {"num_ctx": 2048}}, "key")
+    assert service.session.calls == 1
+
+
+def test_session_pool_wait_is_bounded():
+    import threading
+    import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from ai_service import PoolTimeout
+
+    class SlowHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(1)
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    session = AIService._create_session(1, 1, 0.2)
+    try:
+        holder = threading.Thread(target=session.get, args=(url,))
+        holder.start()
+        time.sleep(0.1)
+        start = time.monotonic()
+        with pytest.raises(PoolTimeout):
+            session.get(url)
+        assert time.monotonic() - start < 0.9
+        assert RetryPolicy.is_retryable(PoolTimeout())
+        holder.join()
+    finally:
+        server.shutdown()
+        session.close()
+
+
+def test_pool_timeout_does_not_count_against_backend_or_breaker():
+    from ai_service import PoolTimeout
+
+    class ExhaustedSession:
+        calls = 0
+
+        def post(self, url, **kwargs):
+            self.calls += 1
+            raise PoolTimeout("pool exhausted")
+
+    service = _service(circuit_breaker=CircuitBreaker(failure_threshold=1))
+    service.session = ExhaustedSession()
+    assert "error" in service._fetch({"options": {"num_ctx": 2048}}, "key")
+    backend = service.backends.backends[0]
+    assert (backend.outstanding, backend.errors) == (0, 0)
+    assert service.circuit_breaker.state == CircuitBreaker.CLOSED
+
+
+def test_payload_format_follows_chosen_backend():
+    hosts = ["http://ollama/api/chat", "http://openai/v1/chat/completions"]
+    service = AIService(hosts=hosts, cache=None, structured_output=True,
+                        retry_policy=RetryPolicy(max_retries=0))
+    sent = []
+
+    class RecordingSession(FakeSession):
+        def post(self, url, **kwargs):
+            sent.append((url, kwargs["json"]))
+            return super().post(url, **kwargs)
+
+    service.session = RecordingSession(FakeResponse(200, {"message": {"content": "{}"}}),
+                                       FakeResponse(lines=["data: [DONE]"]))
+    schema = {"type": "object"}
+    payload = service._build_payload([{"role": "user", "content": "hi"}], schema=schema)
+    service._send(payload)
+    list(service.stream_chat([{"role": "user", "content": "hi"}], schema=schema))
+
+    (ollama_url, ollama), (openai_url, openai) = sent
+    assert ollama_url == hosts[0] and ollama["format"] == schema
+    assert "response_format" not in ollama and "stream_options" not in ollama
+    assert openai_url == hosts[1] and "format" not in openai
+    assert openai["response_format"]["json_schema"]["schema"] == schema
+    assert openai["stream_options"] == {"include_usage": True}
+    # Payload gốc (dùng làm cache key) không bị đổi
+    assert payload["format"] == schema and "response_format" not in payload
@@ -0,0 +1,94 @@
+import asyncio
+import json
+import threading
+
+from asgi import AsyncRoutes
+from async_ai_service import BackgroundLoop
+
+
+async def _call(app, method, path, body=b""):
+    messages = [{"type": "http.request", "body": body}]
+    sent = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": path, "query_string": b"",
+             "headers": [], "http_version": "1.1", "root_path": ""}
+    await app(scope, receive, send)
+    status = sent[0]["status"]
+    return status, b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def _wsgi_app(environ, start_response):
+    start_response("200 OK", [("Content-Type", "text/plain")])
+    return [environ["PATH_INFO"].encode()]
+
+
+def test_async_routes_wait_without_holding_threads():
+    threads, pending = 2, 20
+    loop = BackgroundLoop()
+    waiting = []
+
+    async def generate(data):
+        waiting.append(data)
+        # Chỉ xong khi mọi request cùng đang chờ: giữ thread mỗi request thì treo ở `threads`
+        while len(waiting) < pending:
+            await asyncio.sleep(0.001)
+        return await loop.run(asyncio.sleep(0, {"n": data["n"]})), 200
+
+    app = AsyncRoutes(_wsgi_app, {"slow": generate}, threads=threads)
+
+    async def main():
+        calls = [_call(app, "POST", "/api/async/slow", json.dumps({"n": i}).encode()) for i in range(pending)]
+        return await asyncio.wait_for(asyncio.gather(*calls), timeout=5)
+
+    try:
+        results = asyncio.run(main())
+    finally:
+        loop.stop()
+    assert pending > threads
+    assert [json.loads(body) for _, body in results] == [{"n": i} for i in range(pending)]
+    assert {status for status, _ in results} == {200}
+
+
+def test_wsgi_routes_run_in_parallel():
+    barrier = threading.Barrier(2, timeout=5)
+
+    def wsgi_app(environ, start_response):
+        barrier.wait()
+        return _wsgi_app(environ, start_response)
+
+    app = AsyncRoutes(wsgi_app, {}, threads=2)
+
+    async def main():
+        return await asyncio.gather(_call(app, "GET", "/a"), _call(app, "GET", "/b"))
+
+    assert asyncio.run(main()) == [(200, b"/a"), (200, b"/b")]
+
+
+def test_unknown_and_non_post_routes_go_to_wsgi_app():
+    async def handler(data):
+        return {}, 200
+
+    app = AsyncRoutes(_wsgi_app, {"tips": handler}, threads=1)
+    assert asyncio.run(_call(app, "POST", "/api/async/other")) == (200, b"/api/async/other")
+    assert asyncio.run(_call(app, "OPTIONS", "/api/async/tips")) == (200, b"/api/async/tips")
+
+
+def test_handler_error_returns_500_and_records_metrics():
+    observed = []
+
+    async def handler(data):
+        raise RuntimeError("boom")
+
+    app = AsyncRoutes(_wsgi_app, {"tips": handler}, threads=1,
+                      on_response=lambda *args: observed.append(args[:3]))
+    status, body = asyncio.run(_call(app, "POST", "/api/async/tips", b"{}"))
+    assert (status, json.loads(body)) == (500, {"error": "boom"})
+    assert observed == [("POST", "/api/async/tips", 500)]
@@ -0,0 +1,189 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from ai_service import AIService
+from async_ai_service import AsyncAIService
+from resilience import RetryPolicy, RetryBudget, CircuitBreaker
+
+
+def _service(handler, **kwargs):
+    """AsyncAIService gọi backend giả qua httpx.MockTransport (phải gọi trong event loop)"""
+    kwargs.setdefault("retry_policy", RetryPolicy(max_retries=0))
+    service = AsyncAIService(AIService(host="http://backend/api/chat", cache=None, **kwargs))
+    service._ensure_client()
+    service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return service
+
+
+def _backend(service):
+    return service.service.backends.backends[0]
+
+
+def test_send_releases_backend_on_invalid_json():
+    async def run():
+        service = _service(lambda request: httpx.Response(200, text="<html>proxy error</html>"))
+        with pytest.raises(ValueError):
+            await service._send({"options": {"num_ctx": 2048}})
+        return service
+
+    service = asyncio.run(run())
+    assert _backend(service).outstanding == 0
+    assert _backend(service).errors == 1
+    assert service.in_flight == 0
+
+
+def test_send_releases_backend_when_cancelled():
+    async def slow(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200, json={})
+
+    async def run():
+        service = _service(slow)
+        task = asyncio.ensure_future(service._send({"options": {"num_ctx": 2048}}))
+        await asyncio.sleep(0.05)
+        assert _backend(service).outstanding == 1
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return service
+
+    service = asyncio.run(run())
+    assert _backend(service).outstanding == 0
+    assert service.in_flight == 0
+
+
+def _open_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure()
+    return breaker
+
+
+def test_fetch_counts_invalid_json_as_breaker_failure():
+    async def run():
+        service = _service(lambda request: httpx.Response(200, text="<html>proxy error</html>"),
+                           circuit_breaker=CircuitBreaker(failure_threshold=1))
+        result = await service._fetch({"options": {"num_ctx": 2048}}, "key")
+        return service, result
+
+    service, result = asyncio.run(run())
+    assert "error" in result
+    assert service.service.circuit_breaker.state == CircuitBreaker.OPEN
+
+
+def test_fetch_retries_invalid_json():
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(200, text="<html>proxy error</html>")
+        return httpx.Response(200, json={"message": {"content": "ok"}})
+
+    async def run():
+        service = _service(handler, retry_policy=RetryPolicy(max_retries=1, base_delay=0))
+        return await service._fetch({"options": {"num_ctx": 2048}}, "key")
+
+    assert asyncio.run(run()) == {"message": {"content": "ok"}}
+    assert len(calls) == 2
+
+
+def test_fetch_releases_half_open_trial_when_cancelled():
+    async def slow(request):
+        await asyncio.sleep(10)
+        return httpx.Response(200, json={})
+
+    async def run():
+        breaker = _open_breaker()
+        service = _service(slow, circuit_breaker=breaker)
+        task = asyncio.ensure_future(service._fetch({"options": {"num_ctx": 2048}}, "key"))
+        await asyncio.sleep(0.05)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        return breaker
+
+    breaker = asyncio.run(run())
+    assert breaker.allow()
+
+
+def test_fetch_releases_half_open_trial_when_budget_exhausted():
+    async def run():
+        breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0)
+        for _ in range(5):
+            breaker.record_failure()
+        service = _service(lambda request: httpx.Response(503),
+                           circuit_breaker=breaker,
+                           retry_policy=RetryPolicy(max_retries=3, base_delay=0),
+                           retry_budget=RetryBudget(ratio=0, max_tokens=0))
+        result = await service._fetch({"options": {"num_ctx": 2048}}, "key")
+        return breaker, result
+
+    breaker, result = asyncio.run(run())
+    assert "error" in result
+    assert breaker.allow()
+
+
+@pytest.mark.parametrize("status, state", [
+    (400, CircuitBreaker.CLOSED),
+    (404, CircuitBreaker.CLOSED),
+    (429, CircuitBreaker.OPEN),
+    (500, CircuitBreaker.OPEN),
+])
+def test_fetch_client_errors_do_not_trip_breaker(status, state):
+    async def run():
+        breaker = CircuitBreaker(failure_threshold=1)
+        service = _service(lambda request: httpx.Response(status), circuit_breaker=breaker)
+        result = await service._fetch({"options": {"num_ctx": 2048}}, "key")
+        return breaker, result
+
+    breaker, result = asyncio.run(run())
+    assert "error" in result
+    assert breaker.state == state
+
+
+def test_background_loop_starts_lazily_and_after_fork(monkeypatch):
+    from async_ai_service import BackgroundLoop
+    import async_ai_service
+
+    loop = BackgroundLoop()
+    assert not loop.running and loop.loop is None
+    assert loop.submit(asyncio.sleep(0, "ok")).result(timeout=5) == "ok"
+    first = loop.loop
+    assert loop.running
+
+    # Process con sau fork: loop của process cha không có thread chạy ở đây
+    pid = async_ai_service.os.getpid()
+    monkeypatch.setattr(async_ai_service.os, "getpid", lambda: pid + 1)
+    assert not loop.running
+    assert loop.submit(asyncio.sleep(0, "child")).result(timeout=5) == "child"
+    assert loop.loop is not first
+    loop.stop()
+    monkeypatch.undo()
+    first.call_soon_threadsafe(first.stop)
+
+
+def test_send_formats_payload_for_chosen_backend():
+    sent = []
+
+    def handler(request):
+        sent.append((str(request.url), json.loads(request.content)))
+        return httpx.Response(200, json={"message": {"content": "{}"}})
+
+    async def run():
+        service = AsyncAIService(AIService(hosts=["http://openai/v1/chat/completions", "http://ollama/api/chat"],
+                                           cache=None, structured_output=True))
+        service._ensure_client()
+        service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        payload = service.service._build_payload([{"role": "user", "content": "hi"}], schema={"type": "object"})
+        await service._send(payload)
+        await service._send(payload)
+
+    asyncio.run(run())
+    (openai_url, openai), (ollama_url, ollama) = sent
+    assert openai_url.startswith("http://openai/") and openai["response_format"]["type"] == "json_schema"
+    assert "format" not in openai
+    assert ollama_url.startswith("http://ollama/") and ollama["format"] == {"type": "object"}
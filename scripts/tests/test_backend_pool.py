@@ -0,0 +1,97 @@
+import requests
+
+import backend_pool
+from backend_pool import BackendPool
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class ProbeSession:
+    """Session giả cho health probe: URL nằm trong `down` thì lỗi kết nối"""
+
+    def __init__(self):
+        self.down = set()
+
+    def get(self, url, timeout=None):
+        if url in self.down:
+            raise requests.exceptions.ConnectionError(url)
+        response = requests.Response()
+        response.status_code = 200
+        return response
+
+
+def _pool(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(backend_pool.time, "time", clock)
+    pool = BackendPool(["http://a/api/chat", "http://b/api/chat"], failure_threshold=2, eject_seconds=30)
+    return pool, clock
+
+
+def _fail(pool, backend, times):
+    for _ in range(times):
+        backend.outstanding += 1
+        pool.release(backend, 0.1, ok=False)
+
+
+def test_acquire_prefers_least_outstanding(monkeypatch):
+    pool, _ = _pool(monkeypatch)
+    first = pool.acquire()
+    second = pool.acquire()
+    assert first is not second
+    pool.release(first, 0.1, ok=True)
+    assert pool.acquire() is first
+
+
+def test_failures_eject_backend(monkeypatch):
+    pool, _ = _pool(monkeypatch)
+    a, b = pool.backends
+    _fail(pool, a, 2)
+    assert not a.is_available()
+    assert all(pool.acquire() is b for _ in range(3))
+
+
+def test_ejected_backend_stays_out_until_probe_succeeds(monkeypatch):
+    pool, clock = _pool(monkeypatch)
+    a, _ = pool.backends
+    session = ProbeSession()
+    session.down.add("http://a/api/tags")
+    _fail(pool, a, 2)
+
+    clock.now += 60
+    assert not a.is_available()
+    pool.probe(session)
+    assert not a.is_available()
+
+    # Probe lỗi gia hạn thời gian loại
+    session.down.clear()
+    clock.now += 10
+    pool.probe(session)
+    assert not a.is_available()
+    clock.now += 20
+    pool.probe(session)
+    assert a.is_available()
+
+
+def test_probe_does_not_readmit_before_eject_window(monkeypatch):
+    pool, clock = _pool(monkeypatch)
+    a, _ = pool.backends
+    _fail(pool, a, 2)
+    clock.now += 10
+    pool.probe(ProbeSession())
+    assert not a.is_available()
+    clock.now += 20
+    pool.probe(ProbeSession())
+    assert a.is_available()
+
+
+def test_all_ejected_falls_back_to_every_backend(monkeypatch):
+    pool, _ = _pool(monkeypatch)
+    for backend in pool.backends:
+        _fail(pool, backend, 2)
+    assert pool.acquire() in pool.backends
@@ -0,0 +1,28 @@
+from context_window import ContextUsage
+from metrics import REGISTRY
+
+
+def _line(text, prefix):
+    return next(line for line in text.splitlines() if line.startswith(prefix))
+
+
+def test_record_exports_usage_per_bucket():
+    usage = ContextUsage()
+    before = REGISTRY.render()
+    usage.record(2048, {"prompt_eval_count": 1500, "eval_count": 300})
+    usage.record(2048, {"prompt_eval_count": 2000, "eval_count": 400})
+    usage.record(4096, {})
+    text = REGISTRY.render()
+
+    def value(prefix, source=text):
+        try:
+            return float(_line(source, prefix).rsplit(" ", 1)[1])
+        except StopIteration:
+            return 0.0
+
+    assert value('ai_context_requests_total{num_ctx="2048"}') - value('ai_context_requests_total{num_ctx="2048"}', before) == 2
+    assert value('ai_context_requests_total{num_ctx="4096"}') - value('ai_context_requests_total{num_ctx="4096"}', before) == 1
+    assert value('ai_context_used_tokens_sum{num_ctx="2048"}') - value('ai_context_used_tokens_sum{num_ctx="2048"}', before) == 4200
+    assert value('ai_context_overflows_total{num_ctx="2048"}') - value('ai_context_overflows_total{num_ctx="2048"}', before) == 1
+    assert 'ai_context_utilization_ratio_count{num_ctx="2048"}' in text
+    assert usage.stats()["by_bucket"] == {"2048": 2, "4096": 1}
@@ -0,0 +1,74 @@
+import json
+import time
+
+import pytest
+
+from import_pipeline import ImportPipeline, batched
+from recipe_cloner import RecipeCloner
+
+
+def _normalize(batch):
+    """Lô đầu chuẩn hoá chậm nhất: thứ tự ghi vẫn phải theo thứ tự đọc (chạy trong process con)"""
+    if "boom" in batch:
+        raise ValueError("bad batch")
+    time.sleep(0.05 * max(0, 3 - batch[0]))
+    return ([item * 10 for item in batch],)
+
+
+def _write(items):
+    return {"inserted": len(items), "skipped": 0, "failed": 0, "items": items}
+
+
+def test_batched():
+    assert list(batched(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(batched([], 3)) == []
+
+
+def test_batches_are_written_in_read_order():
+    seen = []
+    pipeline = ImportPipeline(_normalize, _write, workers=2, queue_size=2)
+    pipeline.run(((batch, i) for i, batch in enumerate(batched(range(8), 2))),
+                 lambda stats, context: seen.append((context, stats["items"])))
+    assert seen == [(0, [0, 10]), (1, [20, 30]), (2, [40, 50]), (3, [60, 70])]
+
+
+def test_failed_batch_is_counted_and_import_continues():
+    seen = []
+    pipeline = ImportPipeline(_normalize, _write, workers=2)
+    pipeline.run([([1, "boom"], "a"), ([5], "b")], lambda stats, context: seen.append((context, stats)))
+    assert seen[0][0] == "a" and seen[0][1]["failed"] == 2
+    assert seen[0][1]["errors"] == [{"error": "bad batch"}]
+    assert seen[1] == ("b", _write([50]))
+
+
+def test_on_batch_error_stops_reading_and_is_raised():
+    read = []
+
+    def batches():
+        for i in range(50):
+            read.append(i)
+            yield [i], i
+
+    def on_batch(stats, context):
+        raise RuntimeError("disk full")
+
+    pipeline = ImportPipeline(_normalize, _write, workers=1, queue_size=1)
+    with pytest.raises(RuntimeError, match="disk full"):
+        pipeline.run(batches(), on_batch)
+    assert len(read) < 50
+
+
+def test_parallel_import_matches_sequential(tmp_path):
+    recipes = [{"title": f"Món {i}", "ingredients": [f"nguyên liệu {i}"], "steps": ["Nấu"]} for i in range(7)]
+    recipes.append(recipes[0])
+    path = tmp_path / "recipes.ndjson"
+    path.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in recipes), encoding="utf-8")
+
+    results = {}
+    for workers in (0, 2):
+        cloner = RecipeCloner(db_path=str(tmp_path / f"recipes-{workers}.db"))
+        result = cloner.import_json(str(path), batch_size=3, workers=workers)
+        results[workers] = (result["inserted"], result["skipped"],
+                            sorted(r["title"] for r in cloner.iter_recipes()))
+    assert results[2] == results[0]
+    assert results[0][:2] == (7, 1)
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from recipe_cloner import RecipeCloner
+
+
+def _recipe(i):
+    return {"title": f"Món {i}", "ingredients": [f"nguyên liệu {i}"], "steps": ["Nấu"]}
+
+
+@pytest.fixture
+def cloner(tmp_path):
+    return RecipeCloner(db_path=str(tmp_path / "recipes.db"))
+
+
+def _titles(cloner):
+    return sorted(r["title"] for r in cloner.iter_recipes())
+
+
+@pytest.mark.parametrize("fmt", ["array", "ndjson"])
+def test_import_resumes_from_progress_offset(tmp_path, cloner, fmt):
+    path = tmp_path / f"recipes.{fmt}"
+    recipes = [_recipe(i) for i in range(5)]
+    if fmt == "array":
+        path.write_text(json.dumps(recipes, ensure_ascii=False), encoding="utf-8")
+    else:
+        path.write_text("\n".join(json.dumps(r, ensure_ascii=False) for r in recipes), encoding="utf-8")
+
+    progress = []
+    result = cloner.import_json(str(path), batch_size=2, on_progress=progress.append)
+    assert result["inserted"] == 5
+    assert result["offset"] == progress[-1]["offset"]
+    assert [p["records"] for p in progress] == [2, 4, 5]
+
+    # Tiếp tục sau lô đầu tiên vào database mới: chỉ đọc 3 công thức còn lại
+    fresh = RecipeCloner(db_path=str(tmp_path / "fresh.db"))
+    resumed = fresh.import_json(str(path), offset=progress[0]["offset"], batch_size=2)
+    assert resumed["records"] == 3
+    assert _titles(fresh) == ["Món 2", "Món 3", "Món 4"]
+
+
+def test_import_continues_appended_file(tmp_path, cloner):
+    path = tmp_path / "recipes.ndjson"
+    good = [json.dumps(_recipe(i), ensure_ascii=False) for i in range(3)]
+    path.write_text("\n".join(good) + "\n", encoding="utf-8")
+
+    result = cloner.import_json(str(path), batch_size=2)
+    assert result["inserted"] == 3
+
+    # File được ghi tiếp: chạy lại từ offset chỉ import phần mới
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(_recipe(3), ensure_ascii=False) + "\n")
+    resumed = cloner.import_json(str(path), offset=result["offset"])
+    assert resumed["records"] == 1
+    assert resumed["inserted"] == 1
+    assert len(_titles(cloner)) == 4
+
+
+def test_truncated_array_keeps_imported_batches(tmp_path, cloner):
+    path = tmp_path / "recipes.json"
+    text = json.dumps([_recipe(i) for i in range(4)], ensure_ascii=False)
+    path.write_text(text[:text.index("Món 3") + 3], encoding="utf-8")
+
+    result = cloner.import_json(str(path), batch_size=2)
+    assert "error" in result
+    assert result["inserted"] == 3
+    assert 0 < result["offset"] < path.stat().st_size
@@ -0,0 +1,87 @@
+import threading
+import time
+
+from job_queue import JobQueue
+
+
+def _wait_for(queue, job_id, status, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = queue.get(job_id)
+        if job is not None and job["status"] == status:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} never reached {status}: {queue.get(job_id)}")
+
+
+def test_shutdown_cancels_queued_jobs_and_bounds_the_wait(tmp_path):
+    queue = JobQueue(db_path=str(tmp_path / "jobs.db"), workers=1)
+    release = threading.Event()
+    running = queue.submit("meal-plan", lambda: release.wait(5) and {"ok": True})
+    queued = queue.submit("meal-plan", lambda: {"ok": True})
+    _wait_for(queue, running, "running")
+
+    start = time.monotonic()
+    queue.shutdown(timeout=0.2)
+    assert time.monotonic() - start < 2
+
+    assert queue.get(queued)["status"] == "error"
+    assert "trước khi job chạy" in queue.get(queued)["error"]
+    assert queue.get(running)["status"] == "error"
+    # Job đang chạy xong kịp thì kết quả ghi đè trạng thái lỗi
+    release.set()
+    assert _wait_for(queue, running, "done")["result"] == {"ok": True}
+    assert queue.stats()["pending"] == 0
+
+
+def test_submit_rejects_when_max_pending_reached(tmp_path):
+    queue = JobQueue(db_path=str(tmp_path / "jobs.db"), workers=1, max_pending=2)
+    release = threading.Event()
+    first = queue.submit("meal-plan", lambda: release.wait(5) and {"ok": True})
+    second = queue.submit("meal-plan", lambda: {"ok": True})
+    assert queue.submit("meal-plan", lambda: {"ok": True}) is None
+    assert queue.stats()["rejected"] == 1
+
+    release.set()
+    _wait_for(queue, first, "done")
+    _wait_for(queue, second, "done")
+    # Có chỗ trống lại sau khi job xong
+    assert queue.submit("meal-plan", lambda: {"ok": True}) is not None
+    queue.shutdown()
+
+
+def test_jobs_expire_after_ttl(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("job_queue.time.time", lambda: now[0])
+    queue = JobQueue(db_path=str(tmp_path / "jobs.db"), workers=1, ttl=60)
+    job_id = queue.submit("cooking-tips", lambda: {"tips": []})
+    _wait_for(queue, job_id, "done")
+
+    now[0] += 59
+    assert queue.get(job_id)["result"] == {"tips": []}
+    now[0] += 2
+    assert queue.get(job_id) is None
+    queue.shutdown()
+
+
+def test_status_after_restart(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    queue = JobQueue(db_path=path, workers=1)
+    release = threading.Event()
+    done = queue.submit("cooking-tips", lambda: {"tips": ["a"]})
+    _wait_for(queue, done, "done")
+    running = queue.submit("meal-plan", lambda: release.wait(5) and {"ok": True})
+    queued = queue.submit("meal-plan", lambda: {"ok": True})
+    _wait_for(queue, running, "running")
+
+    # Process mới mở lại cùng DB: job xong còn nguyên, job dở dang bị đánh dấu lỗi
+    restarted = JobQueue(db_path=path, workers=1)
+    assert restarted.get(done)["result"] == {"tips": ["a"]}
+    for job_id in (running, queued):
+        job = restarted.get(job_id)
+        assert job["status"] == "error"
+        assert job["error"] == "Server khởi động lại khi job đang chạy"
+
+    release.set()
+    queue.shutdown()
+    restarted.shutdown()
@@ -0,0 +1,73 @@
+import pytest
+
+from json_extract import JSONExtractor, JSONExtractionError, extract_json
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('Đây là công thức:\n```json\n{"title": "Phở"}\n```\nChúc ngon miệng!', {"title": "Phở"}),
+    ('Kết quả [1, 2] như sau', [1, 2]),
+    ('xem {chỗ này} rồi {"a": 1}', {"a": 1}),
+    ('{"a": "x } y { ] \\" ["}', {"a": 'x } y { ] " ['}),
+    ('{"a": [1, 2,], "b": "x,]",}', {"a": [1, 2], "b": "x,]"}),
+])
+def test_extract_json(text, expected):
+    assert extract_json(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"a": [1, 2, {"b": "c', {"a": [1, 2, {"b": "c"}]}),
+    ('{"a": 1, "b": ', {"a": 1}),
+    ('Đây: {"steps": ["Nấu", "Ăn"', {"steps": ["Nấu", "Ăn"]}),
+])
+def test_extract_json_repairs_truncated_output(text, expected):
+    assert extract_json(text) == expected
+
+
+def test_extract_json_without_json_raises():
+    with pytest.raises(JSONExtractionError):
+        extract_json("Xin lỗi, tôi không biết.")
+
+
+def test_expect_dict_skips_arrays_in_prose():
+    text = 'see [1] then {"a":"b}"}'
+    assert extract_json(text) == [1]
+    assert extract_json(text, expect=dict) == {"a": "b}"}
+
+
+def test_accept_skips_rejected_values():
+    text = '{"note": 1} rồi {"title": "Phở", "extra": {"x": 1}}'
+    assert extract_json(text, accept=lambda v: "title" in v) == {"title": "Phở", "extra": {"x": 1}}
+    # Không có giá trị nào hợp lệ: trả giá trị đầu tiên để báo lỗi schema cụ thể
+    assert extract_json('{"note": 1}', accept=lambda v: "title" in v) == {"note": 1}
+
+
+@pytest.mark.parametrize("text", [
+    'Chắc chắn rồi! {"title": "Phở", "steps": ["a}", "b"]} còn nữa {"x": 1}',
+    'see [1] then {"a":"b}"}',
+])
+def test_feed_token_by_token_matches_whole_text(text):
+    whole = extract_json(text, expect=dict)
+    extractor = JSONExtractor(expect=dict)
+    results = [extractor.feed(ch) for ch in text]
+    found = [r for r in results if r is not None]
+    assert found == [whole]
+    assert extractor.done
+
+
+def test_feed_returns_value_when_it_closes():
+    extractor = JSONExtractor()
+    assert extractor.feed('Kết quả: {"a": ') is None
+    assert extractor.feed('[1, 2]') is None
+    assert extractor.feed('} và prose') == {"a": [1, 2]}
+    assert extractor.feed('{"b": 1}') is None
+
+
+def test_feed_keeps_only_text_from_candidate_start():
+    extractor = JSONExtractor()
+    for _ in range(100):
+        extractor.feed("prose không có JSON. ")
+    assert extractor._parts == []
+    extractor.feed('trước {"a": ')
+    extractor.feed('"b"')
+    assert "".join(extractor._parts).endswith('{"a": "b"')
+    assert extractor.feed("}") == {"a": "b"}
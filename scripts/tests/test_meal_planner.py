@@ -0,0 +1,106 @@
+import pytest
+
+from meal_planner import MealPlanner, parse_days, parse_no_repeat_days, SLOTS
+from recipe_cloner import RecipeCloner
+
+
+def _recipe(title, ingredients=(), minutes=30):
+    return {"title": title, "ingredients": list(ingredients), "durationInMinutes": minutes}
+
+
+@pytest.fixture
+def cloner(tmp_path):
+    return RecipeCloner(db_path=str(tmp_path / "recipes.db"))
+
+
+def _planner(cloner, recipes):
+    cloner.add_recipes(recipes)
+    return MealPlanner(cloner, refresh_interval=3600)
+
+
+def _titles(solution):
+    return [entry[slot] for entry in solution["plan"] for slot in SLOTS]
+
+
+@pytest.mark.parametrize("value, expected", [(7, 7), ("5", 5), (0, 1), (-3, 1), (100, 31)])
+def test_parse_days_clamps(value, expected):
+    assert parse_days(value) == expected
+
+
+@pytest.mark.parametrize("value", ["abc", "7.5", 7.5, None, True, [7]])
+def test_parse_days_rejects_non_integers(value):
+    with pytest.raises(ValueError):
+        parse_days(value)
+
+
+@pytest.mark.parametrize("value, expected", [(3, 3), ("2", 2), (0, 1)])
+def test_parse_no_repeat_days(value, expected):
+    assert parse_no_repeat_days(value) == expected
+
+
+@pytest.mark.parametrize("value", ["abc", 2.5, None])
+def test_solve_rejects_invalid_no_repeat_days(cloner, value):
+    planner = _planner(cloner, [_recipe("Phở bò")])
+    with pytest.raises(ValueError, match="no_repeat_days must be an integer"):
+        planner.solve({"days": 2, "no_repeat_days": value})
+
+
+def test_vegetarian_filters_unaccented_meat(cloner):
+    planner = _planner(cloner, [
+        _recipe("Thit bo xao", ["thit bo", "hanh"]),
+        _recipe("Canh cá", ["cá", "rau"]),
+        _recipe("Cà chua xào trứng", ["cà chua", "trứng"]),
+        _recipe("Rau muống xào tỏi", ["rau muống", "tỏi"]),
+    ])
+    for dietary in ("vegetarian", "ăn chay", "an chay"):
+        solution = planner.solve({"days": 1, "dietary": dietary})
+        assert set(_titles(solution)) - {""} <= {"Cà chua xào trứng", "Rau muống xào tỏi"}
+        assert solution["candidates"] == 2
+
+    vegan = planner.solve({"days": 1, "dietary": "thuần chay"})
+    assert vegan["candidates"] == 1
+
+
+def test_no_repeat_window_and_preferences(cloner):
+    planner = _planner(cloner, [_recipe(f"Món rau {i}", ["rau"]) for i in range(6)]
+                       + [_recipe("Cá kho", ["cá"]), _recipe("Canh cá chua", ["cá", "me"])])
+    solution = planner.solve({"days": 7, "preferences": ["có cá"], "no_repeat_days": 2})
+    assert not solution["gaps"]
+
+    last_seen = {}
+    for day, ids in enumerate(solution["recipe_ids"]):
+        for slot in SLOTS:
+            recipe_id = ids[slot]
+            assert recipe_id not in last_seen or day - last_seen[recipe_id] >= 2
+        for recipe_id in ids.values():
+            last_seen[recipe_id] = day
+    # Món có cá được ưu tiên mỗi khi không bị chặn bởi no_repeat_days
+    assert {"Cá kho", "Canh cá chua"} <= set(solution["plan"][0].values())
+
+
+def test_gaps_when_time_budget_excludes_recipes(cloner):
+    planner = _planner(cloner, [_recipe("Bún", minutes=15), _recipe("Lẩu", minutes=90)])
+    solution = planner.solve({"days": 2, "max_minutes": {"breakfast": 20}, "no_repeat_days": 2})
+    assert solution["plan"][0]["breakfast"] == "Bún"
+    assert (1, "breakfast") in solution["gaps"]
+
+
+def test_reload_is_incremental(cloner):
+    planner = _planner(cloner, [_recipe("Phở")])
+    assert planner.solve({"days": 1})["candidates"] == 1
+    cloner.add_recipes([_recipe("Bún chả"), _recipe("Cơm tấm")])
+    assert planner.solve({"days": 1})["candidates"] == 1  # Chưa hết refresh_interval
+    planner.invalidate()
+    assert planner.solve({"days": 1})["candidates"] == 3
+    assert planner.full_loads == 1
+
+
+def test_reload_rebuilds_after_delete(cloner):
+    planner = _planner(cloner, [_recipe("Phở"), _recipe("Bún")])
+    planner.solve({"days": 1})
+    cloner.clear_all()
+    cloner.add_recipes([_recipe("Cháo"), _recipe("Xôi")])
+    planner.invalidate()
+    solution = planner.solve({"days": 1})
+    assert set(_titles(solution)) - {""} <= {"Cháo", "Xôi"}
+    assert planner.full_loads == 2
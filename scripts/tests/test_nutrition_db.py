@@ -0,0 +1,68 @@
+import pytest
+
+from nutrition_db import NutritionDB, parse_ingredient
+
+
+@pytest.fixture(scope="module")
+def db():
+    return NutritionDB()
+
+
+@pytest.mark.parametrize("line, expected", [
+    ("500g thịt bò", (500.0, "g", "thịt bò")),
+    ("3-4 quả hồi", (3.5, "quả", "hồi")),
+    ("1/2 dưa chuột", (0.5, None, "dưa chuột")),
+    ("1,5 kg gạo", (1.5, "kg", "gạo")),
+    ("1.500g thịt bò", (1500.0, "g", "thịt bò")),
+    ("1.500,5 g thịt bò", (1500.5, "g", "thịt bò")),
+    ("1.5 kg gạo", (1.5, "kg", "gạo")),
+    ("0.500 kg gạo", (0.5, "kg", "gạo")),
+    ("Thịt bò: 500g", (500.0, "g", "thịt bò")),
+    ("2 cái cà rốt (gọt vỏ)", (2.0, "cái", "cà rốt")),
+    ("1 muong canh nuoc mam", (1.0, "muỗng canh", "nuoc mam")),
+    ("Hành lá", (None, None, "hành lá")),
+])
+def test_parse_ingredient(line, expected):
+    assert parse_ingredient(line) == expected
+
+
+@pytest.mark.parametrize("line, food, grams", [
+    ("500g thịt bò", "thịt bò", 500),
+    ("500g thit bo", "thịt bò", 500),
+    ("200g cá basa", "cá", 200),
+    ("200g ca basa", "cá", 200),
+    ("200g gà", "thịt gà", 200),
+    ("1 con gà", "thịt gà", 1200),
+    ("2 đùi gà", "đùi gà", 300),
+    ("4 cánh gà", "cánh gà", 160),
+    ("500g cánh gà", "cánh gà", 500),
+    ("1.500g thịt bò", "thịt bò", 1500),
+    ("2 quả chuối", "chuối", 240),
+    ("1 muỗng canh nước mắm", "nước mắm", 18),
+    ("một ít muối", "muối", 5),
+    ("Thịt heo ba chỉ 300g", "thịt ba chỉ", 300),
+])
+def test_resolve(db, line, food, grams):
+    item = db.resolve(line)
+    assert item is not None
+    assert (item["food"], item["grams"]) == (food, grams)
+
+
+@pytest.mark.parametrize("line", [
+    "200g cà tím",   # cà, không phải cá
+    "100g cà pháo",
+    "cà ri gà",
+    "200g ca",       # không dấu, một âm tiết: không đoán
+    "200g ga",
+    "1 lá chuối",    # lá chuối không phải quả chuối
+    "5 lá chanh",
+])
+def test_ambiguous_names_are_not_resolved(db, line):
+    assert db.resolve(line) is None
+
+
+def test_analyze_leaves_unknown_lines_for_ai(db):
+    analysis = db.analyze(["200g cà tím", {"name": "300g cá"}, " "])
+    assert analysis["unresolved"] == ["200g cà tím"]
+    assert [item["food"] for item in analysis["items"]] == ["cá"]
+    assert analysis["totals"]["calories"] == pytest.approx(300)
@@ -0,0 +1,59 @@
+import pytest
+
+from recipe_cloner import RecipeCloner
+
+
+@pytest.fixture
+def cloner(tmp_path):
+    cloner = RecipeCloner(db_path=str(tmp_path / "recipes.db"))
+    cloner.add_recipes([
+        {"title": f"Món {i}", "ingredients": [f"a{i}", f"b{i}"], "steps": [f"Bước {i}"],
+         "type": "Chay" if i % 3 == 0 else "Mặn", "durationInMinutes": 10 * i}
+        for i in range(10)
+    ], source="json_import")
+    return cloner
+
+
+def test_list_recipes_pages_with_cursor(cloner):
+    titles, cursor = [], None
+    while True:
+        page = cloner.list_recipes(cursor=cursor, limit=4)
+        titles += [r["title"] for r in page["recipes"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+        assert cursor == page["recipes"][-1]["id"]
+    assert titles == [f"Món {i}" for i in range(10)]
+
+
+def test_last_full_page_has_no_cursor(cloner):
+    page = cloner.list_recipes(cursor=cloner.list_recipes(limit=5)["next_cursor"], limit=5)
+    assert len(page["recipes"]) == 5
+    assert page["next_cursor"] is None
+
+
+def test_cursor_is_stable_when_rows_are_added(cloner):
+    first = cloner.list_recipes(limit=3)
+    cloner.add_recipes([{"title": "Món mới", "ingredients": []}])
+    second = cloner.list_recipes(cursor=first["next_cursor"], limit=3)
+    assert [r["title"] for r in second["recipes"]] == ["Món 3", "Món 4", "Món 5"]
+
+
+def test_filters_and_fields(cloner):
+    page = cloner.list_recipes(limit=100, recipe_type="Chay", min_duration=10, max_duration=60,
+                               fields=["title", "ingredients"])
+    assert [r["title"] for r in page["recipes"]] == ["Món 3", "Món 6"]
+    assert set(page["recipes"][0]) == {"id", "title", "ingredients"}
+    assert [i["name"] for i in page["recipes"][0]["ingredients"]] == ["a3", "b3"]
+
+
+def test_iter_recipes_batches_ingredients(cloner):
+    recipes = list(cloner.iter_recipes(batch_size=3))
+    assert len(recipes) == 10
+    assert all(len(r["ingredients"]) == 2 for r in recipes)
+    assert recipes[4]["steps"] == ["Bước 4"]
+
+
+def test_unknown_field_rejected(cloner):
+    with pytest.raises(ValueError):
+        cloner.list_recipes(fields=["title", "secret"])
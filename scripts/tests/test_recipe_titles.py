@@ -0,0 +1,83 @@
+import json
+import sqlite3
+
+import pytest
+
+from recipe_cloner import RecipeCloner
+
+
+def _legacy_db(path):
+    """Database cũ: chưa có UNIQUE index, đã có title trùng"""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE recipes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, imageUrl TEXT,
+            description TEXT, steps TEXT, durationInMinutes INTEGER, type TEXT,
+            source TEXT, cloned_at TEXT
+        );
+        CREATE TABLE ingredients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, recipeId INTEGER NOT NULL,
+            name TEXT NOT NULL, isChecked INTEGER DEFAULT 0
+        );
+        INSERT INTO recipes (title, description, steps) VALUES
+            ('Phở bò', 'bản gốc', '["Nấu"]'),
+            ('Phở bò', 'bản trùng', '["Nấu lại"]'),
+            ('Bún chả', '', '[]');
+        INSERT INTO ingredients (recipeId, name) VALUES (1, 'bánh phở'), (2, 'thịt bò');
+    ''')
+    conn.commit()
+    conn.close()
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    path = str(tmp_path / "recipes.db")
+    _legacy_db(path)
+    return RecipeCloner(db_path=path)
+
+
+def _count(cloner, title):
+    return cloner._connect().execute('SELECT COUNT(*) FROM recipes WHERE title = ?', (title,)).fetchone()[0]
+
+
+def test_init_keeps_duplicates_until_dedup(legacy):
+    assert not legacy.unique_titles
+    assert _count(legacy, "Phở bò") == 2
+
+
+def test_import_without_unique_index_skips_existing_titles(legacy):
+    result = legacy.add_recipes([
+        {"title": "Phở bò", "ingredients": ["x"]},
+        {"title": "Cơm tấm", "ingredients": ["cơm"]},
+        {"title": "Cơm tấm", "ingredients": ["sườn"]},
+    ])
+    assert (result["inserted"], result["skipped"]) == (1, 2)
+    assert _count(legacy, "Phở bò") == 2
+    assert _count(legacy, "Cơm tấm") == 1
+
+
+def test_dedup_titles_exports_removed_recipes(tmp_path, legacy):
+    export = tmp_path / "duplicates.ndjson"
+    result = legacy.dedup_titles(str(export))
+    assert result["removed"] == 1
+    assert legacy.unique_titles
+    assert _count(legacy, "Phở bò") == 1
+
+    [removed] = [json.loads(line) for line in export.read_text(encoding="utf-8").splitlines()]
+    assert removed["id"] == 2
+    assert removed["description"] == "bản trùng"
+    assert removed["ingredients"] == ["thịt bò"]
+
+    kept = next(r for r in legacy.iter_recipes() if r["title"] == "Phở bò")
+    assert kept["description"] == "bản gốc"
+    assert legacy._connect().execute('SELECT COUNT(*) FROM ingredients WHERE recipeId = 2').fetchone()[0] == 0
+
+    # Lần khởi tạo sau dùng UNIQUE index
+    assert RecipeCloner(db_path=legacy.db_path).unique_titles
+
+
+def test_new_database_has_unique_titles(tmp_path):
+    cloner = RecipeCloner(db_path=str(tmp_path / "new.db"))
+    assert cloner.unique_titles
+    result = cloner.add_recipes([{"title": "Chè", "ingredients": []}] * 2)
+    assert (result["inserted"], result["skipped"]) == (1, 1)
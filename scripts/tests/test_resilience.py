@@ -0,0 +1,144 @@
+import requests
+import pytest
+
+import resilience
+from resilience import CircuitBreaker, RetryBudget, RetryPolicy
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience.time, "time", clock)
+    return clock
+
+
+def _open_breaker(clock, **kwargs):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30, **kwargs)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    return breaker
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.rejected == 1
+
+
+def test_breaker_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_single_trial(clock):
+    breaker = _open_breaker(clock)
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_half_open_trial_success_closes(clock):
+    breaker = _open_breaker(clock)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_half_open_trial_failure_reopens(clock):
+    breaker = _open_breaker(clock)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_release_trial_lets_next_request_probe(clock):
+    breaker = _open_breaker(clock)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.release_trial()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_abandoned_trial_expires_after_trial_timeout(clock):
+    breaker = _open_breaker(clock, trial_timeout=60)
+    clock.now += 30
+    assert breaker.allow()
+    clock.now += 59
+    assert not breaker.allow()
+    clock.now += 1
+    assert breaker.allow()
+
+
+def test_retry_budget_limits_retries():
+    budget = RetryBudget(ratio=0.5, max_tokens=2)
+    assert budget.try_spend()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    assert budget.exhausted == 1
+    budget.record_request()
+    budget.record_request()
+    assert budget.try_spend()
+    assert budget.retries == 3
+
+
+def test_retry_budget_refill_is_capped():
+    budget = RetryBudget(ratio=1, max_tokens=2)
+    for _ in range(10):
+        budget.record_request()
+    assert budget.tokens == 2
+
+
+def _http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(response=response)
+
+
+@pytest.mark.parametrize("error, expected", [
+    (_http_error(500), True),
+    (_http_error(503), True),
+    (_http_error(429), True),
+    (_http_error(400), False),
+    (_http_error(404), False),
+    (requests.exceptions.ConnectionError(), True),
+    (requests.exceptions.ReadTimeout(), True),
+    (ValueError("not json"), False),
+    (requests.exceptions.JSONDecodeError("not json", "<html>", 0), True),
+    (requests.exceptions.InvalidURL(), False),
+])
+def test_retry_policy_is_retryable(error, expected):
+    assert RetryPolicy.is_retryable(error) is expected
+
+
+@pytest.mark.parametrize("error, expected", [
+    (_http_error(400), True),
+    (_http_error(422), True),
+    (_http_error(429), False),
+    (_http_error(500), False),
+    (requests.exceptions.ConnectionError(), False),
+])
+def test_retry_policy_is_client_error(error, expected):
+    assert RetryPolicy.is_client_error(error) is expected
@@ -0,0 +1,44 @@
+import sqlite3
+
+from response_cache import ResponseCache
+
+
+def _rows(cache):
+    conn = sqlite3.connect(cache.db_path)
+    keys = [row[0] for row in conn.execute("SELECT key FROM response_cache ORDER BY expires_at")]
+    conn.close()
+    return keys
+
+
+def test_sqlite_purges_expired_rows_while_running(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("response_cache.time.time", lambda: now[0])
+    cache = ResponseCache(max_size=0, ttl=10, db_path=str(tmp_path / "cache.db"), purge_every=3)
+    cache.set("old-1", {"n": 1})
+    cache.set("old-2", {"n": 2})
+    now[0] += 60
+    cache.set("new-1", {"n": 3})
+    assert _rows(cache) == ["new-1"]
+    assert cache.stats()["purged"] == 2
+    assert cache.get("new-1") == {"n": 3}
+
+
+def test_sqlite_row_count_is_capped(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("response_cache.time.time", lambda: now[0])
+    cache = ResponseCache(max_size=0, ttl=3600, db_path=str(tmp_path / "cache.db"),
+                          max_rows=3, purge_every=1)
+    for i in range(5):
+        now[0] += 1
+        cache.set(f"k{i}", {"n": i})
+    assert _rows(cache) == ["k2", "k3", "k4"]
+    assert cache.get("k0") is None
+    assert cache.get("k4") == {"n": 4}
+
+
+def test_init_purges_rows_over_cap(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ResponseCache(max_size=0, db_path=path, max_rows=100)
+    for i in range(5):
+        cache.set(f"k{i}", {"n": i})
+    assert len(_rows(ResponseCache(max_size=0, db_path=path, max_rows=2))) == 2
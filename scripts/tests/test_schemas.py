@@ -0,0 +1,54 @@
+import pytest
+
+from schemas import NUTRITION_SCHEMA, RECIPE_SCHEMA, MEAL_PLAN_SCHEMA, validate, repair
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("500 kcal", 500),
+    ("khoảng 350 kcal", 350),
+    ("1,500 kcal", 1500),
+    ("12,345,678.5", 12345678.5),
+    ("-1,200", -1200),
+    ("1,500, 2,000 kcal", 1500),
+    ("2,5 g", 2.5),
+    ("0,500", 0.5),
+    ("1,5000", 1.5),
+    ("1.5", 1.5),
+])
+def test_repair_number_strings(text, expected):
+    assert repair(text, {"type": "number"}) == expected
+
+
+def test_repair_integer_rounds():
+    assert repair("4,5 người", {"type": "integer"}) == 4
+    assert repair("1,500", {"type": "integer"}) == 1500
+    assert repair(3.6, {"type": "integer"}) == 4
+
+
+def test_repair_keeps_text_without_number():
+    assert repair("không rõ", {"type": "number"}) == "không rõ"
+
+
+def test_repair_nutrition_response():
+    raw = {"calories": "1,250 kcal", "protein": "30g", "carbs": 45, "fat": "12,5 g",
+           "healthBenefits": "Tốt cho tim mạch"}
+    fixed = repair(raw, NUTRITION_SCHEMA)
+    assert fixed == {"calories": 1250, "protein": 30, "carbs": 45, "fat": 12.5,
+                     "healthBenefits": ["Tốt cho tim mạch"]}
+    assert validate(fixed, NUTRITION_SCHEMA) == []
+
+
+def test_repair_recipe_response():
+    raw = {"title": "Phở bò", "ingredients": "bánh phở", "steps": ["Nấu nước dùng"],
+           "servings": "4 người", "estimatedTime": 90}
+    fixed = repair(raw, RECIPE_SCHEMA)
+    assert fixed["ingredients"] == ["bánh phở"]
+    assert fixed["servings"] == 4
+    assert fixed["estimatedTime"] == "90"
+    assert validate(fixed, RECIPE_SCHEMA) == []
+
+
+def test_validate_reports_paths():
+    errors = validate({"plan": [{"day": "Thứ 2", "breakfast": "Phở", "lunch": 1}]}, MEAL_PLAN_SCHEMA)
+    assert "$.plan[0].dinner: missing" in errors
+    assert "$.plan[0].lunch: expected string, got int" in errors
@@ -0,0 +1,64 @@
+import pytest
+
+from recipe_cloner import RecipeCloner, _fts_query
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("phở", '"phở"'),
+    ("Phở  BÒ", '"phở" AND "bò"'),
+    ("dau hu", '("dau" OR "đau") AND "hu"'),
+    ("bò bò", '"bò"'),
+    ('"bò" OR title:gà*', '"bò" AND "or" AND "title" AND "gà"'),
+    ("dd", '("dd" OR "đd" OR "dđ" OR "đđ")'),
+])
+def test_fts_query(text, expected):
+    assert _fts_query(text) == expected
+
+
+def test_fts_query_limits_terms_and_variants():
+    assert _fts_query(" ".join(f"t{i}" for i in range(40))).count(" AND ") == 15
+    assert _fts_query("dddddd").count(" OR ") == 7
+
+
+@pytest.mark.parametrize("text", ["", "   ", "!!! ---", "_"])
+def test_fts_query_rejects_empty(text):
+    with pytest.raises(ValueError):
+        _fts_query(text)
+
+
+@pytest.fixture
+def cloner(tmp_path):
+    cloner = RecipeCloner(db_path=str(tmp_path / "recipes.db"))
+    if not cloner.search_enabled:
+        pytest.skip("SQLite built without FTS5")
+    return cloner
+
+
+def test_search_matches_without_diacritics(cloner):
+    cloner.add_recipes([
+        {"title": "Đậu hũ sốt cà chua", "ingredients": ["đậu hũ", "cà chua"]},
+        {"title": "Phở bò", "ingredients": ["bánh phở", "thịt bò"]},
+    ])
+    assert [r["title"] for r in cloner.search("dau hu")["results"]] == ["Đậu hũ sốt cà chua"]
+    assert [r["title"] for r in cloner.search("PHO")["results"]] == ["Phở bò"]
+
+
+def test_search_ranks_full_match_set(cloner):
+    # Công thức khớp ở title được thêm đầu tiên, sau hàng trăm công thức chỉ khớp ở các bước
+    recipes = [{"title": "Gà nướng mật ong", "ingredients": ["gà"], "steps": ["Nướng"]}]
+    recipes += [{"title": f"Món {i}", "ingredients": ["muối"], "steps": ["Thêm gà vào nồi"]}
+                for i in range(700)]
+    cloner.add_recipes(recipes)
+    page = cloner.search("gà", limit=5)
+    assert page["results"][0]["title"] == "Gà nướng mật ong"
+    assert page["next_offset"] == 5
+
+
+def test_search_pagination(cloner):
+    cloner.add_recipes([{"title": f"Canh chua {i}", "ingredients": ["me"]} for i in range(7)])
+    seen, offset = [], 0
+    while offset is not None:
+        page = cloner.search("canh chua", limit=3, offset=offset)
+        seen += [r["id"] for r in page["results"]]
+        offset = page["next_offset"]
+    assert len(seen) == len(set(seen)) == 7
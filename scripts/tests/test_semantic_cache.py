@@ -0,0 +1,96 @@
+import json
+import os
+
+import pytest
+
+from semantic_cache import SemanticCache, canonical_ingredients, fold_text
+
+RECIPE = {"title": "Canh chua cá", "ingredients": ["cá", "cà chua"], "steps": ["Nấu"]}
+
+
+def _request(*ingredients, cuisine="Việt Nam"):
+    return {"ingredients": list(ingredients), "cuisine": cuisine}
+
+
+def test_fold_text_removes_accents_and_d():
+    assert fold_text("  Đậu  PHỤ ") == "dau phu"
+    assert fold_text("Cà chua") == fold_text("ca chua") == "ca chua"
+    assert canonical_ingredients(["Hành", "hanh", " ", "đường"]) == ("duong", "hanh")
+
+
+def test_folded_request_hits_exactly():
+    cache = SemanticCache()
+    cache.set(_request("Đậu phụ", "Cà chua", "Hành lá"), RECIPE)
+    assert cache.get(_request("hanh la", "dau phu", "ca chua ", cuisine="viet nam")) == RECIPE
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_near_duplicate_hits():
+    cache = SemanticCache(threshold=0.8)
+    cache.set(_request("cá", "cà chua", "dứa", "me", "rau ngổ"), RECIPE)
+    # Jaccard 5/6 >= 0.8
+    assert cache.get(_request("cá", "cà chua", "dứa", "me", "rau ngổ", "giá")) == RECIPE
+    assert cache.stats()["near_hits"] == 1
+
+
+@pytest.mark.parametrize("ingredients", [
+    ("cá", "cà chua", "dứa", "me"),          # Jaccard 3/4 < 0.8
+    ("cá", "cà chua", "thịt bò"),            # Jaccard 2/4
+    ("thịt gà", "sả", "ớt"),
+])
+def test_distinct_prompts_do_not_collide(ingredients):
+    cache = SemanticCache(threshold=0.8)
+    cache.set(_request("cá", "cà chua", "dứa"), RECIPE)
+    assert cache.get(_request(*ingredients)) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_other_cuisine_does_not_hit():
+    cache = SemanticCache()
+    cache.set(_request("cá", "cà chua", "dứa"), RECIPE)
+    assert cache.get(_request("cá", "cà chua", "dứa", cuisine="Thái")) is None
+
+
+@pytest.fixture(scope="module")
+def app_module(tmp_path_factory):
+    """Import app.py trong thư mục tạm (app tạo recipes.db, jobs.db ở thư mục hiện tại)"""
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("app"))
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+    return app
+
+
+def _fake_stream(tokens, done=True):
+    def stream(kind, prompt, on_complete=None):
+        yield from tokens
+        if done and on_complete is not None:
+            on_complete({"message": {"content": "".join(tokens)}})
+    return stream
+
+
+def _stream_suggest(app_module, monkeypatch, tokens, done=True):
+    cache = SemanticCache()
+    monkeypatch.setattr(app_module, "semantic_cache", cache)
+    monkeypatch.setattr(app_module.ai_service, "stream", _fake_stream(tokens, done))
+    client = app_module.app.test_client()
+    response = client.post("/api/suggest-recipe?stream=1", json=_request("cá", "cà chua", "dứa"))
+    body = response.get_data(as_text=True)
+    return cache, body
+
+
+def test_streamed_suggestion_is_written_back(app_module, monkeypatch):
+    text = json.dumps(RECIPE, ensure_ascii=False)
+    tokens = ["Đây: ", text[:10], text[10:], " chúc ngon miệng"]
+    cache, body = _stream_suggest(app_module, monkeypatch, tokens)
+    assert "event: result" in body
+    assert cache.get(_request("Cá", "ca chua", "dua")) == RECIPE
+
+
+def test_truncated_stream_is_not_written_back(app_module, monkeypatch):
+    text = json.dumps(RECIPE, ensure_ascii=False)
+    cache, body = _stream_suggest(app_module, monkeypatch, [text], done=False)
+    assert "event: result" in body
+    assert cache.get(_request("cá", "cà chua", "dứa")) is None
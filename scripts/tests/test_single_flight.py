@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+
+from single_flight import SingleFlight
+
+
+def _wait_for_waiters(flight, key, count, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with flight._lock:
+            call = flight._calls.get(key)
+            if call is not None and call.waiters >= count:
+                return
+        time.sleep(0.001)
+    raise AssertionError(f"{count} waiters never joined {key}")
+
+
+def _run_concurrently(flight, key, fn, followers):
+    """Leader chạy fn, `followers` caller khác gọi cùng key trong lúc leader chưa xong"""
+    release = threading.Event()
+    results, errors = [], []
+
+    def leader_fn():
+        release.wait(5)
+        return fn()
+
+    def call(target):
+        try:
+            results.append(flight.do(key, target))
+        except Exception as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call, args=(leader_fn,))
+    leader.start()
+    while not flight.stats()["in_flight"]:
+        time.sleep(0.001)
+    threads = [threading.Thread(target=call, args=(lambda: pytest.fail("follower executed"),))
+               for _ in range(followers)]
+    for thread in threads:
+        thread.start()
+    _wait_for_waiters(flight, key, followers)
+    release.set()
+    for thread in [leader, *threads]:
+        thread.join(5)
+    return results, errors
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    executions = []
+    results, errors = _run_concurrently(flight, "k", lambda: executions.append(1) or {"n": 1}, followers=5)
+
+    assert errors == [] and executions == [1]
+    assert sorted(shared for _, shared in results) == [False] + [True] * 5
+    assert all(result == {"n": 1} for result, _ in results)
+    assert flight.stats() == {"calls": 6, "executions": 1, "coalesced": 5, "in_flight": 0}
+
+
+def test_error_is_raised_for_every_waiter():
+    flight = SingleFlight()
+
+    def boom():
+        raise RuntimeError("backend down")
+
+    results, errors = _run_concurrently(flight, "k", boom, followers=3)
+    assert results == []
+    assert [str(e) for e in errors] == ["backend down"] * 4
+
+
+def test_calls_after_completion_execute_again():
+    flight = SingleFlight()
+    assert flight.do("k", lambda: 1) == (1, False)
+    assert flight.do("k", lambda: 2) == (2, False)
+    assert flight.do("other", lambda: 3) == (3, False)
+    assert flight.stats()["executions"] == 3
+    assert flight.stats()["coalesced"] == 0